@@ -1,37 +1,27 @@
-from setuptools import setup, Extension, find_packages
-from setuptools.command.build_ext import build_ext
+from setuptools import setup, Extension
 import os
-import subprocess
 
-class CustomBuildExtCommand(build_ext):
-    """Customized setuptools build_ext command to compile the C program."""
-    def run(self):
-        # Compile the C program
-        self.compile_c_program()
-        # Run the default build_ext command
-        build_ext.run(self)
+# Build flags for the engine. FMA contraction stays off so results match the
+# float32 replay in events.py bit for bit; set PHYSICS2D_MARCH to target another
+# CPU than the build machine, or to an empty string for a portable build.
+# PHYSICS2D_OPENMP=0 builds without OpenMP, for compilers that lack it; the
+# engine then runs every loop on the calling thread.
+march = os.environ.get('PHYSICS2D_MARCH', 'native')
+extra_compile_args = ['-O3', '-ffp-contract=off', '-fno-math-errno']
+extra_link_args = []
+if march:
+    extra_compile_args.append(f'-march={march}')
+if os.environ.get('PHYSICS2D_OPENMP', '1') != '0':
+    extra_compile_args.append('-fopenmp')
+    extra_link_args.append('-fopenmp')
 
-    def compile_c_program(self):
-        # Define the source file and the output shared library
-        source_file = os.path.join('textilefactorylib', 'src', 'physics2d.c')
-        output_library = os.path.join('textilefactorylib', 'src', 'physics2d.so')
-        # Define the command to compile the C program
-        compile_command = [
-            'gcc', '-shared', '-o', output_library, source_file
-        ]
-        # Run the compilation command
-        try:
-            subprocess.check_call(compile_command)
-        except subprocess.CalledProcessError as e:
-            print(f"Compilation failed with exit code {e.returncode}")
-            print(f"Command: {e.cmd}")
-            print(f"Output: {e.output}")
-            raise
-
-# Define the extension module
+# Define the extension module: the engine plus its Python fast paths
 physics2d_module = Extension(
     'textilefactorylib.src.physics2d',
     sources=['textilefactorylib/src/physics2d.c'],
+    extra_compile_args=extra_compile_args,
+    extra_link_args=extra_link_args,
+    libraries=['m'],
     language='c'
 )
 
@@ -46,14 +36,11 @@ except FileNotFoundError:
 setup(
     name="textilefactorylib",
     version="0.1",
-    packages=find_packages(where='textilefactorylib/src'),
-    package_dir={'': 'textilefactorylib/src'},
-    package_data={
-        'textilefactorylib.src': ['physics2d.so']
-    },
+    packages=['textilefactorylib.src', 'textilefactorylib.src.tests'],
     entry_points={
         "console_scripts": [
-            "factory_simulation=textilefactorylib.src.cli:main"
+            "factory_simulation=textilefactorylib.src.cli:main",
+            "factory_benchmark=textilefactorylib.src.benchmark:main"
         ]
     },
     author="Julian Herrera",
@@ -75,13 +62,11 @@ setup(
     include_package_data=True,
     install_requires=[
         'pygame',  # Add Pygame as a dependency
+        'numpy',  # Zero-copy views of the physics2d buffers
     ],
     test_suite='tests',
     tests_require=[
         'unittest',  # Add unittest as a test dependency
     ],
-    ext_modules=[physics2d_module],
-    cmdclass={
-        'build_ext': CustomBuildExtCommand
-    }
+    ext_modules=[physics2d_module]
 )
\ No newline at end of file
@@ -19,209 +19,16 @@ create_file_if_not_exists() {
 
 mkdir -p $SRC_DIR
 
-create_file_if_not_exists "$SRC_DIR/physics2d.c" "$(cat <<'EOF'
-#include <stdio.h>
-#include <stdlib.h>
-#include <string.h>
-#include <time.h>
-
-typedef struct {
-    float x, y;
-} Vec2;
-
-typedef struct {
-    Vec2 position;
-    Vec2 velocity;
-    char type[4];
-    int area;
-    time_t start_time;
-    float path_progress;
-    int path_index;
-} Material;
-
-typedef struct {
-    int width, height;
-    Material *materials;
-    int material_count;
-    float distance_threshold;
-    float time_threshold;
-    float item_rate;
-    float steps_per_second;
-    Vec2 *conveyor_paths;
-    int conveyor_path_count;
-} Physics2D;
-
-Physics2D* create_physics2d(int width, int height, float distance_threshold, float time_threshold, float item_rate, float steps_per_second, Vec2 *conveyor_paths, int conveyor_path_count) {
-    Physics2D *physics = (Physics2D*)malloc(sizeof(Physics2D));
-    physics->width = width;
-    physics->height = height;
-    physics->materials = NULL;
-    physics->material_count = 0;
-    physics->distance_threshold = distance_threshold;
-    physics->time_threshold = time_threshold;
-    physics->item_rate = item_rate;
-    physics->steps_per_second = steps_per_second;
-    physics->conveyor_paths = conveyor_paths;
-    physics->conveyor_path_count = conveyor_path_count;
-    return physics;
-}
-
-void spawn_material(Physics2D *physics, Vec2 pos, const char *material_type) {
-    physics->material_count++;
-    physics->materials = (Material*)realloc(physics->materials, physics->material_count * sizeof(Material));
-    Material *material = &physics->materials[physics->material_count - 1];
-    material->position = pos;
-    material->velocity.x = 0.0;
-    material->velocity.y = 0.0;
-    strncpy(material->type, material_type, 3);
-    material->type[3] = '\0';
-    material->area = 0;
-    material->start_time = time(NULL);
-    material->path_progress = 0.0;
-    material->path_index = 0;
-}
-
-void vectorized_move_materials(Physics2D *physics, float speed) {
-    for (int i = 0; i < physics->material_count; i++) {
-        Material *material = &physics->materials[i];
-        material->path_progress += speed;
-        if (material->path_progress >= 1.0) {
-            material->path_index++;
-            material->path_progress = 0.0;
-        }
-        material->path_index %= physics->conveyor_path_count;
-
-        Vec2 start_pos = physics->conveyor_paths[material->path_index];
-        Vec2 end_pos = physics->conveyor_paths[(material->path_index + 1) % physics->conveyor_path_count];
-        float t = material->path_progress;
-
-        material->position.x = start_pos.x + t * (end_pos.x - start_pos.x);
-        material->position.y = start_pos.y + t * (end_pos.y - start_pos.y);
-    }
-}
-
-void update(Physics2D *physics, float dt) {
-    for (int i = 0; i < physics->material_count; i++) {
-        Material *material = &physics->materials[i];
-        material->position.x += material->velocity.x * dt;
-        material->position.y += material->velocity.y * dt;
-    }
-}
-
-void get_state_array(Physics2D *physics, int **state_array) {
-    for (int i = 0; i < physics->material_count; i++) {
-        Material *material = &physics->materials[i];
-        int x = (int)material->position.x;
-        int y = (int)material->position.y;
-        if (0 <= x && x < physics->width && 0 <= y && y < physics->height) {
-            if (strcmp(material->type, "Cot") == 0) {
-                state_array[x][y] = 1;
-            } else if (strcmp(material->type, "Fab") == 0) {
-                state_array[x][y] = 2;
-            } else if (strcmp(material->type, "Fin") == 0) {
-                state_array[x][y] = 3;
-            }
-        }
-    }
-}
-
-void print_state_array(Physics2D *physics, int **state_array) {
-    for (int y = 0; y < physics->height; y++) {
-        for (int x = 0; x < physics->width; x++) {
-            printf("%d ", state_array[x][y]);
-        }
-        printf("\n");
-    }
-}
-
-void free_physics2d(Physics2D *physics) {
-    free(physics->materials);
-    free(physics);
-}
-EOF
-)"
-
+# The engine source is tracked in the package; setup.py builds it as an extension
+if [ ! -f $SRC_DIR/physics2d.c ]; then
+    cp textilefactorylib/src/physics2d.c $SRC_DIR/physics2d.c
+    echo "Created $SRC_DIR/physics2d.c"
+fi
+
+# The ctypes mirrors of the engine structs live in c_bindings next to physics2d.c;
+# re-export them rather than keeping a second copy that can drift from the C layout
 create_file_if_not_exists "$SRC_DIR/physics2d_bindings.py" "$(cat <<'EOF'
-import ctypes
-import os
-
-# Load the shared library
-_lib_path = os.path.join(os.path.dirname(__file__), 'physics2d.so')
-physics2d_lib = ctypes.CDLL(_lib_path)
-
-# Define the structures
-class Vec2(ctypes.Structure):
-    _fields_ = [("x", ctypes.c_float),
-                ("y", ctypes.c_float)]
-
-class Material(ctypes.Structure):
-    _fields_ = [("position", Vec2),
-                ("velocity", Vec2),
-                ("type", ctypes.c_char * 4),
-                ("area", ctypes.c_int),
-                ("start_time", ctypes.c_long),
-                ("path_progress", ctypes.c_float),
-                ("path_index", ctypes.c_int)]
-
-class Physics2D(ctypes.Structure):
-    _fields_ = [("width", ctypes.c_int),
-                ("height", ctypes.c_int),
-                ("materials", ctypes.POINTER(Material)),
-                ("material_count", ctypes.c_int),
-                ("distance_threshold", ctypes.c_float),
-                ("time_threshold", ctypes.c_float),
-                ("item_rate", ctypes.c_float),
-                ("steps_per_second", ctypes.c_float),
-                ("conveyor_paths", ctypes.POINTER(Vec2)),
-                ("conveyor_path_count", ctypes.c_int)]
-
-# Define the functions
-physics2d_lib.create_physics2d.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.POINTER(Vec2), ctypes.c_int]
-physics2d_lib.create_physics2d.restype = ctypes.POINTER(Physics2D)
-
-physics2d_lib.spawn_material.argtypes = [ctypes.POINTER(Physics2D), Vec2, ctypes.c_char_p]
-
-physics2d_lib.vectorized_move_materials.argtypes = [ctypes.POINTER(Physics2D), ctypes.c_float]
-
-physics2d_lib.update.argtypes = [ctypes.POINTER(Physics2D), ctypes.c_float]
-
-physics2d_lib.get_state_array.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.POINTER(ctypes.c_int))]
-
-physics2d_lib.print_state_array.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.POINTER(ctypes.c_int))]
-
-physics2d_lib.free_physics2d.argtypes = [ctypes.POINTER(Physics2D)]
-
-# Helper functions
-def create_physics2d(width, height, distance_threshold, time_threshold, item_rate, steps_per_second, conveyor_paths):
-    conveyor_paths_array = (Vec2 * len(conveyor_paths))(*conveyor_paths)
-    return physics2d_lib.create_physics2d(width, height, distance_threshold, time_threshold, item_rate, steps_per_second, conveyor_paths_array, len(conveyor_paths))
-
-def spawn_material(physics, pos, material_type):
-    physics2d_lib.spawn_material(physics, pos, material_type.encode('utf-8'))
-
-def vectorized_move_materials(physics, speed):
-    physics2d_lib.vectorized_move_materials(physics, speed)
-
-def update(physics, dt):
-    physics2d_lib.update(physics, dt)
-
-def get_state_array(physics):
-    state_array = [[0 for _ in range(physics.contents.height)] for _ in range(physics.contents.width)]
-    state_array_ptr = (ctypes.POINTER(ctypes.c_int) * physics.contents.width)(*([ctypes.cast(ctypes.pointer(ctypes.c_int(0)), ctypes.POINTER(ctypes.c_int)) for _ in range(physics.contents.height)]))
-    for i in range(physics.contents.width):
-        state_array_ptr[i] = (ctypes.c_int * physics.contents.height)(*state_array[i])
-    physics2d_lib.get_state_array(physics, state_array_ptr)
-    for i in range(physics.contents.width):
-        for j in range(physics.contents.height):
-            state_array[i][j] = state_array_ptr[i][j]
-    return state_array
-
-def print_state_array(physics):
-    state_array = get_state_array(physics)
-    physics2d_lib.print_state_array(physics, (ctypes.POINTER(ctypes.c_int) * physics.contents.width)(*([ctypes.cast(ctypes.pointer(ctypes.c_int(0)), ctypes.POINTER(ctypes.c_int)) for _ in range(physics.contents.height)])))
-
-def free_physics2d(physics):
-    physics2d_lib.free_physics2d(physics)
+from textilefactorylib.src.c_bindings import *
 EOF
 )"
 
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from . import c_bindings
+from .c_bindings import Vec2
+from .params import load_params
+
+SIZES = (1000, 10000, 100000, 1000000)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+V1_SCRIPT = os.path.join(REPO_ROOT, 'v1', 'main.py')
+
+def best_time(function, repeat):
+    # Fastest of `repeat` runs: the least disturbed by other work on the machine
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def create_engine(params, threads):
+    physics = c_bindings.create_physics2d(
+        params['global_resolution'][0],
+        params['global_resolution'][1],
+        params['distance_threshold'],
+        params['time_threshold'],
+        params['item_rate'],
+        params['steps_per_second'],
+        [Vec2(*pos) for pos in params['conveyor_paths']]
+    )
+    physics.contents.threads = threads
+    return physics
+
+def populated_engine(params, size, threads):
+    # `size` materials spread over the first half of the conveyor in 50 waves,
+    # so the grid and path lookups see a realistic spread rather than one cell
+    physics = create_engine(params, threads)
+    segments = len(params['conveyor_paths']) - 1
+    for wave in range(50):
+        count = size // 50 + (wave < size % 50)
+        c_bindings.spawn_materials_batch(physics, np.repeat([params['conveyor_paths'][0]], count, axis=0), np.full(count, 1 + wave % 2))
+        c_bindings.vectorized_move_materials(physics, segments / 100)
+    return physics
+
+def item_result(seconds, size):
+    return {"seconds": seconds, "items": size, "ns_per_item": seconds / size * 1e9}
+
+def bench_spawn(params, size, repeat, threads):
+    # One engine call per material, as the render loop spawns
+    entrance = Vec2(*params['conveyor_paths'][0])
+    def spawn():
+        physics = create_engine(params, threads)
+        start = time.perf_counter()
+        for i in range(size):
+            c_bindings.spawn_material(physics, entrance, 1 + i % 2)
+        elapsed = time.perf_counter() - start
+        c_bindings.free_physics2d(physics)
+        return elapsed
+    return item_result(min(spawn() for _ in range(repeat)), size)
+
+def bench_spawn_batch(params, size, repeat, threads):
+    positions = np.repeat([params['conveyor_paths'][0]], size, axis=0).astype(np.float32)
+    types = np.ones(size, dtype=np.int32)
+    def spawn():
+        physics = create_engine(params, threads)
+        start = time.perf_counter()
+        c_bindings.spawn_materials_batch(physics, positions, types)
+        elapsed = time.perf_counter() - start
+        c_bindings.free_physics2d(physics)
+        return elapsed
+    return item_result(min(spawn() for _ in range(repeat)), size)
+
+def bench_engine_call(call):
+    # A case timing one engine call on a populated engine
+    def bench(params, size, repeat, threads):
+        physics = populated_engine(params, size, threads)
+        try:
+            return item_result(best_time(lambda: call(physics), repeat), size)
+        finally:
+            c_bindings.free_physics2d(physics)
+    return bench
+
+def bench_v1_headless(seconds, repeat):
+    # The v1 frame loop without a display. The script reports the wall time of
+    # its loop, which leaves out interpreter start-up and pygame initialisation.
+    best = float('inf')
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, V1_SCRIPT, '--headless', '--sim-seconds', str(seconds)],
+                                capture_output=True, text=True, check=True).stdout
+        best = min(best, float(re.search(r"in ([\d.]+) s wall time", output).group(1)))
+    ticks = int(round(seconds * 60))
+    return {"seconds": best, "ticks": ticks, "us_per_tick": best / ticks * 1e6}
+
+def bench_load_params(path, repeat):
+    return {"seconds": best_time(lambda: load_params(path), repeat)}
+
+# Hot paths timed at every size, by name
+SIZED_CASES = {
+    "spawn_material": bench_spawn,
+    "spawn_materials_batch": bench_spawn_batch,
+    "vectorized_move_materials": bench_engine_call(lambda physics: c_bindings.vectorized_move_materials(physics, 1e-4)),
+    "update": bench_engine_call(lambda physics: c_bindings.update(physics, 1 / 60)),
+    "get_state_array": bench_engine_call(c_bindings.get_state_array),
+}
+
+def run_benchmarks(params_path='params.json', sizes=SIZES, repeat=5, threads=1, v1_seconds=120, cases=None):
+    # Returns {"meta": {...}, "results": {"case/size": {...}}}; `seconds` is the compared metric
+    params = load_params(params_path)
+    results = {}
+    for name, bench in SIZED_CASES.items():
+        if cases is not None and name not in cases:
+            continue
+        for size in sizes:
+            results[f"{name}/{size}"] = bench(params, size, repeat, threads)
+    if cases is None or "load_params" in cases:
+        results["load_params"] = bench_load_params(params_path, repeat)
+    if (cases is None or "v1_headless" in cases) and v1_seconds > 0 and os.path.exists(V1_SCRIPT):
+        results["v1_headless"] = bench_v1_headless(v1_seconds, min(repeat, 3))
+    meta = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "threads": threads,
+        "repeat": repeat,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+def compare(results, baseline, threshold=0.25):
+    # One row per case present in both runs; a case regressed when it is more
+    # than `threshold` (0.25 = 25%) slower than the baseline
+    rows = []
+    for key, current in results["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None or previous["seconds"] <= 0:
+            continue
+        ratio = current["seconds"] / previous["seconds"]
+        rows.append({"case": key, "baseline": previous["seconds"], "current": current["seconds"], "ratio": ratio, "regressed": ratio > 1 + threshold})
+    return rows
+
+def format_rows(rows):
+    lines = [f"{'case':<36} {'baseline':>12} {'current':>12} {'ratio':>7}"]
+    for row in rows:
+        flag = "  REGRESSED" if row["regressed"] else ""
+        lines.append(f"{row['case']:<36} {row['baseline']:>12.6f} {row['current']:>12.6f} {row['ratio']:>7.2f}{flag}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths")
+    parser.add_argument('--params', default='params.json', help='Parameters JSON file for the conveyor layout and the load_params case')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='Material counts to time each engine case at (default: 1k 10k 100k 1M)')
+    parser.add_argument('--cases', nargs='+', choices=sorted(SIZED_CASES) + ["load_params", "v1_headless"], help='Only run these cases')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case; the fastest is kept')
+    parser.add_argument('--threads', type=int, default=1, help='Engine threads, 0 for one per core')
+    parser.add_argument('--v1-seconds', type=float, default=120, help='Simulated seconds for the v1 headless case, 0 to skip it')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results')
+    parser.add_argument('--baseline', help='Results file from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Fail when a case is this fraction slower than the baseline (default: 0.25)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.params, args.sizes, args.repeat, args.threads, args.v1_seconds, args.cases)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Wrote {len(results['results'])} benchmark results to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as file:
+            rows = compare(results, json.load(file), args.threshold)
+        print(format_rows(rows))
+        regressed = [row["case"] for row in rows if row["regressed"]]
+        if regressed:
+            print(f"{len(regressed)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,80 +1,331 @@
 import ctypes
-import os
 
-# Load the shared library
-_lib_path = os.path.join(os.path.dirname(__file__), 'physics2d.so')
-physics2d_lib = ctypes.CDLL(_lib_path)
+import numpy as np
+
+from . import physics2d as _physics2d
+from .snapshot import Snapshot, write_snapshot
+
+# The engine is a CPython extension (built by setup.py). Its module functions are
+# fast paths for the calls made every step; everything else goes through ctypes
+# on the same shared library, which also provides the struct field access.
+physics2d_lib = ctypes.CDLL(_physics2d.__file__)
+
+# Material type codes shared with the engine; also the values in the state array
+MATERIAL_TYPES = {"Cot": 1, "Fab": 2, "Fin": 3}
+
+def material_type_code(material_type):
+    # Accept either a type name ("Cot") or an integer code
+    if isinstance(material_type, str):
+        return MATERIAL_TYPES[material_type]
+    return int(material_type)
 
 # Define the structures
 class Vec2(ctypes.Structure):
     _fields_ = [("x", ctypes.c_float),
                 ("y", ctypes.c_float)]
 
-class Material(ctypes.Structure):
-    _fields_ = [("position", Vec2),
-                ("velocity", Vec2),
-                ("type", ctypes.c_char * 4),
-                ("area", ctypes.c_int),
-                ("start_time", ctypes.c_long),
-                ("path_progress", ctypes.c_float),
-                ("path_index", ctypes.c_int)]
+class MaterialStore(ctypes.Structure):
+    _fields_ = [("count", ctypes.c_int),
+                ("capacity", ctypes.c_int),
+                ("position_x", ctypes.POINTER(ctypes.c_float)),
+                ("position_y", ctypes.POINTER(ctypes.c_float)),
+                ("velocity_x", ctypes.POINTER(ctypes.c_float)),
+                ("velocity_y", ctypes.POINTER(ctypes.c_float)),
+                ("path_progress", ctypes.POINTER(ctypes.c_float)),
+                ("path_index", ctypes.POINTER(ctypes.c_int32)),
+                ("type", ctypes.POINTER(ctypes.c_int32)),
+                ("area", ctypes.POINTER(ctypes.c_int32)),
+                ("start_time", ctypes.POINTER(ctypes.c_int64)),
+                ("dwell", ctypes.POINTER(ctypes.c_int32))]
 
 class Physics2D(ctypes.Structure):
     _fields_ = [("width", ctypes.c_int),
                 ("height", ctypes.c_int),
-                ("materials", ctypes.POINTER(Material)),
-                ("material_count", ctypes.c_int),
+                ("materials", MaterialStore),
+                ("completed_count", ctypes.c_int),
                 ("distance_threshold", ctypes.c_float),
                 ("time_threshold", ctypes.c_float),
                 ("item_rate", ctypes.c_float),
                 ("steps_per_second", ctypes.c_float),
                 ("conveyor_paths", ctypes.POINTER(Vec2)),
-                ("conveyor_path_count", ctypes.c_int)]
+                ("conveyor_path_count", ctypes.c_int),
+                ("state_array", ctypes.POINTER(ctypes.c_int32)),
+                ("path_lengths", ctypes.POINTER(ctypes.c_float)),
+                ("path_directions", ctypes.POINTER(Vec2)),
+                ("segment_stations", ctypes.POINTER(ctypes.c_int32)),
+                ("segment_dwell", ctypes.POINTER(ctypes.c_int32)),
+                ("path_length", ctypes.c_float),
+                ("segment_length", ctypes.c_float),
+                ("tick", ctypes.c_int64),
+                ("completed_ticks", ctypes.c_int64),
+                ("min_spacing", ctypes.c_float),
+                ("grid_dirty", ctypes.c_int),
+                ("grid_capacity", ctypes.c_int),
+                ("cell_start", ctypes.POINTER(ctypes.c_int32)),
+                ("cell_items", ctypes.POINTER(ctypes.c_int32)),
+                ("material_hold", ctypes.POINTER(ctypes.c_int32)),
+                ("threads", ctypes.c_int),
+                ("finished_items", ctypes.POINTER(ctypes.c_int32))]
+
+class StepState(ctypes.Structure):
+    _fields_ = [("dt", ctypes.c_double),
+                ("spawn_interval", ctypes.c_double),
+                ("speed", ctypes.c_float),
+                ("spawn_enabled", ctypes.c_int),
+                ("auto_move", ctypes.c_int),
+                ("ticks", ctypes.c_int64),
+                ("last_spawn_time", ctypes.c_double),
+                ("spawned_count", ctypes.c_int64),
+                ("wip_ticks", ctypes.c_int64)]
 
 # Define the functions
 physics2d_lib.create_physics2d.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.POINTER(Vec2), ctypes.c_int]
 physics2d_lib.create_physics2d.restype = ctypes.POINTER(Physics2D)
 
-physics2d_lib.spawn_material.argtypes = [ctypes.POINTER(Physics2D), Vec2, ctypes.c_char_p]
+physics2d_lib.set_segment_stations.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.c_int32)]
+
+physics2d_lib.set_segment_dwell.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.c_int32)]
+
+physics2d_lib.spawn_material.argtypes = [ctypes.POINTER(Physics2D), Vec2, ctypes.c_int32]
+
+physics2d_lib.spawn_materials_batch.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(Vec2), ctypes.POINTER(ctypes.c_int32), ctypes.c_int]
+physics2d_lib.spawn_materials_batch.restype = ctypes.c_int
+
+physics2d_lib.restore_materials.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(MaterialStore)]
+physics2d_lib.restore_materials.restype = ctypes.c_int
+
+physics2d_lib.build_spatial_grid.argtypes = [ctypes.POINTER(Physics2D)]
+physics2d_lib.build_spatial_grid.restype = ctypes.c_int
+
+physics2d_lib.query_radius.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(Vec2), ctypes.c_int, ctypes.c_float, ctypes.POINTER(ctypes.c_int32), ctypes.POINTER(ctypes.c_int32), ctypes.c_int]
+physics2d_lib.query_radius.restype = ctypes.c_int
+
+physics2d_lib.nearest_neighbors.argtypes = [ctypes.POINTER(Physics2D), ctypes.c_float, ctypes.POINTER(ctypes.c_int32), ctypes.POINTER(ctypes.c_float)]
+physics2d_lib.nearest_neighbors.restype = ctypes.c_int
+
+physics2d_lib.count_neighbors.argtypes = [ctypes.POINTER(Physics2D), ctypes.c_float, ctypes.POINTER(ctypes.c_int32)]
+physics2d_lib.count_neighbors.restype = ctypes.c_int
 
 physics2d_lib.vectorized_move_materials.argtypes = [ctypes.POINTER(Physics2D), ctypes.c_float]
 
 physics2d_lib.update.argtypes = [ctypes.POINTER(Physics2D), ctypes.c_float]
 
-physics2d_lib.get_state_array.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.POINTER(ctypes.c_int))]
+physics2d_lib.count_area_materials.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.c_int32), ctypes.c_int]
+
+physics2d_lib.run_steps.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(StepState), ctypes.c_int]
+physics2d_lib.run_steps.restype = ctypes.c_int
+
+physics2d_lib.copy_material_state.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.c_float), ctypes.POINTER(ctypes.c_int32), ctypes.c_int]
+physics2d_lib.copy_material_state.restype = ctypes.c_int
 
-physics2d_lib.print_state_array.argtypes = [ctypes.POINTER(Physics2D), ctypes.POINTER(ctypes.POINTER(ctypes.c_int))]
+physics2d_lib.get_state_array.argtypes = [ctypes.POINTER(Physics2D)]
+physics2d_lib.get_state_array.restype = ctypes.POINTER(ctypes.c_int32)
+
+physics2d_lib.print_state_array.argtypes = [ctypes.POINTER(Physics2D)]
 
 physics2d_lib.free_physics2d.argtypes = [ctypes.POINTER(Physics2D)]
 
+class _Engine:
+    # Owner of one engine. The registry holds it until free_physics2d, and every
+    # array view of engine memory holds it too, so the engine is freed only once
+    # both are gone and no view can outlive the memory it reads.
+    def __init__(self, physics):
+        self.physics = physics
+        self._free = physics2d_lib.free_physics2d
+
+    def __del__(self):
+        self._free(self.physics)
+
+# Live engines by address, see _Engine
+_engines = {}
+
+def _address(physics):
+    return ctypes.cast(physics, ctypes.c_void_p).value
+
+class _EngineView:
+    # Array interface over engine memory; NumPy keeps it as the array's base, so
+    # the view keeps the engine's owner alive
+    def __init__(self, owner, address, shape, dtype):
+        self.owner = owner
+        self.__array_interface__ = {"version": 3, "data": (address, False), "shape": shape, "typestr": np.dtype(dtype).str}
+
+def _engine_owner(physics):
+    owner = _engines.get(_address(physics))
+    if owner is None:
+        raise ValueError("physics2d engine has been freed")
+    return owner
+
+def _engine_array(owner, address, shape, dtype):
+    return np.asarray(_EngineView(owner, address, shape, dtype))
+
 # Helper functions
-def create_physics2d(width, height, distance_threshold, time_threshold, item_rate, steps_per_second, conveyor_paths):
+def create_physics2d(width, height, distance_threshold, time_threshold, item_rate, steps_per_second, conveyor_paths, segment_stations=None, segment_dwell=None):
+    # The engine spawns at the first point and needs at least one segment to move along
+    if len(conveyor_paths) < 2:
+        raise ValueError(f"conveyor_paths needs at least 2 points, got {len(conveyor_paths)}")
     conveyor_paths_array = (Vec2 * len(conveyor_paths))(*conveyor_paths)
-    return physics2d_lib.create_physics2d(width, height, distance_threshold, time_threshold, item_rate, steps_per_second, conveyor_paths_array, len(conveyor_paths))
+    physics = physics2d_lib.create_physics2d(width, height, distance_threshold, time_threshold, item_rate, steps_per_second, conveyor_paths_array, len(conveyor_paths))
+    _engines[_address(physics)] = _Engine(physics)
+    if segment_stations is not None:
+        set_segment_stations(physics, segment_stations)
+    if segment_dwell is not None:
+        set_segment_dwell(physics, segment_dwell)
+    return physics
+
+def set_segment_stations(physics, segment_stations):
+    # One station index per conveyor segment (len(conveyor_paths) - 1 entries)
+    segment_stations = np.ascontiguousarray(segment_stations, dtype=np.int32)
+    if len(segment_stations) != max(physics.contents.conveyor_path_count - 1, 0):
+        raise ValueError("segment_stations needs one entry per conveyor segment")
+    physics2d_lib.set_segment_stations(physics, segment_stations.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)))
+
+def set_segment_dwell(physics, segment_dwell):
+    # Processing steps at the station reached at the start of each conveyor segment
+    segment_dwell = np.ascontiguousarray(segment_dwell, dtype=np.int32)
+    if len(segment_dwell) != max(physics.contents.conveyor_path_count - 1, 0):
+        raise ValueError("segment_dwell needs one entry per conveyor segment")
+    physics2d_lib.set_segment_dwell(physics, segment_dwell.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)))
 
 def spawn_material(physics, pos, material_type):
-    physics2d_lib.spawn_material(physics, pos, material_type.encode('utf-8'))
+    physics2d_lib.spawn_material(physics, pos, material_type_code(material_type))
+
+def spawn_materials_batch(physics, positions, type_codes):
+    # positions: (N, 2) float32 array, type_codes: (N,) int32 array; one FFI call for all N
+    positions = np.ascontiguousarray(positions, dtype=np.float32).reshape(-1, 2)
+    type_codes = np.ascontiguousarray(type_codes, dtype=np.int32).reshape(-1)
+    if len(positions) != len(type_codes):
+        raise ValueError("positions and type_codes must have the same length")
+    return _physics2d.spawn_batch(physics, positions, type_codes)
+
+def build_spatial_grid(physics):
+    # Queries rebuild a stale grid themselves; call this to pay the cost up front
+    if physics2d_lib.build_spatial_grid(physics) != 0:
+        raise MemoryError("physics2d could not grow the spatial grid")
+
+def _radius(physics, radius):
+    # Proximity queries default to the engine's distance_threshold
+    return physics.contents.distance_threshold if radius is None else radius
+
+def query_radius(physics, points, radius=None):
+    # Materials within `radius` of each of the (N, 2) points, as CSR arrays: the
+    # matches for point q are indices[offsets[q]:offsets[q + 1]]
+    points = np.ascontiguousarray(points, dtype=np.float32).reshape(-1, 2)
+    radius = _radius(physics, radius)
+    offsets = np.empty(len(points) + 1, dtype=np.int32)
+    indices = np.empty(max(8 * len(points), 1), dtype=np.int32)
+    while True:
+        total = physics2d_lib.query_radius(
+            physics,
+            points.ctypes.data_as(ctypes.POINTER(Vec2)),
+            len(points),
+            radius,
+            offsets.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)),
+            indices.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)),
+            len(indices)
+        )
+        if total < 0:
+            raise MemoryError("physics2d could not grow the spatial grid")
+        if total <= len(indices):
+            return offsets, indices[:total]
+        indices = np.empty(total, dtype=np.int32)
+
+def nearest_neighbors(physics, max_radius=None):
+    # Index of and distance to each material's closest other material within max_radius (-1 if none)
+    max_radius = _radius(physics, max_radius)
+    count = physics.contents.materials.count
+    neighbors = np.empty(count, dtype=np.int32)
+    distances = np.empty(count, dtype=np.float32)
+    if physics2d_lib.nearest_neighbors(physics, max_radius, neighbors.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)), distances.ctypes.data_as(ctypes.POINTER(ctypes.c_float))) != 0:
+        raise MemoryError("physics2d could not grow the spatial grid")
+    return neighbors, distances
+
+def count_neighbors(physics, radius=None):
+    # Number of other materials within `radius` of each material
+    counts = np.empty(physics.contents.materials.count, dtype=np.int32)
+    if physics2d_lib.count_neighbors(physics, _radius(physics, radius), counts.ctypes.data_as(ctypes.POINTER(ctypes.c_int32))) != 0:
+        raise MemoryError("physics2d could not grow the spatial grid")
+    return counts
 
 def vectorized_move_materials(physics, speed):
-    physics2d_lib.vectorized_move_materials(physics, speed)
+    _physics2d.move_materials(physics, speed)
 
 def update(physics, dt):
-    physics2d_lib.update(physics, dt)
+    _physics2d.update(physics, dt)
+
+def count_area_materials(physics, area_count, out=None):
+    # Live materials per area in one pass over the engine, into `out` if given
+    counts = out if out is not None else np.empty(area_count, dtype=np.int32)
+    _physics2d.count_area_materials(physics, counts[:area_count])
+    return counts
+
+def run_steps(physics, state, steps):
+    # `steps` full simulation steps in one call, run without the GIL
+    _physics2d.run_steps(physics, state, steps)
+    return state
 
 def get_state_array(physics):
-    state_array = [[0 for _ in range(physics.contents.height)] for _ in range(physics.contents.width)]
-    state_array_ptr = (ctypes.POINTER(ctypes.c_int) * physics.contents.width)(*([ctypes.cast(ctypes.pointer(ctypes.c_int(0)), ctypes.POINTER(ctypes.c_int)) for _ in range(physics.contents.height)]))
-    for i in range(physics.contents.width):
-        state_array_ptr[i] = (ctypes.c_int * physics.contents.height)(*state_array[i])
-    physics2d_lib.get_state_array(physics, state_array_ptr)
-    for i in range(physics.contents.width):
-        for j in range(physics.contents.height):
-            state_array[i][j] = state_array_ptr[i][j]
-    return state_array
+    # Zero-copy (width, height) int32 view of the engine-owned grid, refreshed in place on every call.
+    # The view keeps the engine alive, so it stays valid after free_physics2d.
+    owner = _engine_owner(physics)
+    return _engine_array(owner, _physics2d.state_array(physics), (physics.contents.width, physics.contents.height), np.int32)
+
+def copy_material_state(physics, positions, types):
+    # Fill a float32 (N, 2) positions array and an int32 (N,) types array with up to
+    # N materials in one call; returns how many were copied
+    return _physics2d.copy_materials(physics, positions, types)
+
+def get_material_arrays(physics):
+    # Zero-copy views of the live [0, count) slice of each material array.
+    # Spawning may grow (and move) the pool, so fetch fresh views after spawning.
+    # Like the state array, the views keep the engine alive after free_physics2d.
+    owner = _engine_owner(physics)
+    store = physics.contents.materials
+    arrays = {}
+    for name, field_type in MaterialStore._fields_[2:]:
+        if store.count == 0:
+            arrays[name] = np.empty(0, dtype=field_type._type_)
+        else:
+            arrays[name] = _engine_array(owner, _address(getattr(store, name)), (store.count,), field_type._type_)
+    return arrays
+
+# Engine counters saved alongside the material arrays in a snapshot
+SNAPSHOT_COUNTERS = ("completed_count", "tick", "completed_ticks")
+
+def save_snapshot(physics, path, metadata=None):
+    # Material arrays and engine counters, plus any caller metadata, in the binary snapshot format
+    engine = {name: getattr(physics.contents, name) for name in SNAPSHOT_COUNTERS}
+    engine["conveyor_path_count"] = physics.contents.conveyor_path_count
+    write_snapshot(path, get_material_arrays(physics), {"engine": engine, "metadata": metadata or {}})
+
+def _restore_materials(physics, arrays):
+    # Point a MaterialStore at the mapped arrays and copy them into the engine in one call
+    count = len(arrays["type"])
+    source = MaterialStore(count=count, capacity=count)
+    for name, field_type in MaterialStore._fields_[2:]:
+        array = np.ascontiguousarray(arrays[name], dtype=field_type._type_)
+        if len(array) != count:
+            raise ValueError(f"snapshot array {name} has {len(array)} entries, expected {count}")
+        setattr(source, name, array.ctypes.data_as(field_type))
+    if physics2d_lib.restore_materials(physics, ctypes.byref(source)) != 0:
+        raise MemoryError("physics2d could not grow the material pool")
+
+def load_snapshot(physics, path):
+    # Replace the engine's materials and counters with a snapshot taken on the same
+    # conveyor, mapped from disk rather than respawned. Returns the caller metadata.
+    with Snapshot(path) as snapshot:
+        engine = snapshot.metadata["engine"]
+        if engine["conveyor_path_count"] != physics.contents.conveyor_path_count:
+            raise ValueError("snapshot was taken on a conveyor with a different number of points")
+        _restore_materials(physics, snapshot.arrays)
+        for name in SNAPSHOT_COUNTERS:
+            setattr(physics.contents, name, engine[name])
+        return snapshot.metadata["metadata"]
 
 def print_state_array(physics):
-    state_array = get_state_array(physics)
-    physics2d_lib.print_state_array(physics, (ctypes.POINTER(ctypes.c_int) * physics.contents.width)(*([ctypes.cast(ctypes.pointer(ctypes.c_int(0)), ctypes.POINTER(ctypes.c_int)) for _ in range(physics.contents.height)])))
+    physics2d_lib.get_state_array(physics)
+    physics2d_lib.print_state_array(physics)
 
 def free_physics2d(physics):
-    physics2d_lib.free_physics2d(physics)
\ No newline at end of file
+    # Release the engine; the memory goes once the last array view of it is dropped.
+    # Freeing an engine twice is a no-op.
+    _engines.pop(_address(physics), None)
\ No newline at end of file
@@ -1,16 +1,154 @@
 import argparse
-from .core import FactorySimulation
+import json
+import multiprocessing
+import os
+import sys
+from .events import check_event_params
+from .fleet import FactoryFleet
+from .main import FactorySimulation, check_tick_params
 from .params import load_params
+from .profiler import StageProfiler
+from .render import FrameExporter, OffscreenRenderer, render_run
+from .server import StateServer
+from .shared_state import SharedStateWriter
+from .sweep import ENGINES, run_sweep, write_results
+from .telemetry import SINKS, TelemetryRecorder
+from .viewer import run_viewer
 
 def main():
     parser = argparse.ArgumentParser(description="Factory Simulation")
     parser.add_argument('--params', default='params.json', help='Path to the parameters JSON file')
     parser.add_argument('--print-only', action='store_true', help='Print the state arrays instead of rendering')
+    parser.add_argument('--headless', action='store_true', help='Run on a simulated clock as fast as possible and print the final KPIs')
+    parser.add_argument('--sim-seconds', type=float, default=28800, help='Simulated seconds to run in headless mode (default: one 8 hour shift)')
+    parser.add_argument('--sweep', help='Path to a JSON grid of parameter values to sweep in headless mode')
+    parser.add_argument('--sweep-output', default='sweep_results.csv', help='Sweep results table (.csv or .parquet)')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='tick', help='Headless engine: fixed-tick stepping or discrete events (default: tick)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for --sweep, or threads for --fleet and --render-dir (default: all cores)')
+    parser.add_argument('--telemetry', help=f"Stream per-tick metrics to this file ({', '.join(sorted(SINKS))}); tick engine only")
+    parser.add_argument('--fleet', nargs='+', metavar='PARAMS', help='Run one factory line per params file on a thread pool and print plant and per-line KPIs')
+    parser.add_argument('--load-snapshot', help='Resume from a snapshot file saved with --save-snapshot')
+    parser.add_argument('--save-snapshot', help='Write a snapshot of the final state after a headless run')
+    parser.add_argument('--profile', action='store_true', help='Time each stage of every tick and add p50/p95/p99 per stage to the output; tick engine only')
+    parser.add_argument('--profile-output', help='Also write the stage timings to this file (.csv or .json)')
+    parser.add_argument('--publish', metavar='NAME', help='Publish every tick to the shared memory block NAME for viewer processes; tick engine only')
+    parser.add_argument('--viewers', type=int, default=0, help='Viewer processes to start on the --publish block')
+    parser.add_argument('--capacity', type=int, default=65536, help='Materials per published frame (default: 65536)')
+    parser.add_argument('--view', metavar='NAME', help='Open a viewer on a block published with --publish and exit when the run ends')
+    parser.add_argument('--serve', metavar='[HOST:]PORT', help='Stream live state to WebSocket and /events clients on this port (host defaults to 127.0.0.1); tick engine only')
+    parser.add_argument('--serve-fps', type=float, default=30, help='Frames per second sent to --serve clients, 0 for every tick (default: 30)')
+    parser.add_argument('--render-dir', help='Render frames offscreen on the simulated clock and write them to this directory as a PNG sequence')
+    parser.add_argument('--encoder', help="Pipe rendered frames as raw RGB24 to this command; {width}, {height} and {fps} are filled in, e.g. 'ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - out.mp4'")
+    parser.add_argument('--frame-stride', type=int, default=60, help='Ticks between rendered frames (default: 60, one frame per simulated second)')
+    parser.add_argument('--render-scale', type=int, default=10, help='Pixels per floor unit in rendered frames (default: 10)')
+    parser.add_argument('--video-fps', type=float, default=30, help='Frame rate passed to --encoder as {fps} (default: 30)')
+    parser.add_argument('--threads', type=int, help="Engine threads per simulation, 0 for one per core (overrides the params 'threads')")
     args = parser.parse_args()
+    if args.telemetry and (args.sweep or args.engine != 'tick'):
+        parser.error("--telemetry records a single run of the tick engine")
+    if (args.load_snapshot or args.save_snapshot) and (args.sweep or args.engine != 'tick'):
+        parser.error("snapshots are taken of a single run of the tick engine")
+    if args.profile_output:
+        args.profile = True
+        if not args.profile_output.lower().endswith(('.csv', '.json')):
+            parser.error("--profile-output must be a .csv or .json file")
+    if args.profile and (args.sweep or args.fleet or args.engine != 'tick'):
+        parser.error("--profile times a single run of the tick engine")
+    if args.publish and (args.sweep or args.fleet or args.engine != 'tick'):
+        parser.error("--publish shares a single run of the tick engine")
+    if args.serve and (args.sweep or args.fleet or args.engine != 'tick'):
+        parser.error("--serve streams a single run of the tick engine")
+    if args.serve and args.publish:
+        parser.error("--serve and --publish cannot be combined")
+    rendering = args.render_dir or args.encoder
+    if rendering and (args.sweep or args.fleet or args.engine != 'tick'):
+        parser.error("--render-dir and --encoder render a single run of the tick engine")
+    if args.frame_stride < 1:
+        parser.error("--frame-stride must be at least 1")
+    if args.viewers and not args.publish:
+        parser.error("--viewers needs --publish")
+    if args.threads is not None and args.fleet:
+        parser.error("fleet lines take 'threads' from their params files")
+
+    if args.view:
+        run_viewer(args.view, load_params(args.params) if os.path.exists(args.params) else None)
+        return
+
+    if args.fleet:
+        with FactoryFleet.from_files(args.fleet, workers=args.workers) as fleet:
+            print(json.dumps(fleet.run_headless(args.sim_seconds), indent=4))
+        return
 
     params = load_params(args.params)
-    simulation = FactorySimulation(params, print_only=args.print_only)
-    simulation.run()
+    if args.threads is not None:
+        params['threads'] = args.threads
+    try:
+        if args.engine == 'tick':
+            check_tick_params(params)
+        else:
+            check_event_params(params)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.sweep:
+        rows = run_sweep(params, load_params(args.sweep), args.sim_seconds, workers=args.workers, engine=args.engine)
+        write_results(rows, args.sweep_output)
+        print(f"Wrote {len(rows)} sweep results to {args.sweep_output}")
+        return
+
+    if args.headless or rendering:
+        simulation = ENGINES[args.engine](params)
+    else:
+        simulation = FactorySimulation(params, print_only=args.print_only)
+    if args.load_snapshot:
+        simulation.load_snapshot(args.load_snapshot)
+    telemetry = None
+    if args.telemetry:
+        telemetry = simulation.telemetry = TelemetryRecorder(args.telemetry, list(params.get('factory_layout', {})))
+    profiler = None
+    if args.profile:
+        profiler = simulation.profiler = StageProfiler()
+    publisher = None
+    viewers = []
+    if args.publish:
+        width, height = params['global_resolution']
+        publisher = simulation.publisher = SharedStateWriter(args.publish, args.capacity, width, height)
+        for _ in range(args.viewers):
+            viewer = multiprocessing.Process(target=run_viewer, args=(publisher.name, params), daemon=True)
+            viewer.start()
+            viewers.append(viewer)
+    server = None
+    if args.serve:
+        host, _, port = args.serve.rpartition(':')
+        server = simulation.publisher = StateServer(params, host or '127.0.0.1', int(port), args.serve_fps).start()
+        print(f"Serving live state on ws://{server.host}:{server.port}/ and http://{server.host}:{server.port}/events", file=sys.stderr)
+    try:
+        if rendering or args.headless:
+            if rendering:
+                renderer = OffscreenRenderer(params, args.render_scale)
+                exporter = FrameExporter(renderer.size, args.render_dir, args.encoder, args.video_fps, args.workers)
+                results = render_run(simulation, args.sim_seconds, renderer, exporter, args.frame_stride)
+            else:
+                results = simulation.run_headless(args.sim_seconds)
+            if profiler is not None:
+                results["profile"] = profiler.summary()
+            print(json.dumps(results, indent=4))
+            if args.save_snapshot:
+                simulation.save_snapshot(args.save_snapshot)
+        else:
+            simulation.run()
+            if profiler is not None:
+                print(profiler.format())
+    finally:
+        if telemetry is not None:
+            telemetry.close()
+        if profiler is not None and args.profile_output:
+            profiler.export(args.profile_output)
+        if publisher is not None:
+            publisher.close()
+            for viewer in viewers:
+                viewer.join()
+        if server is not None:
+            server.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
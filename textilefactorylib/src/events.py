@@ -0,0 +1,326 @@
+import heapq
+import time
+import numpy as np
+from .main import segment_stations, segment_dwell, simulation_results
+
+# Event kinds, in the order they are handled within a tick: materials move and
+# finish before the entrance spawns, as in FactorySimulation.step
+COMPLETE, ARRIVE, FINISH, SPAWN = range(4)
+
+def check_event_params(params):
+    # Belt spacing is modelled by the tick engine only; the event engine moves each
+    # material independently, so it would silently ignore min_spacing and disagree with it
+    if params.get('min_spacing', 0.0) > 0:
+        raise ValueError(f"min_spacing is only modelled by the tick engine (--engine tick); "
+                         f"got {params['min_spacing']}")
+
+class RingBuffer:
+    # FIFO over a preallocated array. A bounded buffer never grows; an unbounded
+    # one doubles its storage when full, so push and pop stay amortized O(1).
+    def __init__(self, size=None, dtype=np.int64):
+        self.bounded = size is not None
+        self.items = np.zeros(max(size, 1) if self.bounded else 16, dtype=dtype)
+        self.head = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def push(self, value):
+        if self.length == len(self.items):
+            if self.bounded:
+                raise OverflowError("ring buffer is full")
+            self.items = np.roll(self.items, -self.head)
+            self.items = np.concatenate([self.items, np.zeros_like(self.items)])
+            self.head = 0
+        self.items[(self.head + self.length) % len(self.items)] = value
+        self.length += 1
+
+    def pop(self):
+        if self.length == 0:
+            raise IndexError("pop from an empty ring buffer")
+        value = self.items[self.head]
+        self.head = (self.head + 1) % len(self.items)
+        self.length -= 1
+        return value
+
+class Station:
+    # A processing station with `capacity` servers and an input buffer of
+    # `buffer_size` materials, counting those on the conveyor towards it. A server
+    # whose finished material has no room downstream stays blocked until it does.
+    # Busy, blocked and queued materials are integrated over time at every change.
+    def __init__(self, name, segment, dwell, capacity=None, buffer_size=None):
+        if capacity is not None and capacity < 1 or buffer_size is not None and buffer_size < 1:
+            raise ValueError(f"{name}: capacity and buffer_size must be at least 1")
+        self.name = name
+        self.segment = segment
+        self.dwell = dwell
+        self.capacity = capacity if capacity is not None else float('inf')
+        self.buffer_size = buffer_size if buffer_size is not None else float('inf')
+        self.queue = RingBuffer(buffer_size)  # arrival tick of each waiting material
+        self.upstream = None
+        self.busy = 0
+        self.blocked = 0
+        self.in_transit = 0
+        self.processed = 0
+        self.max_queue = 0
+        self.busy_ticks = 0
+        self.blocked_ticks = 0
+        self.queue_ticks = 0
+        self.wait_ticks = 0
+        self.last_tick = 0
+
+    def accumulate(self, tick):
+        elapsed = tick - self.last_tick
+        if elapsed:
+            self.busy_ticks += self.busy * elapsed
+            self.blocked_ticks += self.blocked * elapsed
+            self.queue_ticks += len(self.queue) * elapsed
+            self.last_tick = tick
+
+    def free(self):
+        return self.capacity - self.busy - self.blocked
+
+    def space(self):
+        return self.buffer_size - self.in_transit - len(self.queue)
+
+    def results(self, ticks, dt):
+        ticks = max(ticks, 1)
+        idle_ticks = self.capacity * ticks - self.busy_ticks - self.blocked_ticks
+        return {
+            "name": self.name,
+            "capacity": self.capacity if self.capacity != float('inf') else None,
+            "buffer_size": self.buffer_size if self.buffer_size != float('inf') else None,
+            "processed": self.processed,
+            "utilization": self.busy_ticks / (self.capacity * ticks) if self.capacity != float('inf') else None,
+            "average_busy": self.busy_ticks / ticks,
+            "queue_length": len(self.queue),
+            "average_queue": self.queue_ticks / ticks,
+            "max_queue": self.max_queue,
+            "average_wait": self.wait_ticks * dt / self.processed if self.processed else 0.0,
+            "blocked_seconds": self.blocked_ticks * dt,
+            "starved_seconds": idle_ticks * dt if self.capacity != float('inf') else None
+        }
+
+class EventSimulation:
+    # Discrete-event engine over the same params as FactorySimulation. Instead of
+    # stepping every material every tick it jumps between spawn, arrive,
+    # finish-processing and complete events on a priority queue. Event times are
+    # whole ticks, worked out with the C engine's float32 arc-length arithmetic,
+    # so the counters and KPIs are identical to the tick engine's.
+    def __init__(self, params):
+        check_event_params(params)
+        self.params = params
+        self.dt = 1 / 60.0
+        self.sim_time = 0.0
+        self.ticks = 0
+        self.object_count = 0
+        self.completed_count = 0
+        self.spawned_count = 0
+        self.wip_ticks = 0  # sum of object_count over all ticks
+        self.spawn_enabled = True
+        self.last_spawn_time = 0.0
+
+        self.segment_stations = segment_stations(params)
+        self.segment_dwell = segment_dwell(params, self.dt)
+        self.station_arrivals = np.zeros(int(self.segment_stations.max(initial=-1)) + 1, dtype=np.int64)
+        self.legs = self._build_legs()
+        self.stations = self._build_stations()
+
+        self.events = []
+        self._sequence = 0
+        self._spawn_pending = False
+        self._wip_tick = 1  # first tick not yet added to wip_ticks
+        self._last_spawn_tick = 0
+
+    def _build_legs(self):
+        # Conveyor geometry in float32, accumulated in the same order as build_path_geometry
+        points = np.asarray(self.params['conveyor_paths'], dtype=np.float32).reshape(-1, 2)
+        segment_count = max(len(points) - 1, 0)
+        path_lengths = np.zeros(max(len(points), 1), dtype=np.float32)
+        for i in range(segment_count):
+            dx = points[i + 1, 0] - points[i, 0]
+            dy = points[i + 1, 1] - points[i, 1]
+            path_lengths[i + 1] = path_lengths[i] + np.sqrt(dx * dx + dy * dy)
+        if segment_count == 0:
+            return {}
+        path_length = path_lengths[segment_count]
+        advance = np.float32(self.params['steps_per_second']) * (path_length / np.float32(segment_count))
+        if not advance > 0:
+            return {}
+
+        # A leg starts on a conveyor point (the entrance, or a station after processing)
+        # and ends at the next station with a processing time or at the end of the path.
+        # Replays vectorized_move_materials for one material: (ticks, kind, segment).
+        legs = {}
+        for start in range(segment_count):
+            distance = path_lengths[start]
+            index = start
+            ticks = 0
+            leg = None
+            while leg is None:
+                ticks += 1
+                distance = np.float32(distance + advance)
+                if distance >= path_length:
+                    leg = (ticks, COMPLETE, index)
+                    break
+                while distance >= path_lengths[index + 1]:
+                    index += 1
+                    if self.segment_dwell[index] > 0:
+                        leg = (ticks, ARRIVE, index)
+                        break
+            legs[start] = leg
+        return legs
+
+    def _build_stations(self):
+        # One Station per segment that starts with processing, keyed by segment, plus
+        # the entrance, which holds spawned materials until the first buffer has room
+        names = list(self.params.get('factory_layout', {}).keys())
+        equipment_details = self.params.get('equipment_details', {})
+        stations = {0: Station(names[0] if names else "Entrance", 0, 0)}
+        for segment, dwell in enumerate(self.segment_dwell.tolist()):
+            if segment == 0 or dwell <= 0:
+                continue
+            station = int(self.segment_stations[segment])
+            name = names[station] if station < len(names) else str(station)
+            details = equipment_details.get(name, {})
+            stations[segment] = Station(name, segment, dwell, details.get('capacity'), details.get('buffer_size'))
+        # Blocking propagates back along conveyor_paths: each leg feeds the station it ends at
+        for segment, leg in self.legs.items():
+            if segment in stations and leg is not None and leg[1] == ARRIVE:
+                stations[leg[2]].upstream = stations[segment]
+        return stations
+
+    def _schedule(self, tick, kind, segment, count):
+        heapq.heappush(self.events, (tick, kind, self._sequence, segment, count))
+        self._sequence += 1
+
+    def _schedule_leg(self, tick, segment, count):
+        # Materials sitting on `segment` at `tick` start moving on the following tick
+        leg = self.legs.get(segment)
+        if leg is not None:
+            ticks, kind, end = leg
+            self._schedule(tick + ticks, kind, end, count)
+
+    def _schedule_spawn(self):
+        # The tick engine spawns on the first tick whose start time is at least
+        # 1 / item_rate after the last spawn, compared in the same float arithmetic
+        interval = 1 / self.params['item_rate']
+        last = self._last_spawn_tick
+        tick = last + max(int(interval / self.dt) - 1, 1)
+        tick = max(tick, self.ticks)
+        while tick * self.dt - last * self.dt < interval:
+            tick += 1
+        # A spawn decided at the start of tick index `tick` lands when that step completes
+        self._schedule(tick + 1, SPAWN, 0, 2)
+        self._spawn_pending = True
+
+    def _destination(self, station):
+        leg = self.legs.get(station.segment)
+        if leg is not None and leg[1] == ARRIVE:
+            return self.stations[leg[2]]
+        return None
+
+    def _release(self, station, count, tick):
+        # Send up to `count` finished materials on to the next station's buffer; the rest block their servers
+        destination = self._destination(station)
+        released = count if destination is None else min(count, destination.space())
+        if released:
+            if destination is not None:
+                destination.in_transit += released
+            self._schedule_leg(tick, station.segment, released)
+        if released < count:
+            station.accumulate(tick)
+            station.blocked += count - released
+
+    def _admit(self, station, tick):
+        # Start waiting materials on free servers, then let the upstream station fill the freed buffer
+        started = min(len(station.queue), station.free())
+        if not started:
+            return
+        station.accumulate(tick)
+        for _ in range(started):
+            station.wait_ticks += tick - int(station.queue.pop())
+        station.busy += started
+        self._schedule(tick + station.dwell, FINISH, station.segment, started)
+        self._pull(station, tick)
+
+    def _pull(self, station, tick):
+        upstream = station.upstream
+        if upstream is None or not upstream.blocked:
+            return
+        released = min(upstream.blocked, station.space())
+        if not released:
+            return
+        upstream.accumulate(tick)
+        upstream.blocked -= released
+        station.in_transit += released
+        self._schedule_leg(tick, upstream.segment, released)
+        self._admit(upstream, tick)
+
+    def _handle(self, tick, kind, segment, count):
+        if kind == COMPLETE:
+            self.object_count -= count
+            self.completed_count += count
+        elif kind == ARRIVE:
+            self.station_arrivals[self.segment_stations[segment]] += count
+            station = self.stations[segment]
+            station.accumulate(tick)
+            station.in_transit -= count
+            started = min(count, station.free())
+            for _ in range(count - started):
+                station.queue.push(tick)
+            station.max_queue = max(station.max_queue, len(station.queue))
+            if started:
+                station.busy += started
+                self._schedule(tick + station.dwell, FINISH, segment, started)
+                self._pull(station, tick)
+        elif kind == FINISH:
+            station = self.stations[segment]
+            station.accumulate(tick)
+            station.busy -= count
+            station.processed += count
+            self._release(station, count, tick)
+            self._admit(station, tick)
+        elif kind == SPAWN:
+            self._spawn_pending = False
+            if not self.spawn_enabled:
+                return
+            self.object_count += count
+            self.spawned_count += count
+            self._last_spawn_tick = tick - 1
+            self.last_spawn_time = self._last_spawn_tick * self.dt
+            # Spawned materials are added after the move, so they first move on the next tick
+            self._release(self.stations[0], count, tick)
+            self._schedule_spawn()
+
+    def run_until(self, end_tick):
+        # Handle every event up to and including `end_tick`, integrating WIP between events
+        if self.spawn_enabled and not self._spawn_pending:
+            self._schedule_spawn()
+        events = self.events
+        while events and events[0][0] <= end_tick:
+            tick, kind, _, segment, count = heapq.heappop(events)
+            self.wip_ticks += self.object_count * (tick - self._wip_tick)
+            self._wip_tick = tick
+            self._handle(tick, kind, segment, count)
+        self.wip_ticks += self.object_count * (end_tick + 1 - self._wip_tick)
+        self._wip_tick = end_tick + 1
+        for station in self.stations.values():
+            station.accumulate(end_tick)
+        self.ticks = end_tick
+        self.sim_time = self.ticks * self.dt
+
+    def run_headless(self, sim_seconds):
+        wall_start = time.perf_counter()
+        self.run_until(self.ticks + int(round(sim_seconds / self.dt)))
+        return self.results(time.perf_counter() - wall_start)
+
+    def station_results(self):
+        # Per-station utilization, queue and blocking statistics; the entrance reports its spawn backlog as blocked time
+        return [station.results(self.ticks, self.dt) for station in self.stations.values()]
+
+    def results(self, wall_seconds=None):
+        results = simulation_results(self, wall_seconds)
+        results["stations"] = self.station_results()
+        return results
@@ -1,10 +1,74 @@
 import time
-from .params import load_params
-from .physics2d_bindings import create_physics2d, spawn_material, vectorized_move_materials, update, print_state_array, free_physics2d
+import numpy as np
+from .c_bindings import MATERIAL_TYPES, StepState, Vec2, create_physics2d, run_steps, spawn_materials_batch, vectorized_move_materials, update, get_state_array, count_area_materials, print_state_array, save_snapshot, load_snapshot, free_physics2d
+from .profiler import NULL_PROFILER
+
+def segment_stations(params):
+    # Each conveyor segment is owned by the factory_layout station nearest to its start point
+    if len(params['conveyor_paths']) < 2:
+        raise ValueError(f"conveyor_paths needs at least 2 points, got {len(params['conveyor_paths'])}")
+    points = np.asarray(params['conveyor_paths'], dtype=float)[:-1]
+    stations = np.asarray(list(params.get('factory_layout', {}).values()), dtype=float).reshape(-1, 2)
+    if len(stations) == 0:
+        return np.arange(len(points), dtype=np.int32)
+    distances = np.linalg.norm(points[:, None, :] - stations[None, :, :], axis=2)
+    return distances.argmin(axis=1).astype(np.int32)
+
+def check_tick_params(params):
+    # Station capacity and bounded buffers are modelled by the event engine only; running the
+    # tick engine on them would silently give unlimited stations and disagree with it
+    limited = [name for name, details in params.get('equipment_details', {}).items()
+               if details.get('capacity') is not None or details.get('buffer_size') is not None]
+    if limited:
+        raise ValueError(f"capacity and buffer_size are only modelled by the event engine (--engine events); "
+                         f"set for: {', '.join(limited)}")
+
+def calculate_movement_time(equipment_speed):
+    # Time to process one unit at a station, 10 divided by the equipment speed
+    return 10 / equipment_speed
+
+def segment_dwell(params, dt):
+    # Processing steps at the station reached at the start of each conveyor segment; stations without equipment take none
+    names = list(params.get('factory_layout', {}).keys())
+    equipment_details = params.get('equipment_details', {})
+    dwell = []
+    for station in segment_stations(params).tolist():
+        name = names[station] if station < len(names) else None
+        if name in equipment_details:
+            dwell.append(int(round(calculate_movement_time(equipment_details[name]['speed']) / dt)))
+        else:
+            dwell.append(0)
+    return np.array(dwell, dtype=np.int32)
+
+def simulation_results(simulation, wall_seconds=None):
+    # Final counters and KPIs shared by the tick and event engines
+    sim_time = simulation.sim_time
+    throughput = simulation.completed_count / sim_time if sim_time > 0 else 0.0
+    average_wip = simulation.wip_ticks * simulation.dt / sim_time if sim_time > 0 else 0.0
+    results = {
+        "sim_seconds": sim_time,
+        "ticks": simulation.ticks,
+        "spawned_count": simulation.spawned_count,
+        "object_count": simulation.object_count,
+        "completed_count": simulation.completed_count,
+        "throughput_per_hour": throughput * 3600,
+        "average_wip": average_wip,
+        # Little's law: average time an item spends in the factory
+        "average_cycle_time": average_wip / throughput if throughput > 0 else 0.0
+    }
+    if wall_seconds is not None:
+        results["wall_seconds"] = wall_seconds
+        results["ticks_per_second"] = simulation.ticks / wall_seconds if wall_seconds > 0 else 0.0
+    return results
+
+# Simulation state saved in snapshots next to the engine's
+SNAPSHOT_FIELDS = ("sim_time", "ticks", "current_area", "time_per_step", "object_count", "completed_count", "spawned_count", "wip_ticks", "auto_move", "spawn_enabled", "last_spawn_time")
 
 class FactorySimulation:
     def __init__(self, params, print_only=False):
+        check_tick_params(params)
         self.params = params
+        self.dt = 1 / 60.0
         self.physics = create_physics2d(
             self.params['global_resolution'][0],
             self.params['global_resolution'][1],
@@ -12,36 +76,168 @@ class FactorySimulation:
             self.params['time_threshold'],
             self.params['item_rate'],
             self.params['steps_per_second'],
-            [Vec2(*pos) for pos in self.params['conveyor_paths']]
+            [Vec2(*pos) for pos in self.params['conveyor_paths']],
+            segment_stations(self.params),
+            segment_dwell(self.params, self.dt)
         )
+        # Optional belt spacing: materials queue behind one less than min_spacing ahead
+        self.physics.contents.min_spacing = self.params.get('min_spacing', 0.0)
+        # Engine threads for large material counts, 0 for one per core. Results are
+        # identical for every thread count.
+        self.physics.contents.threads = self.params.get('threads', 1)
         self.print_only = print_only
+        # Simulated clock, derived from the tick count so it never drifts or reads the wall clock
+        self.sim_time = 0.0
+        self.ticks = 0
         self.current_area = "Entrance"
         self.time_per_step = 0
         self.object_count = 0
         self.completed_count = 0
+        self.spawned_count = 0
+        self.wip_ticks = 0  # sum of object_count over all ticks
         self.auto_move = True
         self.spawn_enabled = True
-        self.last_spawn_time = time.time()
+        self.last_spawn_time = 0.0
+        # Optional TelemetryRecorder, fed once per tick
+        self.telemetry = None
+        # Optional StageProfiler, timing each stage of every tick
+        self.profiler = None
+        # Optional SharedStateWriter, handed every tick for viewer processes
+        self.publisher = None
 
-    def run(self):
-        dt = 1 / 60.0
+    def update_materials(self):
+        # Spawn a Cot/Fab pair at the entrance every 1 / item_rate simulated seconds
+        materials = []
+        last_spawn_time = self.last_spawn_time
+        if self.spawn_enabled and self.sim_time - self.last_spawn_time >= 1 / self.params['item_rate']:
+            entrance = self.params['conveyor_paths'][0]
+            materials = [{'position': entrance, 'type': "Cot"}, {'position': entrance, 'type': "Fab"}]
+            last_spawn_time = self.sim_time
 
-        while True:
-            updates = self.physics.update_materials(self.auto_move, self.spawn_enabled, self.last_spawn_time)
-            for material in updates["materials"]:
-                spawn_material(self.physics, Vec2(*material['position']), material['type'])
-            self.object_count += updates["object_count"]
-            self.completed_count += updates["completed_count"]
-            self.last_spawn_time = updates["last_spawn_time"]
+        completed_count = 0
+        completed_ticks = 0
+        if self.auto_move:
+            before = self.physics.contents.completed_count
+            before_ticks = self.physics.contents.completed_ticks
+            vectorized_move_materials(self.physics, self.params['steps_per_second'])
+            completed_count = self.physics.contents.completed_count - before
+            completed_ticks = self.physics.contents.completed_ticks - before_ticks
+
+        return {
+            "materials": materials,
+            "object_count": len(materials) - completed_count,
+            "completed_count": completed_count,
+            "completed_ticks": completed_ticks,
+            "last_spawn_time": last_spawn_time
+        }
+
+    def step(self):
+        profiler = self.profiler or NULL_PROFILER
+        updates = self.update_materials()
+        profiler.lap("move")
+        if updates["materials"]:
+            spawn_materials_batch(
+                self.physics,
+                [material['position'] for material in updates["materials"]],
+                [MATERIAL_TYPES[material['type']] for material in updates["materials"]]
+            )
+        self.spawned_count += len(updates["materials"])
+        self.object_count += updates["object_count"]
+        self.completed_count += updates["completed_count"]
+        self.last_spawn_time = updates["last_spawn_time"]
+        profiler.lap("spawn")
+
+        update(self.physics, self.dt)
+        self.ticks += 1
+        self.sim_time = self.ticks * self.dt
+        self.wip_ticks += self.object_count
+        profiler.lap("update")
+        if self.telemetry is not None:
+            self.record_telemetry(updates)
+            profiler.lap("telemetry")
+        if self.publisher is not None:
+            self.publisher.publish(self)
+            profiler.lap("publish")
 
-            update(self.physics, dt)
-            state_array = get_state_array(self.physics)
+    def record_telemetry(self, updates):
+        # WIP per station from each material's current area, and the mean cycle time of this tick's completions
+        wip = count_area_materials(self.physics, len(self.telemetry.station_names))
+        completed = updates["completed_count"]
+        cycle_time = updates["completed_ticks"] * self.dt / completed if completed else float('nan')
+        self.telemetry.record(self.ticks, self.sim_time, self.object_count, self.completed_count, wip, cycle_time)
+
+    def run(self):
+        profiler = self.profiler or NULL_PROFILER
+        while True:
+            profiler.begin()
+            self.step()
+            get_state_array(self.physics)
+            profiler.lap("state_array")
 
             if self.print_only:
                 print_state_array(self.physics)
+                profiler.lap("print")
+                profiler.end()
                 break
             else:
-                time.sleep(dt)
+                time.sleep(self.dt)
+                profiler.lap("sleep")
+                profiler.end()
+
+    def advance(self, ticks):
+        # Take `ticks` steps inside the engine in one call, with the same results as calling
+        # step() that many times. The GIL is released meanwhile, so separate simulations
+        # can advance in parallel threads.
+        state = StepState(
+            dt=self.dt,
+            spawn_interval=1 / self.params['item_rate'],
+            speed=self.params['steps_per_second'],
+            spawn_enabled=self.spawn_enabled,
+            auto_move=self.auto_move,
+            ticks=self.ticks,
+            last_spawn_time=self.last_spawn_time
+        )
+        before = self.physics.contents.completed_count
+        run_steps(self.physics, state, ticks)
+        completed_count = self.physics.contents.completed_count - before
+        self.spawned_count += state.spawned_count
+        self.completed_count += completed_count
+        self.object_count += state.spawned_count - completed_count
+        self.wip_ticks += state.wip_ticks
+        self.last_spawn_time = state.last_spawn_time
+        self.ticks = state.ticks
+        self.sim_time = self.ticks * self.dt
+
+    def run_ticks(self, ticks):
+        # Take `ticks` steps, inside the engine in one call unless something samples every tick
+        if self.telemetry is None and self.profiler is None and self.publisher is None:
+            self.advance(ticks)
+        else:
+            # Telemetry, the profiler and the publisher sample every tick from Python
+            profiler = self.profiler or NULL_PROFILER
+            for _ in range(ticks):
+                profiler.begin()
+                self.step()
+                profiler.end()
+
+    def run_headless(self, sim_seconds):
+        # Step a fixed number of ticks as fast as possible and return the final counters and KPIs
+        wall_start = time.perf_counter()
+        self.run_ticks(int(round(sim_seconds / self.dt)))
+        return self.results(time.perf_counter() - wall_start)
+
+    def results(self, wall_seconds=None):
+        return simulation_results(self, wall_seconds)
+
+    def save_snapshot(self, path):
+        save_snapshot(self.physics, path, {field: getattr(self, field) for field in SNAPSHOT_FIELDS})
+
+    def load_snapshot(self, path):
+        # Resume from a snapshot; params may differ (e.g. a what-if fork) as long as the conveyor has as many points
+        for field, value in load_snapshot(self.physics, path).items():
+            setattr(self, field, value)
 
     def __del__(self):
-        free_physics2d(self.physics)
\ No newline at end of file
+        # __init__ may have raised before the engine was created
+        if hasattr(self, 'physics'):
+            free_physics2d(self.physics)
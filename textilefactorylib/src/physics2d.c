@@ -0,0 +1,972 @@
+// physics2d: the factory simulation engine. Built by setup.py as the
+// textilefactorylib.src.physics2d extension module. The plain C functions below
+// are also called through ctypes (c_bindings.py), and the Python module at the
+// end adds fast-path entry points for the calls made every step.
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+#define MATERIAL_INITIAL_CAPACITY 64
+// Below this many materials a step is cheaper than waking the worker threads
+#define PARALLEL_MIN_MATERIALS 16384
+
+// Material type codes, also the values written into the state array
+enum {
+    MATERIAL_NONE = 0,
+    MATERIAL_COT = 1,
+    MATERIAL_FAB = 2,
+    MATERIAL_FIN = 3
+};
+
+typedef struct {
+    float x, y;
+} Vec2;
+
+// Structure-of-arrays material pool. Live materials occupy [0, count) and
+// retired ones are swap-removed, so every array stays dense.
+typedef struct {
+    int count;
+    int capacity;
+    float *position_x;
+    float *position_y;
+    float *velocity_x;
+    float *velocity_y;
+    float *path_progress;
+    int32_t *path_index;
+    int32_t *type;
+    int32_t *area;
+    int64_t *start_time;  // step the material was spawned on
+    int32_t *dwell;  // steps left processing at the current station
+} MaterialStore;
+
+typedef struct {
+    int width, height;
+    MaterialStore materials;
+    int completed_count;
+    float distance_threshold;
+    float time_threshold;
+    float item_rate;
+    float steps_per_second;
+    Vec2 *conveyor_paths;
+    int conveyor_path_count;
+    int32_t *state_array;  // width x height cells, indexed [x * height + y]
+    // Path geometry, built once at creation. Segment i runs from conveyor point i to i + 1.
+    float *path_lengths;       // cumulative arc length at each conveyor point
+    Vec2 *path_directions;     // unit direction of each segment
+    int32_t *segment_stations; // station that owns each segment
+    int32_t *segment_dwell;    // steps a material processes at the station starting each segment
+    float path_length;         // total arc length
+    float segment_length;      // mean segment length, the distance covered by a speed of 1.0
+    int64_t tick;              // steps taken, advanced by update()
+    int64_t completed_ticks;   // summed cycle time, in steps, of every completed material
+    float min_spacing;         // belt spacing: a material holds while another is this close ahead, 0 disables
+    // Uniform spatial hash with one cell per global_resolution unit, indexed like the
+    // state array. Built by a counting sort whenever a query finds it stale.
+    int grid_dirty;            // materials moved, spawned or retired since the last build
+    int grid_capacity;         // materials the grid arrays can hold
+    int32_t *cell_start;       // width * height + 1 offsets into cell_items
+    int32_t *cell_items;       // material indices grouped by cell
+    int32_t *material_hold;    // per material, set while spacing holds it back this step
+    int threads;               // worker threads for the per-material loops, 0 for one per core
+    int32_t *finished_items;   // scratch for vectorized_move_materials, sized like the material pool
+} Physics2D;
+
+// Loop state for run_steps, mirroring FactorySimulation's counters
+typedef struct {
+    double dt;               // simulated seconds per step
+    double spawn_interval;   // 1 / item_rate
+    float speed;             // steps_per_second
+    int spawn_enabled;
+    int auto_move;
+    int64_t ticks;           // steps taken so far
+    double last_spawn_time;
+    int64_t spawned_count;   // materials spawned by this call
+    int64_t wip_ticks;       // live materials summed over this call's steps
+} StepState;
+
+static int grow_array(void **array, size_t item_size, int capacity) {
+    void *grown = realloc(*array, (size_t)capacity * item_size);
+    if (grown == NULL) {
+        return -1;
+    }
+    *array = grown;
+    return 0;
+}
+
+// Make room for at least `required` materials, doubling the capacity so
+// spawning is amortized O(1).
+static int reserve_materials(Physics2D *physics, int required) {
+    MaterialStore *store = &physics->materials;
+    if (required <= store->capacity) {
+        return 0;
+    }
+    int capacity = store->capacity > 0 ? store->capacity : MATERIAL_INITIAL_CAPACITY;
+    while (capacity < required) {
+        capacity *= 2;
+    }
+    if (grow_array((void**)&store->position_x, sizeof(float), capacity) ||
+        grow_array((void**)&store->position_y, sizeof(float), capacity) ||
+        grow_array((void**)&store->velocity_x, sizeof(float), capacity) ||
+        grow_array((void**)&store->velocity_y, sizeof(float), capacity) ||
+        grow_array((void**)&store->path_progress, sizeof(float), capacity) ||
+        grow_array((void**)&store->path_index, sizeof(int32_t), capacity) ||
+        grow_array((void**)&store->type, sizeof(int32_t), capacity) ||
+        grow_array((void**)&store->area, sizeof(int32_t), capacity) ||
+        grow_array((void**)&store->start_time, sizeof(int64_t), capacity) ||
+        grow_array((void**)&store->dwell, sizeof(int32_t), capacity) ||
+        grow_array((void**)&physics->finished_items, sizeof(int32_t), capacity)) {
+        return -1;
+    }
+    store->capacity = capacity;
+    return 0;
+}
+
+static void retire_material(MaterialStore *store, int i) {
+    int last = --store->count;
+    if (i == last) {
+        return;
+    }
+    store->position_x[i] = store->position_x[last];
+    store->position_y[i] = store->position_y[last];
+    store->velocity_x[i] = store->velocity_x[last];
+    store->velocity_y[i] = store->velocity_y[last];
+    store->path_progress[i] = store->path_progress[last];
+    store->path_index[i] = store->path_index[last];
+    store->type[i] = store->type[last];
+    store->area[i] = store->area[last];
+    store->start_time[i] = store->start_time[last];
+    store->dwell[i] = store->dwell[last];
+}
+
+static void build_path_geometry(Physics2D *physics) {
+    int point_count = physics->conveyor_path_count;
+    int segment_count = point_count > 1 ? point_count - 1 : 0;
+    physics->path_lengths = (float*)calloc((size_t)(point_count > 0 ? point_count : 1), sizeof(float));
+    physics->path_directions = (Vec2*)calloc((size_t)(segment_count > 0 ? segment_count : 1), sizeof(Vec2));
+    physics->segment_stations = (int32_t*)calloc((size_t)(segment_count > 0 ? segment_count : 1), sizeof(int32_t));
+    physics->segment_dwell = (int32_t*)calloc((size_t)(segment_count > 0 ? segment_count : 1), sizeof(int32_t));
+    for (int i = 0; i < segment_count; i++) {
+        Vec2 start_pos = physics->conveyor_paths[i];
+        Vec2 end_pos = physics->conveyor_paths[i + 1];
+        float dx = end_pos.x - start_pos.x;
+        float dy = end_pos.y - start_pos.y;
+        float length = sqrtf(dx * dx + dy * dy);
+        physics->path_lengths[i + 1] = physics->path_lengths[i] + length;
+        if (length > 0.0f) {
+            physics->path_directions[i].x = dx / length;
+            physics->path_directions[i].y = dy / length;
+        }
+        physics->segment_stations[i] = i;
+    }
+    physics->path_length = segment_count > 0 ? physics->path_lengths[segment_count] : 0.0f;
+    physics->segment_length = segment_count > 0 ? physics->path_length / segment_count : 0.0f;
+}
+
+Physics2D* create_physics2d(int width, int height, float distance_threshold, float time_threshold, float item_rate, float steps_per_second, Vec2 *conveyor_paths, int conveyor_path_count) {
+    Physics2D *physics = (Physics2D*)calloc(1, sizeof(Physics2D));
+    physics->width = width;
+    physics->height = height;
+    physics->distance_threshold = distance_threshold;
+    physics->time_threshold = time_threshold;
+    physics->item_rate = item_rate;
+    physics->steps_per_second = steps_per_second;
+    // Keep a private copy, the caller's buffer may not outlive the engine
+    physics->conveyor_paths = (Vec2*)malloc((size_t)conveyor_path_count * sizeof(Vec2));
+    memcpy(physics->conveyor_paths, conveyor_paths, (size_t)conveyor_path_count * sizeof(Vec2));
+    physics->conveyor_path_count = conveyor_path_count;
+    physics->state_array = (int32_t*)calloc((size_t)width * height, sizeof(int32_t));
+    physics->cell_start = (int32_t*)calloc((size_t)width * height + 1, sizeof(int32_t));
+    physics->grid_dirty = 1;
+    physics->threads = 1;
+    build_path_geometry(physics);
+    return physics;
+}
+
+// Processing time, in steps, at the station a material reaches at the start of
+// each segment. Defaults to 0 (materials pass straight through).
+void set_segment_dwell(Physics2D *physics, const int32_t *segment_dwell) {
+    int segment_count = physics->conveyor_path_count > 1 ? physics->conveyor_path_count - 1 : 0;
+    memcpy(physics->segment_dwell, segment_dwell, (size_t)segment_count * sizeof(int32_t));
+}
+
+// Station ownership of each segment, e.g. mapped from factory_layout. Defaults to the segment index.
+void set_segment_stations(Physics2D *physics, const int32_t *segment_stations) {
+    int segment_count = physics->conveyor_path_count > 1 ? physics->conveyor_path_count - 1 : 0;
+    memcpy(physics->segment_stations, segment_stations, (size_t)segment_count * sizeof(int32_t));
+}
+
+static void init_material(MaterialStore *store, int i, Vec2 pos, int32_t material_type, int64_t start_time) {
+    store->position_x[i] = pos.x;
+    store->position_y[i] = pos.y;
+    store->velocity_x[i] = 0.0f;
+    store->velocity_y[i] = 0.0f;
+    store->path_progress[i] = 0.0f;
+    store->path_index[i] = 0;
+    store->type[i] = material_type;
+    store->area[i] = 0;
+    store->start_time[i] = start_time;
+    store->dwell[i] = 0;
+}
+
+void spawn_material(Physics2D *physics, Vec2 pos, int32_t material_type) {
+    MaterialStore *store = &physics->materials;
+    if (reserve_materials(physics, store->count + 1) != 0) {
+        return;
+    }
+    init_material(store, store->count++, pos, material_type, physics->tick);
+    physics->grid_dirty = 1;
+}
+
+// Spawn `count` materials with a single reservation. Returns the number of
+// materials spawned, or -1 if the pool could not grow.
+int spawn_materials_batch(Physics2D *physics, const Vec2 *positions, const int32_t *material_types, int count) {
+    MaterialStore *store = &physics->materials;
+    if (count <= 0) {
+        return 0;
+    }
+    if (reserve_materials(physics, store->count + count) != 0) {
+        return -1;
+    }
+    int first = store->count;
+    for (int i = 0; i < count; i++) {
+        init_material(store, first + i, positions[i], material_types[i], physics->tick);
+    }
+    store->count += count;
+    physics->grid_dirty = 1;
+    return count;
+}
+
+// Cell index of a coordinate, clamped to [0, size) before the cast: converting a
+// float beyond the int range (an infinite or huge radius) is undefined.
+static int clamp_cell(float value, int size) {
+    return (int)fminf(fmaxf(floorf(value), 0.0f), (float)(size - 1));
+}
+
+// Cell of a position; materials off the grid are kept in the nearest edge cell.
+static int position_cell(const Physics2D *physics, float x, float y) {
+    int cx = clamp_cell(x, physics->width);
+    int cy = clamp_cell(y, physics->height);
+    return cx * physics->height + cy;
+}
+
+// Group every material by cell with a counting sort, O(materials + cells).
+// Returns 0, or -1 if the grid arrays could not grow.
+int build_spatial_grid(Physics2D *physics) {
+    const MaterialStore *store = &physics->materials;
+    int count = store->count;
+    int cell_count = physics->width * physics->height;
+    if (count > physics->grid_capacity) {
+        int capacity = store->capacity;
+        if (grow_array((void**)&physics->cell_items, sizeof(int32_t), capacity) ||
+            grow_array((void**)&physics->material_hold, sizeof(int32_t), capacity)) {
+            return -1;
+        }
+        physics->grid_capacity = capacity;
+    }
+    int32_t *cell_start = physics->cell_start;
+    memset(cell_start, 0, ((size_t)cell_count + 1) * sizeof(int32_t));
+    for (int i = 0; i < count; i++) {
+        cell_start[position_cell(physics, store->position_x[i], store->position_y[i]) + 1]++;
+    }
+    for (int c = 0; c < cell_count; c++) {
+        cell_start[c + 1] += cell_start[c];
+    }
+    // Fill each cell using its start offset as a cursor, then shift the offsets back
+    for (int i = 0; i < count; i++) {
+        int c = position_cell(physics, store->position_x[i], store->position_y[i]);
+        physics->cell_items[cell_start[c]++] = i;
+    }
+    for (int c = cell_count; c > 0; c--) {
+        cell_start[c] = cell_start[c - 1];
+    }
+    cell_start[0] = 0;
+    physics->grid_dirty = 0;
+    return 0;
+}
+
+static int ensure_spatial_grid(Physics2D *physics) {
+    return physics->grid_dirty ? build_spatial_grid(physics) : 0;
+}
+
+// Cell rectangle covering a circle, clamped to the grid
+typedef struct {
+    int x0, x1, y0, y1;
+} CellRange;
+
+static CellRange radius_cells(const Physics2D *physics, float x, float y, float radius) {
+    CellRange range;
+    range.x0 = clamp_cell(x - radius, physics->width);
+    range.x1 = clamp_cell(x + radius, physics->width);
+    range.y0 = clamp_cell(y - radius, physics->height);
+    range.y1 = clamp_cell(y + radius, physics->height);
+    return range;
+}
+
+// Bulk within-radius query. The materials within `radius` of points[q] are written
+// to results[offsets[q]:offsets[q + 1]]. Returns the total number of matches,
+// which may exceed max_results, in which case only the first max_results are
+// written and the caller should retry with a larger buffer. -1 on allocation failure.
+int query_radius(Physics2D *physics, const Vec2 *points, int point_count, float radius, int32_t *offsets, int32_t *results, int max_results) {
+    if (ensure_spatial_grid(physics) != 0) {
+        return -1;
+    }
+    const MaterialStore *store = &physics->materials;
+    float radius_squared = radius * radius;
+    int total = 0;
+    for (int q = 0; q < point_count; q++) {
+        offsets[q] = total;
+        CellRange range = radius_cells(physics, points[q].x, points[q].y, radius);
+        for (int cx = range.x0; cx <= range.x1; cx++) {
+            for (int cy = range.y0; cy <= range.y1; cy++) {
+                int c = cx * physics->height + cy;
+                for (int k = physics->cell_start[c]; k < physics->cell_start[c + 1]; k++) {
+                    int i = physics->cell_items[k];
+                    float dx = store->position_x[i] - points[q].x;
+                    float dy = store->position_y[i] - points[q].y;
+                    if (dx * dx + dy * dy <= radius_squared) {
+                        if (total < max_results) {
+                            results[total] = i;
+                        }
+                        total++;
+                    }
+                }
+            }
+        }
+    }
+    offsets[point_count] = total;
+    return total;
+}
+
+// For every material, the closest other material within max_radius (-1 and
+// max_radius when there is none). Returns 0, or -1 on allocation failure.
+int nearest_neighbors(Physics2D *physics, float max_radius, int32_t *neighbors, float *distances) {
+    if (ensure_spatial_grid(physics) != 0) {
+        return -1;
+    }
+    const MaterialStore *store = &physics->materials;
+    float max_squared = max_radius * max_radius;
+    for (int i = 0; i < store->count; i++) {
+        float x = store->position_x[i];
+        float y = store->position_y[i];
+        float best_squared = max_squared;
+        int best = -1;
+        CellRange range = radius_cells(physics, x, y, max_radius);
+        for (int cx = range.x0; cx <= range.x1; cx++) {
+            for (int cy = range.y0; cy <= range.y1; cy++) {
+                int c = cx * physics->height + cy;
+                for (int k = physics->cell_start[c]; k < physics->cell_start[c + 1]; k++) {
+                    int j = physics->cell_items[k];
+                    float dx = store->position_x[j] - x;
+                    float dy = store->position_y[j] - y;
+                    float d = dx * dx + dy * dy;
+                    if (j != i && (d < best_squared || (d == best_squared && best < 0))) {
+                        best_squared = d;
+                        best = j;
+                    }
+                }
+            }
+        }
+        neighbors[i] = best;
+        distances[i] = best < 0 ? max_radius : sqrtf(best_squared);
+    }
+    return 0;
+}
+
+// Number of other materials within `radius` of each material, e.g. against
+// distance_threshold. Returns 0, or -1 on allocation failure.
+int count_neighbors(Physics2D *physics, float radius, int32_t *counts) {
+    if (ensure_spatial_grid(physics) != 0) {
+        return -1;
+    }
+    const MaterialStore *store = &physics->materials;
+    float radius_squared = radius * radius;
+    for (int i = 0; i < store->count; i++) {
+        float x = store->position_x[i];
+        float y = store->position_y[i];
+        int found = 0;
+        CellRange range = radius_cells(physics, x, y, radius);
+        for (int cx = range.x0; cx <= range.x1; cx++) {
+            for (int cy = range.y0; cy <= range.y1; cy++) {
+                int c = cx * physics->height + cy;
+                for (int k = physics->cell_start[c]; k < physics->cell_start[c + 1]; k++) {
+                    int j = physics->cell_items[k];
+                    float dx = store->position_x[j] - x;
+                    float dy = store->position_y[j] - y;
+                    found += j != i && dx * dx + dy * dy <= radius_squared;
+                }
+            }
+        }
+        counts[i] = found;
+    }
+    return 0;
+}
+
+// Threads for a loop over `count` materials: 1 below PARALLEL_MIN_MATERIALS or
+// without OpenMP. Every parallel loop writes only its own material's slots and
+// reduces integers, so results do not depend on the thread count.
+static int loop_threads(const Physics2D *physics, int count) {
+#ifdef _OPENMP
+    if (count >= PARALLEL_MIN_MATERIALS && physics->threads != 1) {
+        return physics->threads > 0 ? physics->threads : omp_get_max_threads();
+    }
+#else
+    (void)physics;
+    (void)count;
+#endif
+    return 1;
+}
+
+static int compare_int32(const void *a, const void *b) {
+    int32_t x = *(const int32_t*)a, y = *(const int32_t*)b;
+    return (x > y) - (x < y);
+}
+
+// Flag every material with another material less than min_spacing ahead of it
+// along the belt. Any such material is also within min_spacing in the plane, so
+// only the grid cells around each material are searched. Materials level on
+// the belt, such as a freshly spawned pair, queue in spawn order, then by index.
+static int mark_spacing_holds(Physics2D *physics) {
+    if (ensure_spatial_grid(physics) != 0) {
+        return -1;
+    }
+    const MaterialStore *store = &physics->materials;
+    float spacing = physics->min_spacing;
+    int threads = loop_threads(physics, store->count);
+    #pragma omp parallel for num_threads(threads) if(threads > 1) schedule(static)
+    for (int i = 0; i < store->count; i++) {
+        float progress = store->path_progress[i];
+        int64_t start_time = store->start_time[i];
+        int hold = 0;
+        CellRange range = radius_cells(physics, store->position_x[i], store->position_y[i], spacing);
+        for (int cx = range.x0; cx <= range.x1 && !hold; cx++) {
+            for (int cy = range.y0; cy <= range.y1 && !hold; cy++) {
+                int c = cx * physics->height + cy;
+                for (int k = physics->cell_start[c]; k < physics->cell_start[c + 1]; k++) {
+                    int j = physics->cell_items[k];
+                    float ahead = store->path_progress[j] - progress;
+                    int level_ahead = ahead == 0.0f && j != i &&
+                        (store->start_time[j] < start_time || (store->start_time[j] == start_time && j < i));
+                    if ((ahead > 0.0f && ahead < spacing) || level_ahead) {
+                        hold = 1;
+                        break;
+                    }
+                }
+            }
+        }
+        physics->material_hold[i] = hold;
+    }
+    return 0;
+}
+
+// Replace every material with the `source->count` materials in `source`, e.g.
+// arrays mapped from a snapshot file, with one copy per array. Returns 0, or -1
+// if the pool could not grow.
+int restore_materials(Physics2D *physics, const MaterialStore *source) {
+    MaterialStore *store = &physics->materials;
+    int count = source->count;
+    if (reserve_materials(physics, count) != 0) {
+        return -1;
+    }
+    if (count > 0) {
+        memcpy(store->position_x, source->position_x, (size_t)count * sizeof(float));
+        memcpy(store->position_y, source->position_y, (size_t)count * sizeof(float));
+        memcpy(store->velocity_x, source->velocity_x, (size_t)count * sizeof(float));
+        memcpy(store->velocity_y, source->velocity_y, (size_t)count * sizeof(float));
+        memcpy(store->path_progress, source->path_progress, (size_t)count * sizeof(float));
+        memcpy(store->path_index, source->path_index, (size_t)count * sizeof(int32_t));
+        memcpy(store->type, source->type, (size_t)count * sizeof(int32_t));
+        memcpy(store->area, source->area, (size_t)count * sizeof(int32_t));
+        memcpy(store->start_time, source->start_time, (size_t)count * sizeof(int64_t));
+        memcpy(store->dwell, source->dwell, (size_t)count * sizeof(int32_t));
+    }
+    store->count = count;
+    physics->grid_dirty = 1;
+    return 0;
+}
+
+// Advance every material along the conveyor by arc length, so every segment is
+// travelled at the same belt speed. `speed` is in mean segment lengths per step.
+// path_progress holds the distance along the path and path_index caches the
+// current segment. A material reaching a station with a processing time stops
+// on its conveyor point for segment_dwell steps. With min_spacing set, a
+// material also waits while another is less than min_spacing ahead of it, judged
+// on the positions at the start of the step. Materials reaching the end of the
+// path are finished: they are counted and swap-removed.
+//
+// Each material moves independently, so the first pass runs in parallel and
+// only flags finished materials (path_index -1). The second pass swap-removes
+// them in the order a single in-place sweep would, so the pool ends up in the
+// same order whatever the thread count.
+void vectorized_move_materials(Physics2D *physics, float speed) {
+    MaterialStore *store = &physics->materials;
+    const Vec2 *paths = physics->conveyor_paths;
+    const float *path_lengths = physics->path_lengths;
+    const Vec2 *directions = physics->path_directions;
+    const int32_t *segment_dwell = physics->segment_dwell;
+    const int32_t *segment_stations = physics->segment_stations;
+    float advance = speed * physics->segment_length;
+    float path_length = physics->path_length;
+    int count = store->count;
+    int spacing = physics->min_spacing > 0.0f && count > 0 && mark_spacing_holds(physics) == 0;
+    const int32_t *hold = physics->material_hold;
+    float *position_x = store->position_x;
+    float *position_y = store->position_y;
+    float *path_progress = store->path_progress;
+    int32_t *path_index = store->path_index;
+    int32_t *area = store->area;
+    int32_t *dwell = store->dwell;
+    const int64_t *start_time = store->start_time;
+    int32_t *finished = physics->finished_items;
+    int64_t tick = physics->tick;
+    int64_t completed_ticks = 0;
+    int finished_count = 0;
+    int threads = loop_threads(physics, count);
+    physics->grid_dirty = 1;
+    #pragma omp parallel for num_threads(threads) if(threads > 1) schedule(static) reduction(+:completed_ticks)
+    for (int i = 0; i < count; i++) {
+        if (dwell[i] > 0) {
+            dwell[i]--;
+            continue;
+        }
+        if (spacing && hold[i]) {
+            continue;
+        }
+        float distance = path_progress[i] + advance;
+        if (distance >= path_length) {
+            int slot;
+            completed_ticks += tick - start_time[i];
+            path_index[i] = -1;
+            #pragma omp atomic capture
+            slot = finished_count++;
+            finished[slot] = i;
+            continue;
+        }
+        int index = path_index[i];
+        while (distance >= path_lengths[index + 1]) {
+            index++;
+            if (segment_dwell[index] > 0) {
+                distance = path_lengths[index];
+                dwell[i] = segment_dwell[index];
+                break;
+            }
+        }
+        float along = distance - path_lengths[index];
+        path_progress[i] = distance;
+        path_index[i] = index;
+        area[i] = segment_stations[index];
+        position_x[i] = paths[index].x + along * directions[index].x;
+        position_y[i] = paths[index].y + along * directions[index].y;
+    }
+    if (finished_count == 0) {
+        return;
+    }
+    if (threads > 1) {
+        qsort(finished, (size_t)finished_count, sizeof(int32_t), compare_int32);
+    }
+    // Slots between finished materials hold live ones and stay put, so only the
+    // finished slots need visiting. A material swapped in from the end may be
+    // finished itself, and is removed again from the same slot.
+    for (int k = 0; k < finished_count; k++) {
+        int i = finished[k];
+        while (i < store->count && path_index[i] < 0) {
+            retire_material(store, i);
+        }
+    }
+    physics->completed_ticks += completed_ticks;
+    physics->completed_count += finished_count;
+}
+
+// Count the live materials in each area (station). Areas outside [0, area_count) are not counted.
+void count_area_materials(const Physics2D *physics, int32_t *counts, int area_count) {
+    const MaterialStore *store = &physics->materials;
+    memset(counts, 0, (size_t)area_count * sizeof(int32_t));
+    for (int i = 0; i < store->count; i++) {
+        int32_t area = store->area[i];
+        if (0 <= area && area < area_count) {
+            counts[area]++;
+        }
+    }
+}
+
+void update(Physics2D *physics, float dt) {
+    MaterialStore *store = &physics->materials;
+    float *position_x = store->position_x;
+    float *position_y = store->position_y;
+    const float *velocity_x = store->velocity_x;
+    const float *velocity_y = store->velocity_y;
+    int count = store->count;
+    int threads = loop_threads(physics, count);
+    #pragma omp parallel for simd num_threads(threads) if(threads > 1) schedule(static)
+    for (int i = 0; i < count; i++) {
+        position_x[i] += velocity_x[i] * dt;
+        position_y[i] += velocity_y[i] * dt;
+    }
+    physics->tick++;
+    physics->grid_dirty = 1;
+}
+
+// Copy the first `max_count` materials' positions, as interleaved x, y pairs, and
+// type codes into caller buffers such as a shared memory frame. Returns the
+// number of materials copied.
+int copy_material_state(const Physics2D *physics, float *positions, int32_t *types, int max_count) {
+    const MaterialStore *store = &physics->materials;
+    int count = store->count < max_count ? store->count : max_count;
+    for (int i = 0; i < count; i++) {
+        positions[2 * i] = store->position_x[i];
+        positions[2 * i + 1] = store->position_y[i];
+    }
+    memcpy(types, store->type, (size_t)count * sizeof(int32_t));
+    return count;
+}
+
+// Clear the occupancy grid and rasterize every material into it in one pass.
+// The returned buffer is owned by the engine and reused on every call.
+int32_t* get_state_array(Physics2D *physics) {
+    const MaterialStore *store = &physics->materials;
+    int32_t *state_array = physics->state_array;
+    memset(state_array, 0, (size_t)physics->width * physics->height * sizeof(int32_t));
+    for (int i = 0; i < store->count; i++) {
+        int x = (int)store->position_x[i];
+        int y = (int)store->position_y[i];
+        if (store->type[i] != MATERIAL_NONE && 0 <= x && x < physics->width && 0 <= y && y < physics->height) {
+            state_array[x * physics->height + y] = store->type[i];
+        }
+    }
+    return state_array;
+}
+
+// Format the whole grid into one buffer and write it with a single call,
+// rather than one printf per cell.
+void print_state_array(Physics2D *physics) {
+    const int32_t *state_array = physics->state_array;
+    size_t size = (size_t)physics->height * ((size_t)physics->width * 12 + 1) + 1;
+    char *text = (char*)malloc(size);
+    if (text == NULL) {
+        return;
+    }
+    char *cursor = text;
+    for (int y = 0; y < physics->height; y++) {
+        for (int x = 0; x < physics->width; x++) {
+            int32_t value = state_array[x * physics->height + y];
+            if (0 <= value && value <= 9) {
+                *cursor++ = (char)('0' + value);
+                *cursor++ = ' ';
+            } else {
+                cursor += sprintf(cursor, "%d ", value);
+            }
+        }
+        *cursor++ = '\n';
+    }
+    fwrite(text, 1, (size_t)(cursor - text), stdout);
+    fflush(stdout);
+    free(text);
+}
+
+void free_physics2d(Physics2D *physics) {
+    MaterialStore *store = &physics->materials;
+    free(store->position_x);
+    free(store->position_y);
+    free(store->velocity_x);
+    free(store->velocity_y);
+    free(store->path_progress);
+    free(store->path_index);
+    free(store->type);
+    free(store->area);
+    free(store->start_time);
+    free(store->dwell);
+    free(physics->conveyor_paths);
+    free(physics->path_lengths);
+    free(physics->path_directions);
+    free(physics->segment_stations);
+    free(physics->segment_dwell);
+    free(physics->state_array);
+    free(physics->cell_start);
+    free(physics->cell_items);
+    free(physics->material_hold);
+    free(physics->finished_items);
+    free(physics);
+}
+
+// Take `steps` steps exactly as FactorySimulation.step does: spawn a Cot/Fab pair
+// at the entrance once spawn_interval simulated seconds have passed since the
+// last spawn, move, update and integrate WIP. The whole batch runs without
+// calling back into Python, so ctypes releases the GIL for all of it and
+// independent engines can step in parallel threads. Returns 0, or -1 if the
+// material pool could not grow.
+int run_steps(Physics2D *physics, StepState *state, int steps) {
+    static const int32_t pair_types[2] = {MATERIAL_COT, MATERIAL_FAB};
+    Vec2 entrance[2] = {physics->conveyor_paths[0], physics->conveyor_paths[0]};
+    for (int step = 0; step < steps; step++) {
+        double sim_time = (double)state->ticks * state->dt;
+        int spawn = state->spawn_enabled && sim_time - state->last_spawn_time >= state->spawn_interval;
+        if (spawn) {
+            state->last_spawn_time = sim_time;
+        }
+        if (state->auto_move) {
+            vectorized_move_materials(physics, state->speed);
+        }
+        if (spawn) {
+            if (spawn_materials_batch(physics, entrance, pair_types, 2) < 0) {
+                return -1;
+            }
+            state->spawned_count += 2;
+        }
+        update(physics, (float)state->dt);
+        state->ticks++;
+        state->wip_ticks += physics->materials.count;
+    }
+    return 0;
+}
+
+/* ------------------------------------------------------------------------ */
+/* Python module: fast-path entry points                                     */
+/* ------------------------------------------------------------------------ */
+
+// Engines are passed as the ctypes POINTER(Physics2D) that create_physics2d
+// returns. Its buffer holds the pointer value, so reading it costs a buffer
+// request instead of ctypes argument conversion. Plain integer addresses work too.
+static Physics2D *engine_arg(PyObject *object) {
+    Physics2D *physics = NULL;
+    if (PyLong_Check(object)) {
+        physics = (Physics2D*)PyLong_AsVoidPtr(object);
+        if (physics == NULL && PyErr_Occurred()) {
+            return NULL;
+        }
+    } else {
+        Py_buffer view;
+        if (PyObject_GetBuffer(object, &view, PyBUF_SIMPLE) != 0) {
+            return NULL;
+        }
+        int is_pointer = view.len == (Py_ssize_t)sizeof(Physics2D*);
+        if (is_pointer) {
+            memcpy(&physics, view.buf, sizeof(Physics2D*));
+        }
+        PyBuffer_Release(&view);
+        if (!is_pointer) {
+            PyErr_SetString(PyExc_TypeError, "expected a physics2d engine pointer");
+            return NULL;
+        }
+    }
+    if (physics == NULL) {
+        PyErr_SetString(PyExc_ValueError, "physics2d engine pointer is NULL");
+    }
+    return physics;
+}
+
+static int check_args(const char *name, Py_ssize_t nargs, Py_ssize_t expected) {
+    if (nargs != expected) {
+        PyErr_Format(PyExc_TypeError, "%s() takes %zd arguments (%zd given)", name, expected, nargs);
+        return -1;
+    }
+    return 0;
+}
+
+// Request a C-contiguous buffer of 4-byte `format` items ('f' float32 or 'i'
+// int32) with `ndim` dimensions, (N, 2) when 2-D. Anything else is a TypeError
+// rather than bytes reinterpreted as the engine's types.
+static int typed_buffer(PyObject *object, Py_buffer *view, int flags, char format, int ndim, const char *name) {
+    if (PyObject_GetBuffer(object, view, flags | PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0) {
+        return -1;
+    }
+    const char *item = view->format != NULL ? view->format : "B";
+    if (*item == '@' || *item == '=' || (PY_LITTLE_ENDIAN && *item == '<')) {
+        item++;
+    }
+    int matches = (item[0] == format || (format == 'i' && item[0] == 'l')) && item[1] == '\0' && view->itemsize == 4;
+    if (!matches || view->ndim != ndim || (ndim == 2 && view->shape[1] != 2)) {
+        PyErr_Format(PyExc_TypeError, "%s must be a contiguous %s %s array", name,
+                     format == 'f' ? "float32" : "int32", ndim == 2 ? "(N, 2)" : "1-D");
+        PyBuffer_Release(view);
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *py_move_materials(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_args("move_materials", nargs, 2) != 0) {
+        return NULL;
+    }
+    Physics2D *physics = engine_arg(args[0]);
+    double speed = PyFloat_AsDouble(args[1]);
+    if (physics == NULL || PyErr_Occurred()) {
+        return NULL;
+    }
+    vectorized_move_materials(physics, (float)speed);
+    Py_RETURN_NONE;
+}
+
+static PyObject *py_update(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_args("update", nargs, 2) != 0) {
+        return NULL;
+    }
+    Physics2D *physics = engine_arg(args[0]);
+    double dt = PyFloat_AsDouble(args[1]);
+    if (physics == NULL || PyErr_Occurred()) {
+        return NULL;
+    }
+    update(physics, (float)dt);
+    Py_RETURN_NONE;
+}
+
+// run_steps(engine, state, steps): `state` is a writable buffer holding a StepState
+// (the ctypes structure). The GIL is released while the steps run.
+static PyObject *py_run_steps(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_args("run_steps", nargs, 3) != 0) {
+        return NULL;
+    }
+    Physics2D *physics = engine_arg(args[0]);
+    if (physics == NULL) {
+        return NULL;
+    }
+    long steps = PyLong_AsLong(args[2]);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+    if (steps > INT_MAX || steps < INT_MIN) {
+        PyErr_SetString(PyExc_OverflowError, "steps does not fit in a C int");
+        return NULL;
+    }
+    Py_buffer state;
+    if (PyObject_GetBuffer(args[1], &state, PyBUF_WRITABLE) != 0) {
+        return NULL;
+    }
+    if (state.len != (Py_ssize_t)sizeof(StepState)) {
+        PyBuffer_Release(&state);
+        PyErr_SetString(PyExc_TypeError, "state must be a StepState");
+        return NULL;
+    }
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = run_steps(physics, (StepState*)state.buf, (int)steps);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&state);
+    if (result != 0) {
+        return PyErr_NoMemory();
+    }
+    Py_RETURN_NONE;
+}
+
+// spawn_batch(engine, positions, types): contiguous float32 (N, 2) positions and
+// int32 (N,) type codes, e.g. NumPy arrays. Returns N.
+static PyObject *py_spawn_batch(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_args("spawn_batch", nargs, 3) != 0) {
+        return NULL;
+    }
+    Physics2D *physics = engine_arg(args[0]);
+    if (physics == NULL) {
+        return NULL;
+    }
+    Py_buffer positions, types;
+    if (typed_buffer(args[1], &positions, PyBUF_SIMPLE, 'f', 2, "positions") != 0) {
+        return NULL;
+    }
+    if (typed_buffer(args[2], &types, PyBUF_SIMPLE, 'i', 1, "types") != 0) {
+        PyBuffer_Release(&positions);
+        return NULL;
+    }
+    Py_ssize_t count = types.len / (Py_ssize_t)sizeof(int32_t);
+    int spawned = -2;
+    if (positions.len == count * (Py_ssize_t)sizeof(Vec2) && count <= INT32_MAX) {
+        spawned = spawn_materials_batch(physics, (const Vec2*)positions.buf, (const int32_t*)types.buf, (int)count);
+    }
+    PyBuffer_Release(&positions);
+    PyBuffer_Release(&types);
+    if (spawned == -2) {
+        PyErr_SetString(PyExc_ValueError, "positions and types must have the same length");
+        return NULL;
+    }
+    if (spawned < 0) {
+        return PyErr_NoMemory();
+    }
+    return PyLong_FromLong(spawned);
+}
+
+// count_area_materials(engine, out): fills a writable int32 buffer, one count per area
+static PyObject *py_count_area_materials(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_args("count_area_materials", nargs, 2) != 0) {
+        return NULL;
+    }
+    Physics2D *physics = engine_arg(args[0]);
+    if (physics == NULL) {
+        return NULL;
+    }
+    Py_buffer counts;
+    if (typed_buffer(args[1], &counts, PyBUF_WRITABLE, 'i', 1, "out") != 0) {
+        return NULL;
+    }
+    count_area_materials(physics, (int32_t*)counts.buf, (int)(counts.len / (Py_ssize_t)sizeof(int32_t)));
+    PyBuffer_Release(&counts);
+    Py_RETURN_NONE;
+}
+
+// copy_materials(engine, positions, types): fill a writable float32 (N, 2) buffer
+// and an int32 (N,) buffer with as many materials as fit. Returns the count.
+static PyObject *py_copy_materials(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_args("copy_materials", nargs, 3) != 0) {
+        return NULL;
+    }
+    Physics2D *physics = engine_arg(args[0]);
+    if (physics == NULL) {
+        return NULL;
+    }
+    Py_buffer positions, types;
+    if (typed_buffer(args[1], &positions, PyBUF_WRITABLE, 'f', 2, "positions") != 0) {
+        return NULL;
+    }
+    if (typed_buffer(args[2], &types, PyBUF_WRITABLE, 'i', 1, "types") != 0) {
+        PyBuffer_Release(&positions);
+        return NULL;
+    }
+    Py_ssize_t max_count = positions.len / (Py_ssize_t)sizeof(Vec2);
+    if (types.len / (Py_ssize_t)sizeof(int32_t) < max_count) {
+        max_count = types.len / (Py_ssize_t)sizeof(int32_t);
+    }
+    int count = copy_material_state(physics, (float*)positions.buf, (int32_t*)types.buf, max_count < INT32_MAX ? (int)max_count : INT32_MAX);
+    PyBuffer_Release(&positions);
+    PyBuffer_Release(&types);
+    return PyLong_FromLong(count);
+}
+
+// state_array(engine): rasterize and return the grid's address. c_bindings wraps
+// it in an array that keeps the engine alive; a bare memoryview would not.
+static PyObject *py_state_array(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_args("state_array", nargs, 1) != 0) {
+        return NULL;
+    }
+    Physics2D *physics = engine_arg(args[0]);
+    if (physics == NULL) {
+        return NULL;
+    }
+    return PyLong_FromVoidPtr(get_state_array(physics));
+}
+
+static PyMethodDef physics2d_methods[] = {
+    {"move_materials", (PyCFunction)(void(*)(void))py_move_materials, METH_FASTCALL, "move_materials(engine, speed)"},
+    {"update", (PyCFunction)(void(*)(void))py_update, METH_FASTCALL, "update(engine, dt)"},
+    {"run_steps", (PyCFunction)(void(*)(void))py_run_steps, METH_FASTCALL, "run_steps(engine, state, steps), without the GIL"},
+    {"spawn_batch", (PyCFunction)(void(*)(void))py_spawn_batch, METH_FASTCALL, "spawn_batch(engine, positions, types) -> count"},
+    {"count_area_materials", (PyCFunction)(void(*)(void))py_count_area_materials, METH_FASTCALL, "count_area_materials(engine, out)"},
+    {"copy_materials", (PyCFunction)(void(*)(void))py_copy_materials, METH_FASTCALL, "copy_materials(engine, positions, types) -> count"},
+    {"state_array", (PyCFunction)(void(*)(void))py_state_array, METH_FASTCALL, "state_array(engine) -> address of the grid"},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef physics2d_module = {
+    PyModuleDef_HEAD_INIT,
+    "physics2d",
+    "Factory simulation engine fast paths; see c_bindings for the full API.",
+    -1,
+    physics2d_methods
+};
+
+PyMODINIT_FUNC PyInit_physics2d(void) {
+    return PyModule_Create(&physics2d_module);
+}
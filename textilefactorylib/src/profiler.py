@@ -0,0 +1,86 @@
+import csv
+import json
+import os
+import time
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+class StageProfiler:
+    # Wall time per named stage of a frame or tick loop, kept in fixed-size
+    # rolling windows. Call begin() at the top of the loop and lap(name) after
+    # each stage: a stage takes the time since the previous mark. end() records
+    # the whole iteration as the "frame" stage.
+    def __init__(self, window=600):
+        self.window = window
+        self.samples = {}  # stage -> ring buffer of seconds
+        self.counts = {}   # stage -> samples recorded
+        self.frame_start = self.mark = time.perf_counter()
+
+    def begin(self):
+        self.frame_start = self.mark = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.record(name, now - self.mark)
+        self.mark = now
+
+    def end(self):
+        now = time.perf_counter()
+        self.record("frame", now - self.frame_start)
+        self.mark = now
+
+    def record(self, name, seconds):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = np.zeros(self.window)
+            self.counts[name] = 0
+        samples[self.counts[name] % self.window] = seconds
+        self.counts[name] += 1
+
+    def summary(self):
+        # {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} over each stage's window, in first-seen order
+        summary = {}
+        for name, samples in self.samples.items():
+            window = samples[:min(self.counts[name], self.window)] * 1e3
+            stats = {"count": self.counts[name], "mean_ms": float(window.mean())}
+            for percentile, value in zip(PERCENTILES, np.percentile(window, PERCENTILES)):
+                stats[f"p{percentile}_ms"] = float(value)
+            summary[name] = stats
+        return summary
+
+    def format(self):
+        # Fixed-width table of the summary, for the console and the v1 overlay
+        lines = [f"{'stage':<14}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<14}{stats['p50_ms']:>8.3f}{stats['p95_ms']:>8.3f}{stats['p99_ms']:>8.3f}")
+        return "\n".join(lines)
+
+    def export(self, path):
+        # Write the summary as .json, or one row per stage as .csv
+        summary = self.summary()
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(["stage", "count", "mean_ms"] + [f"p{percentile}_ms" for percentile in PERCENTILES])
+                for name, stats in summary.items():
+                    writer.writerow([name] + list(stats.values()))
+        elif extension == '.json':
+            with open(path, 'w') as file:
+                json.dump(summary, file, indent=4)
+        else:
+            raise ValueError(f"Unsupported profile format '{extension}', expected .csv or .json")
+
+class NullProfiler:
+    # Stands in while profiling is off; every mark is a no-op
+    def begin(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def end(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,168 @@
+import os
+import queue
+import shlex
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from .c_bindings import copy_material_state
+from .viewer import HUD_HEIGHT, build_background, build_sprites, draw_frame
+
+def import_pygame():
+    # pygame for offscreen use: the SDL dummy video driver unless another one is
+    # set, and no banner on stdout, which carries the run's results
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    return pygame
+
+class OffscreenRenderer:
+    # Draws a FactorySimulation onto an offscreen Surface with the viewer's
+    # look; needs no display
+    def __init__(self, params, scale=10):
+        pygame = import_pygame()
+        pygame.init()
+        self.scale = scale
+        width, height = params['global_resolution']
+        size = (width * scale, height * scale)
+        self.surface = pygame.Surface((size[0], size[1] + HUD_HEIGHT))
+        self.background = build_background(pygame, size, scale, params)
+        self.sprites = build_sprites(pygame, max(scale // 2, 2))
+        self.font = pygame.font.Font(None, 24)
+        self.positions = np.empty((0, 2), dtype=np.float32)
+        self.types = np.empty(0, dtype=np.int32)
+
+    @property
+    def size(self):
+        return self.surface.get_size()
+
+    def render(self, simulation):
+        # Redraw the surface from the simulation's current state and return it
+        count = simulation.physics.contents.materials.count
+        if count > len(self.types):
+            self.positions = np.empty((count * 2, 2), dtype=np.float32)
+            self.types = np.empty(count * 2, dtype=np.int32)
+        count = copy_material_state(simulation.physics, self.positions, self.types)
+        counters = {"sim_time": simulation.sim_time, "object_count": simulation.object_count, "completed_count": simulation.completed_count}
+        draw_frame(self.surface, self.background, self.sprites, self.font, self.scale, self.positions[:count], self.types[:count], counters)
+        return self.surface
+
+def save_png(pygame, surface, path):
+    pygame.image.save(surface, path)
+
+def pipe_frames(frames, stream):
+    # Encoder feeder thread: write raw frames in order until None, or until the encoder exits
+    try:
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            stream.write(frame)
+    except BrokenPipeError:
+        pass
+
+class FrameExporter:
+    # Streams rendered frames out as they are produced: as a numbered PNG
+    # sequence in `directory`, compressed on a pool of `workers` threads, and/or
+    # as raw RGB24 frames piped to the stdin of an `encoder` command such as
+    # "ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - out.mp4".
+    # At most `pending` frames wait on each output; past that write() waits, so
+    # memory stays bounded however slow the encoding is.
+    def __init__(self, size, directory=None, encoder=None, fps=30, workers=None, pending=None):
+        self.pygame = import_pygame()
+        self.size = size
+        self.frames = 0
+        self.directory = directory
+        self.pool = None
+        self.encoder = None
+        workers = workers or os.cpu_count() or 1
+        pending = pending or 2 * workers
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="png")
+            self.saves = deque()
+            self.pending = pending
+        if encoder is not None:
+            width, height = size
+            command = [arg.format(width=width, height=height, fps=fps) for arg in shlex.split(encoder)]
+            self.encoder = subprocess.Popen(command, stdin=subprocess.PIPE)
+            self.queue = queue.Queue(maxsize=pending)
+            self.feeder = threading.Thread(target=pipe_frames, args=(self.queue, self.encoder.stdin), name="encoder-pipe", daemon=True)
+            self.feeder.start()
+
+    def frame_path(self, index):
+        return os.path.join(self.directory, f"frame_{index:06d}.png")
+
+    def write(self, surface):
+        if self.pool is not None:
+            if len(self.saves) >= self.pending:
+                self.saves.popleft().result()
+            self.saves.append(self.pool.submit(save_png, self.pygame, surface.copy(), self.frame_path(self.frames)))
+        if self.encoder is not None:
+            self.pipe(self.pygame.image.tobytes(surface, "RGB"))
+        self.frames += 1
+
+    def pipe(self, frame):
+        # Queue a frame for the encoder, waiting while the queue is full
+        while True:
+            if not self.feeder.is_alive():
+                raise RuntimeError(f"encoder exited with code {self.encoder.wait()}")
+            try:
+                self.queue.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def close(self, failing=False):
+        # Wait for every frame to be written; raises if a PNG or the encoder
+        # failed, unless `failing`: the caller already has an error to report
+        if self.pool is not None:
+            try:
+                while self.saves:
+                    self.saves.popleft().result()
+            except Exception:
+                if not failing:
+                    raise
+            finally:
+                self.pool.shutdown()
+        if self.encoder is not None:
+            try:
+                self.pipe(None)
+            except RuntimeError:
+                pass
+            self.feeder.join()
+            try:
+                self.encoder.stdin.close()
+            except BrokenPipeError:
+                pass
+            code = self.encoder.wait()
+            if code != 0 and not failing:
+                raise RuntimeError(f"encoder exited with code {code}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(failing=exc_type is not None)
+
+def render_run(simulation, sim_seconds, renderer, exporter, stride=60):
+    # Run `sim_seconds` on the simulated clock, exporting a frame at the start
+    # and then every `stride` ticks (and at the end). Between frames the
+    # simulation advances inside the engine, so a long run with a large stride
+    # costs little more than the frames themselves. Returns the run's results
+    # with the number of frames.
+    wall_start = time.perf_counter()
+    remaining = int(round(sim_seconds / simulation.dt))
+    with exporter:
+        exporter.write(renderer.render(simulation))
+        while remaining > 0:
+            ticks = min(stride, remaining)
+            simulation.run_ticks(ticks)
+            remaining -= ticks
+            exporter.write(renderer.render(simulation))
+    results = simulation.results(time.perf_counter() - wall_start)
+    results["frames"] = exporter.frames
+    return results
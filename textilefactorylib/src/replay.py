@@ -0,0 +1,160 @@
+import hashlib
+import pickle
+import struct
+import zlib
+
+# Run log: everything needed to re-run a simulation bit for bit, appended as
+# the run goes. A header (magic, format version, seed, tick length), then
+# records of a kind byte and the tick it applies at, stored as an unsigned
+# LEB128 delta from the previous record's tick:
+#
+#   kind 1..127  an input, e.g. a key press or button; no payload
+#   CHECKPOINT   u32 length, then the zlib-compressed pickled simulation state
+#   END          the digest of the final state (DIGEST_SIZE bytes)
+#
+# Inputs apply before the tick they are stamped with. Every record is flushed
+# when written, so a run that crashes still leaves a readable log up to its
+# last record. Checkpoints are pickles: only replay logs you recorded.
+MAGIC = b"TFRUNLOG"
+VERSION = 1
+HEADER = struct.Struct("<8sHQd")
+CHECKPOINT = 0x80
+END = 0xFF
+LENGTH = struct.Struct("<I")
+DIGEST_SIZE = 16
+
+def state_digest(arrays, values):
+    # Digest of a simulation state: raw bytes of each array, then the repr of each value
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for array in arrays:
+        digest.update(array.tobytes())
+    digest.update(repr(tuple(values)).encode())
+    return digest.digest()
+
+def encode_varint(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+class RunRecorder:
+    def __init__(self, path, seed, dt):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, dt))
+        self.file.flush()
+        self.tick = 0
+
+    def write(self, kind, tick, payload=b""):
+        if tick < self.tick:
+            raise ValueError(f"tick {tick} is before the last recorded tick {self.tick}")
+        self.file.write(bytes([kind]) + encode_varint(tick - self.tick) + payload)
+        self.file.flush()
+        self.tick = tick
+
+    def input(self, tick, kind):
+        if not 1 <= kind < CHECKPOINT:
+            raise ValueError(f"input kinds are 1 to {CHECKPOINT - 1}, got {kind}")
+        self.write(kind, tick)
+
+    def checkpoint(self, tick, state):
+        payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+        self.write(CHECKPOINT, tick, LENGTH.pack(len(payload)) + payload)
+
+    def end(self, tick, digest):
+        self.write(END, tick, digest)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RunLog:
+    # A run log read back in full. `inputs` are (tick, kind) in recorded order,
+    # `checkpoints` (tick, offset) in tick order; `end_tick` and `digest` are
+    # None when the run did not finish, with `complete` False.
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = file.read()
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not a run log")
+        magic, version, self.seed, self.dt = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a run log")
+        if version != VERSION:
+            raise ValueError(f"Unsupported run log version {version} in {path}")
+        self.inputs = []
+        self.checkpoints = []
+        self.end_tick = None
+        self.digest = None
+        self.last_tick = 0
+        self.parse(HEADER.size)
+        self.complete = self.end_tick is not None
+
+    def parse(self, offset):
+        data = self.data
+        tick = 0
+        try:
+            while offset < len(data):
+                kind = data[offset]
+                delta, offset = read_varint(data, offset + 1)
+                tick += delta
+                if kind == END:
+                    if offset + DIGEST_SIZE > len(data):
+                        return
+                    self.end_tick = tick
+                    self.digest = data[offset:offset + DIGEST_SIZE]
+                    offset += DIGEST_SIZE
+                elif kind == CHECKPOINT:
+                    length, = LENGTH.unpack_from(data, offset)
+                    if offset + LENGTH.size + length > len(data):
+                        return
+                    self.checkpoints.append((tick, offset + LENGTH.size))
+                    offset += LENGTH.size + length
+                else:
+                    self.inputs.append((tick, kind))
+                self.last_tick = tick
+        except (IndexError, struct.error):
+            # A record cut short by a crash; keep everything before it
+            pass
+
+    def load_checkpoint(self, offset):
+        length, = LENGTH.unpack_from(self.data, offset - LENGTH.size)
+        return pickle.loads(zlib.decompress(self.data[offset:offset + length]))
+
+    def checkpoint_before(self, tick):
+        # (tick, state) of the latest checkpoint at or before `tick`, or None
+        best = None
+        for checkpoint_tick, offset in self.checkpoints:
+            if checkpoint_tick > tick:
+                break
+            best = (checkpoint_tick, offset)
+        if best is None:
+            return None
+        return best[0], self.load_checkpoint(best[1])
+
+    def inputs_by_tick(self, start=0):
+        # {tick: [kind, ...]} for inputs at or after `start`
+        inputs = {}
+        for tick, kind in self.inputs:
+            if tick >= start:
+                inputs.setdefault(tick, []).append(kind)
+        return inputs
@@ -0,0 +1,330 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+import numpy as np
+
+from .c_bindings import MATERIAL_TYPES, copy_material_state, count_area_materials
+
+# Live state stream for dashboards and remote viewers. Clients connect over
+# WebSocket (binary messages) or GET /events (server-sent events, each message
+# base64 encoded) and first receive a JSON hello describing the floor, then one
+# binary message per broadcast frame. All numbers are little-endian:
+#
+#   MESSAGE_HEADER  frame, base, tick, sim_time, object_count, completed_count,
+#                   material count, stations, records
+#   stations x u32  WIP per factory_layout station, in hello["stations"] order
+#   records x RECORD  materials whose slot changed since frame `base`
+#
+# Frames count from 1; base 0 is the empty floor, so a message with base 0 is a
+# keyframe carrying every material. A record sets material slot `index`;
+# slots at or beyond the material count are gone. Positions are quantized to
+# POSITION_SCALE steps across the floor width and height.
+MESSAGE_HEADER = struct.Struct("<qqqdqqIII")
+RECORD = np.dtype([("index", "<u4"), ("x", "<u2"), ("y", "<u2"), ("type", "u1")])
+POSITION_SCALE = 65535
+# Bytes queued on a client's socket before its writer waits for it to drain
+BUFFER_LIMIT = 256 * 1024
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Seconds close() waits for clients to receive the final frame
+FLUSH_SECONDS = 2.0
+# Stands in for a client's next message when it fell behind: it gets a keyframe of the latest frame instead
+KEYFRAME = object()
+
+class Frame:
+    # Quantized floor state the broadcaster diffs frames against
+    def __init__(self, number=0, positions=None, types=None, header=None, wip=None):
+        self.number = number
+        self.positions = positions if positions is not None else np.empty((0, 2), dtype=np.uint16)
+        self.types = types if types is not None else np.empty(0, dtype=np.uint8)
+        self.header = header
+        self.wip = wip
+
+    def encode(self, indices, base):
+        records = np.empty(len(indices), dtype=RECORD)
+        records["index"] = indices
+        records["x"] = self.positions[indices, 0]
+        records["y"] = self.positions[indices, 1]
+        records["type"] = self.types[indices]
+        header = MESSAGE_HEADER.pack(self.number, base, *self.header, len(self.types), len(self.wip), len(records))
+        return header + self.wip.tobytes() + records.tobytes()
+
+    def delta(self, previous):
+        # Slots that differ from `previous`, plus slots it did not have
+        shared = min(len(self.types), len(previous.types))
+        changed = (self.positions[:shared] != previous.positions[:shared]).any(axis=1)
+        changed |= self.types[:shared] != previous.types[:shared]
+        indices = np.concatenate([np.flatnonzero(changed), np.arange(shared, len(self.types))])
+        return self.encode(indices, previous.number)
+
+    def keyframe(self):
+        return self.encode(np.arange(len(self.types)), 0)
+
+class Capture:
+    # Raw copy of the simulation taken on the simulation thread
+    def __init__(self, simulation, station_count):
+        size = simulation.physics.contents.materials.count
+        self.positions = np.empty((size, 2), dtype=np.float32)
+        self.types = np.empty(size, dtype=np.int32)
+        count = copy_material_state(simulation.physics, self.positions, self.types)
+        self.positions = self.positions[:count]
+        self.types = self.types[:count]
+        self.wip = count_area_materials(simulation.physics, station_count).astype("<u4")
+        self.header = (simulation.ticks, simulation.sim_time, simulation.object_count, simulation.completed_count)
+
+class Subscriber:
+    # One client. It holds at most one message: when a new frame arrives before
+    # the last one was sent, the client skips ahead to a keyframe, so a slow
+    # client never queues frames or holds up anyone else.
+    def __init__(self, writer, framing):
+        self.writer = writer
+        self.framing = framing
+        self.frame = 0
+        self.pending = None
+        self.dropped = 0
+        self.wake = asyncio.Event()
+        self.tasks = []
+        writer.transport.set_write_buffer_limits(high=BUFFER_LIMIT)
+
+    def offer(self, frame, base, delta):
+        if self.pending is None and self.frame == base:
+            self.pending = delta
+            self.frame = frame
+        else:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = KEYFRAME
+        self.wake.set()
+
+    async def run(self, server):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            message, self.pending = self.pending, None
+            if message is KEYFRAME:
+                self.frame = server.frame.number
+                message = server.keyframe()
+            if message is None:
+                continue
+            self.writer.write(self.framing(message))
+            await self.writer.drain()
+
+def websocket_frame(payload, opcode=0x2):
+    # One unmasked, unfragmented server-to-client WebSocket frame
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+def sse_event(payload, event="frame"):
+    if isinstance(payload, bytes):
+        payload = base64.b64encode(payload)
+    else:
+        payload = payload.encode()
+    return b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+
+async def read_websocket_frame(reader):
+    # (opcode, payload) of the next client frame; clients always mask
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack("!Q", await reader.readexactly(8))
+    if length > BUFFER_LIMIT:
+        raise ConnectionError("WebSocket message too large")
+    mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+    payload = np.frombuffer(await reader.readexactly(length), dtype=np.uint8)
+    payload = (payload ^ np.resize(np.frombuffer(mask, dtype=np.uint8), length)).tobytes()
+    return first & 0x0F, payload
+
+class StateServer:
+    # Serves the live state of one simulation on localhost. Set it as the
+    # simulation's publisher: publish() is called every tick on the simulation
+    # thread but only copies the floor when the broadcaster asks for a frame,
+    # at most max_fps times a second (0 for every tick). Diffing, encoding and
+    # all client I/O run on the server's own event loop thread, and each client
+    # drains at its own pace, so clients never slow the simulation step.
+    def __init__(self, params, host="127.0.0.1", port=8765, max_fps=30):
+        self.host = host
+        self.port = port
+        self.interval = 1 / max_fps if max_fps else 0
+        self.stations = list(params.get('factory_layout', {}))
+        width, height = params['global_resolution']
+        self.scale = np.array([POSITION_SCALE / width, POSITION_SCALE / height], dtype=np.float32)
+        self.hello = json.dumps({
+            "stations": self.stations,
+            "width": width,
+            "height": height,
+            "position_scale": POSITION_SCALE,
+            "material_types": MATERIAL_TYPES,
+        })
+        self.frame = Frame()
+        self.cached_keyframe = None
+        self.subscribers = set()
+        self.handlers = set()
+        self.wanted = False
+        self.latest = None
+        self.simulation = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="state-server", daemon=True)
+
+    def start(self):
+        # Bind and start serving; with port 0 the chosen port is in self.port afterwards
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.serve(), self.loop).result()
+        return self
+
+    async def serve(self):
+        self.ready = asyncio.Event()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.broadcaster = asyncio.ensure_future(self.broadcast())
+
+    def publish(self, simulation):
+        self.simulation = simulation
+        if self.wanted:
+            self.wanted = False
+            self.latest = Capture(simulation, len(self.stations))
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    async def broadcast(self):
+        while True:
+            self.wanted = True
+            await self.ready.wait()
+            self.ready.clear()
+            self.send(self.latest)
+            if self.interval:
+                await asyncio.sleep(self.interval)
+
+    def send(self, capture):
+        quantized = np.clip(np.rint(capture.positions * self.scale), 0, POSITION_SCALE).astype(np.uint16)
+        frame = Frame(self.frame.number + 1, quantized, capture.types.astype(np.uint8), capture.header, capture.wip)
+        delta = frame.delta(self.frame)
+        self.frame = frame
+        self.cached_keyframe = None
+        for subscriber in self.subscribers:
+            subscriber.offer(frame.number, frame.number - 1, delta)
+
+    def keyframe(self):
+        # Shared by every client catching up on the current frame
+        if self.frame.number == 0:
+            return None
+        if self.cached_keyframe is None:
+            self.cached_keyframe = self.frame.keyframe()
+        return self.cached_keyframe
+
+    async def handle(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            headers = dict(line.split(":", 1) for line in lines[1:] if ":" in line)
+            headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+            if method != "GET":
+                writer.write(b"HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n")
+            elif headers.get("upgrade", "").lower() == "websocket":
+                await self.serve_websocket(reader, writer, headers)
+            elif path.split("?")[0] == "/events":
+                await self.serve_events(reader, writer)
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+    async def subscribe(self, writer, framing, receive):
+        # Stream frames to the client until `receive` returns, i.e. the client hangs up
+        subscriber = Subscriber(writer, framing)
+        subscriber.offer(self.frame.number, -1, None)
+        self.subscribers.add(subscriber)
+        subscriber.tasks = [asyncio.ensure_future(subscriber.run(self)), asyncio.ensure_future(receive())]
+        try:
+            await asyncio.wait(subscriber.tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.subscribers.discard(subscriber)
+            for task in subscriber.tasks:
+                task.cancel()
+
+    async def serve_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "").encode()
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        writer.write(websocket_frame(self.hello.encode(), opcode=0x1))
+
+        async def receive():
+            # Answer pings until the client sends a close frame or disconnects
+            while True:
+                opcode, payload = await read_websocket_frame(reader)
+                if opcode == 0x8:
+                    writer.write(websocket_frame(payload[:2], opcode=0x8))
+                    return
+                if opcode == 0x9:
+                    writer.write(websocket_frame(payload, opcode=0xA))
+
+        await self.subscribe(writer, websocket_frame, receive)
+
+    async def serve_events(self, reader, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        writer.write(sse_event(self.hello, "hello"))
+
+        async def receive():
+            # Event stream clients send nothing more; EOF means they left
+            while await reader.read(1024):
+                pass
+
+        await self.subscribe(writer, sse_event, receive)
+
+    async def flush(self):
+        # Send the simulation's final state, give clients a moment to receive it, then hang up
+        self.broadcaster.cancel()
+        if self.simulation is not None:
+            self.send(Capture(self.simulation, len(self.stations)))
+        deadline = self.loop.time() + FLUSH_SECONDS
+        while any(subscriber.pending is not None for subscriber in self.subscribers) and self.loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        self.server.close()
+        writers = [subscriber.writer for subscriber in self.subscribers]
+        for subscriber in list(self.subscribers):
+            if subscriber.framing is websocket_frame:
+                subscriber.writer.write(websocket_frame(struct.pack("!H", 1001), opcode=0x8))
+            for task in subscriber.tasks:
+                task.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        # Closed sockets still send what they have buffered
+        while any(writer.transport.get_write_buffer_size() for writer in writers) and self.loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        await self.server.wait_closed()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.flush(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def decode_message(message):
+    # (header dict, station WIP, records) of one binary message, for clients written in Python
+    values = MESSAGE_HEADER.unpack_from(message)
+    header = dict(zip(("frame", "base", "tick", "sim_time", "object_count", "completed_count", "count", "stations", "records"), values))
+    offset = MESSAGE_HEADER.size
+    wip = np.frombuffer(message, dtype="<u4", count=header["stations"], offset=offset)
+    offset += wip.nbytes
+    records = np.frombuffer(message, dtype=RECORD, count=header["records"], offset=offset)
+    return header, wip, records
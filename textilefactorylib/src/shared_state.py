@@ -0,0 +1,155 @@
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+from .c_bindings import copy_material_state
+
+# Shared memory layout: a header, then two frame slots. The simulation writes
+# the slot readers are not pointed at, then publishes it by bumping
+# header["frame"]; frame f lives in slot f % 2. Each slot also carries a
+# seqlock sequence, odd while it is being written, so a reader that races the
+# writer onto the same slot notices and retries instead of rendering a torn
+# frame. The writer never waits for readers.
+HEADER = np.dtype([
+    ("frame", np.int64),     # last published frame, -1 before the first
+    ("capacity", np.int64),  # materials each slot can hold
+    ("width", np.int64),     # global_resolution of the simulation
+    ("height", np.int64),
+    ("closed", np.int64),    # set when the simulation stops publishing
+], align=True)
+HEADER_SIZE = 64
+
+# Per-frame counters, in slot order after the sequence
+FRAME_COUNTERS = ("tick", "sim_time", "object_count", "completed_count", "spawned_count", "count")
+
+def slot_dtype(capacity):
+    return np.dtype([
+        ("sequence", np.int64),
+        ("tick", np.int64),
+        ("sim_time", np.float64),
+        ("object_count", np.int64),
+        ("completed_count", np.int64),
+        ("spawned_count", np.int64),
+        ("count", np.int64),  # materials in this frame, at most capacity
+        ("positions", np.float32, (capacity, 2)),
+        ("types", np.int32, (capacity,)),
+    ], align=True)
+
+def shared_memory_size(capacity):
+    return HEADER_SIZE + 2 * slot_dtype(capacity).itemsize
+
+def attach(name):
+    # Map an existing block without registering it with this process's resource
+    # tracker, which would unlink the writer's block when a reader exits (and
+    # which forked readers share with the writer). track=False is Python 3.13+.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+def map_slots(buffer, capacity):
+    # {field: array over both slots}, e.g. fields["positions"][slot]
+    slots = np.ndarray((2,), dtype=slot_dtype(capacity), buffer=buffer, offset=HEADER_SIZE)
+    return {name: slots[name] for name in slots.dtype.names}
+
+class SharedStateWriter:
+    # Owns the shared memory block. publish() copies the simulation's positions,
+    # types and counters into the back slot and makes it current.
+    def __init__(self, name=None, capacity=65536, width=0, height=0):
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=shared_memory_size(capacity))
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.header = np.ndarray((), dtype=HEADER, buffer=self.shm.buf)
+        self.fields = map_slots(self.shm.buf, capacity)
+        self.header["frame"] = -1
+        self.header["capacity"] = capacity
+        self.header["width"] = width
+        self.header["height"] = height
+        self.header["closed"] = 0
+        self.fields["sequence"][:] = 0
+
+    def publish(self, simulation):
+        # Materials beyond capacity are left out of the frame; object_count still counts them
+        fields = self.fields
+        frame = int(self.header["frame"]) + 1
+        slot = frame % 2
+        fields["sequence"][slot] += 1
+        fields["count"][slot] = copy_material_state(simulation.physics, fields["positions"][slot], fields["types"][slot])
+        fields["tick"][slot] = simulation.ticks
+        fields["sim_time"][slot] = simulation.sim_time
+        fields["object_count"][slot] = simulation.object_count
+        fields["completed_count"][slot] = simulation.completed_count
+        fields["spawned_count"][slot] = simulation.spawned_count
+        fields["sequence"][slot] += 1
+        self.header["frame"] = frame
+
+    def close(self):
+        # Tell readers the run is over and remove the block; mapped readers keep their view
+        self.header["closed"] = 1
+        del self.header, self.fields
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class Frame:
+    # One consistent frame copied out of shared memory
+    def __init__(self, number, fields, slot):
+        self.number = number
+        self.counters = {name: fields[name][slot].item() for name in FRAME_COUNTERS}
+        count = self.counters["count"]
+        self.positions = fields["positions"][slot, :count].copy()
+        self.types = fields["types"][slot, :count].copy()
+
+class SharedStateReader:
+    # Attaches to a writer's block by name. Any number of readers, in any
+    # process, can follow one writer.
+    def __init__(self, name):
+        self.shm = attach(name)
+        self.header = np.ndarray((), dtype=HEADER, buffer=self.shm.buf)
+        self.capacity = int(self.header["capacity"])
+        self.width = int(self.header["width"])
+        self.height = int(self.header["height"])
+        self.fields = map_slots(self.shm.buf, self.capacity)
+
+    @property
+    def closed(self):
+        return bool(self.header["closed"])
+
+    def frame_number(self):
+        return int(self.header["frame"])
+
+    def read(self, retries=100):
+        # The latest published frame, or None before the first one
+        for _ in range(retries):
+            number = self.frame_number()
+            if number < 0:
+                return None
+            slot = number % 2
+            sequence = int(self.fields["sequence"][slot])
+            if sequence % 2 == 0:
+                frame = Frame(number, self.fields, slot)
+                if int(self.fields["sequence"][slot]) == sequence:
+                    return frame
+            # The writer lapped this reader onto the slot it is filling; take the newer frame
+            time.sleep(0)
+        raise TimeoutError("could not read a consistent frame")
+
+    def close(self):
+        del self.header, self.fields
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,90 @@
+import json
+import mmap
+import struct
+import numpy as np
+
+# File layout: magic, format version and header length, a JSON header, then
+# every array as raw little-endian bytes at a 64-byte aligned offset. The header
+# lists each array's dtype, shape and offset so readers can map them in place.
+MAGIC = b"TFSNAP\0\0"
+VERSION = 1
+PREFIX = struct.Struct("<8sII")
+ALIGNMENT = 64
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write_snapshot(path, arrays, metadata):
+    # arrays: {name: ndarray}, written without intermediate copies; metadata: JSON-serializable dict
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    entries = []
+    offset = 0
+    for name, array in arrays.items():
+        entries.append({"name": name, "dtype": array.dtype.newbyteorder("<").str, "shape": list(array.shape), "offset": offset})
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"metadata": metadata, "arrays": entries}).encode("utf-8")
+    data_start = _aligned(PREFIX.size + len(header))
+    with open(path, 'wb') as file:
+        file.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        for entry, array in zip(entries, arrays.values()):
+            file.seek(data_start + entry["offset"])
+            array.astype(entry["dtype"], copy=False).tofile(file)
+        file.truncate(data_start + offset)
+
+class Snapshot:
+    # A snapshot file mapped read-only. `arrays` are zero-copy views into the
+    # mapping, valid until close(). Views the caller still holds at close() keep
+    # the mapping alive until they are dropped; copy what must outlive it.
+    def __init__(self, path):
+        self.arrays = {}
+        self.closed = False
+        with open(path, 'rb') as file:
+            size = file.seek(0, 2)
+            if size < PREFIX.size:
+                raise ValueError(f"{path} is not a snapshot")
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._map_arrays(path)
+        except BaseException:
+            # A malformed header must not leave the file mapped
+            self.close()
+            raise
+
+    def _map_arrays(self, path):
+        magic, version, header_length = PREFIX.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a snapshot")
+        if version != VERSION:
+            raise ValueError(f"{path} is snapshot version {version}, expected {VERSION}")
+        header = json.loads(self.mmap[PREFIX.size:PREFIX.size + header_length])
+        data_start = _aligned(PREFIX.size + header_length)
+        self.version = version
+        self.metadata = header["metadata"]
+        for entry in header["arrays"]:
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"], dtype=np.int64))
+            if count == 0:
+                self.arrays[entry["name"]] = np.empty(entry["shape"], dtype=dtype)
+                continue
+            array = np.frombuffer(self.mmap, dtype=dtype, count=count, offset=data_start + entry["offset"])
+            self.arrays[entry["name"]] = array.reshape(entry["shape"])
+
+    def close(self):
+        # Safe to call more than once, e.g. explicitly inside a with block
+        if self.closed:
+            return
+        self.closed = True
+        self.arrays = {}
+        try:
+            self.mmap.close()
+        except BufferError:
+            # A view is still exported (held by the caller or a traceback); the
+            # mapping is unmapped once the last one is released
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
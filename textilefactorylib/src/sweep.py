@@ -0,0 +1,79 @@
+import copy
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .events import EventSimulation
+from .main import FactorySimulation
+
+# Parsed base params, run length and engine, loaded once per worker process by _init_worker
+_worker_params = None
+_worker_sim_seconds = None
+_worker_engine = None
+
+# Headless engines by name, both take the params dict and return the same results
+ENGINES = {"tick": FactorySimulation, "events": EventSimulation}
+
+RESULT_FIELDS = ["throughput_per_hour", "completed_count", "object_count", "average_wip", "average_cycle_time"]
+
+def expand_values(spec):
+    # A sweep axis is either an explicit list of values or {"start", "stop", "num"} for an inclusive linspace
+    if isinstance(spec, dict):
+        return np.linspace(spec["start"], spec["stop"], int(spec["num"])).tolist()
+    return list(spec)
+
+def expand_grid(grid):
+    # Cartesian product of every axis, as a list of {param path: value} overrides
+    keys = list(grid.keys())
+    axes = [expand_values(grid[key]) for key in keys]
+    return [dict(zip(keys, values)) for values in itertools.product(*axes)]
+
+def apply_override(params, path, value):
+    # Set a dotted parameter path such as "equipment_details.Sewing Area.speed";
+    # "*" matches every key at that level, e.g. "equipment_details.*.speed"
+    head, _, rest = path.partition(".")
+    targets = list(params.keys()) if head == "*" else [head]
+    for key in targets:
+        if rest:
+            apply_override(params[key], rest, value)
+        else:
+            params[key] = value
+
+def _init_worker(base_params, sim_seconds, engine):
+    global _worker_params, _worker_sim_seconds, _worker_engine
+    _worker_params = base_params
+    _worker_sim_seconds = sim_seconds
+    _worker_engine = ENGINES[engine]
+
+def _run_point(overrides):
+    params = copy.deepcopy(_worker_params)
+    for path, value in overrides.items():
+        apply_override(params, path, value)
+    simulation = _worker_engine(params)
+    results = simulation.run_headless(_worker_sim_seconds)
+    row = dict(overrides)
+    row.update({field: results[field] for field in RESULT_FIELDS})
+    return row
+
+def run_sweep(base_params, grid, sim_seconds, workers=None, engine="tick"):
+    # Fan every grid point out across a process pool and return one result row per point, in grid order
+    points = expand_grid(grid)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(points) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(base_params, sim_seconds, engine)) as executor:
+        return list(executor.map(_run_point, points, chunksize=chunksize))
+
+def write_results(rows, path):
+    if not rows:
+        return
+    if path.endswith(".parquet"):
+        import pandas as pd
+        pd.DataFrame(rows).to_parquet(path, index=False)
+        return
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,153 @@
+import csv
+import json
+import math
+import os
+import queue
+import threading
+import numpy as np
+
+def row_values(columns, null):
+    # Rows of plain Python values; NaN (no completion on that tick) becomes `null`
+    lists = []
+    for values in columns.values():
+        items = values.tolist()
+        if values.dtype.kind == 'f' and np.isnan(values).any():
+            items = [null if item != item else item for item in items]
+        lists.append(items)
+    return zip(*lists)
+
+class CsvSink:
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, columns):
+        self.writer.writerows(row_values(columns, ""))
+
+    def close(self):
+        self.file.close()
+
+class NdjsonSink:
+    def __init__(self, path, columns):
+        self.file = open(path, 'w')
+        self.template = "{" + ", ".join(f"{json.dumps(name)}: %s" for name in columns) + "}\n"
+
+    def write(self, columns):
+        template = self.template
+        self.file.write("".join(template % row for row in row_values(columns, "null")))
+
+    def close(self):
+        self.file.close()
+
+class ArrowSink:
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        self.pa = pa
+        self.file = pa.OSFile(path, 'wb')
+        self.writer = None
+
+    def write(self, columns):
+        batch = self.pa.record_batch(list(columns.values()), names=list(columns.keys()))
+        if self.writer is None:
+            self.writer = self.pa.ipc.new_file(self.file, batch.schema)
+        self.writer.write_batch(batch)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.file.close()
+
+SINKS = {".csv": CsvSink, ".ndjson": NdjsonSink, ".jsonl": NdjsonSink, ".arrow": ArrowSink, ".feather": ArrowSink}
+
+class TelemetryRecorder:
+    # Per-tick aggregates in a preallocated ring buffer of records. Every
+    # `chunk_size` records the filled range is handed to a background writer
+    # thread, which formats and writes it while the simulation keeps stepping.
+    # record() only waits if the writer falls a whole buffer behind.
+    def __init__(self, path, station_names, capacity=8192, chunk_size=1024):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in SINKS:
+            raise ValueError(f"Unsupported telemetry format '{extension}', expected one of {sorted(SINKS)}")
+        if not 0 < chunk_size <= capacity:
+            raise ValueError("chunk_size must be between 1 and capacity")
+        self.station_names = list(station_names)
+        self.dtype = np.dtype([
+            ("tick", np.int64),
+            ("sim_time", np.float64),
+            ("object_count", np.int64),
+            ("completed_count", np.int64),
+            ("throughput_per_hour", np.float64),
+            ("cycle_time", np.float64),  # mean cycle time of the materials completed on this tick
+            ("wip", np.int32, (len(self.station_names),))
+        ])
+        self.columns = [name for name in self.dtype.names if name != "wip"] + [f"wip_{name}" for name in self.station_names]
+        self.sink = SINKS[extension](path, self.columns)
+        self.buffer = np.zeros(capacity, dtype=self.dtype)
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.written = 0   # records stored
+        self.handed = 0    # records queued for the writer
+        self.flushed = 0   # records written out, their slots may be reused
+        self.error = None
+        self.chunks = queue.Queue()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._write_chunks, name="telemetry-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, tick, sim_time, object_count, completed_count, wip, cycle_time=math.nan):
+        if self.written - self.flushed >= self.capacity:
+            with self.condition:
+                self.condition.wait_for(lambda: self.written - self.flushed < self.capacity or self.error is not None)
+        if self.error is not None:
+            raise self.error
+        throughput = completed_count / sim_time * 3600 if sim_time > 0 else 0.0
+        self.buffer[self.written % self.capacity] = (tick, sim_time, object_count, completed_count, throughput, cycle_time, wip)
+        self.written += 1
+        if self.written - self.handed >= self.chunk_size:
+            self._hand_off()
+
+    def _hand_off(self):
+        if self.written > self.handed:
+            self.chunks.put((self.handed, self.written))
+            self.handed = self.written
+
+    def _chunk_columns(self, start, stop):
+        first, last = start % self.capacity, stop % self.capacity
+        if first < last or stop - start == 0:
+            records = self.buffer[first:first + stop - start]
+        else:
+            records = np.concatenate([self.buffer[first:], self.buffer[:last]])
+        columns = {name: records[name] for name in self.dtype.names if name != "wip"}
+        for i, name in enumerate(self.station_names):
+            columns[f"wip_{name}"] = records["wip"][:, i]
+        return columns
+
+    def _write_chunks(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            try:
+                if self.error is None:
+                    self.sink.write(self._chunk_columns(*chunk))
+            except Exception as error:
+                self.error = error
+            with self.condition:
+                self.flushed = chunk[1]
+                self.condition.notify_all()
+
+    def close(self):
+        # Flush the partial chunk, wait for the writer and close the file
+        self._hand_off()
+        self.chunks.put(None)
+        self.thread.join()
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
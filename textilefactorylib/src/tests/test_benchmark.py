@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+import unittest
+from textilefactorylib.src.benchmark import SIZED_CASES, compare, main, run_benchmarks
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_benchmarks(self):
+        results = run_benchmarks('params.json', sizes=[100, 2000], repeat=1, v1_seconds=0)
+        self.assertEqual(len(results["results"]), 2 * len(SIZED_CASES) + 1)
+        move = results["results"]["vectorized_move_materials/2000"]
+        self.assertEqual(move["items"], 2000)
+        self.assertGreater(move["seconds"], 0)
+        self.assertIn("load_params", results["results"])
+        self.assertEqual(results["meta"]["threads"], 1)
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}, "gone": {"seconds": 1.0}}}
+        results = {"results": {"a": {"seconds": 1.2}, "b": {"seconds": 1.3}, "new": {"seconds": 5.0}}}
+        rows = compare(results, baseline, threshold=0.25)
+        self.assertEqual([row["case"] for row in rows], ["a", "b"])
+        self.assertEqual([row["regressed"] for row in rows], [False, True])
+
+    def test_main_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            baseline = os.path.join(directory, "baseline.json")
+            options = ['--sizes', '100', '--repeat', '1', '--cases', 'update', '--output', output]
+            self.assertEqual(main(options), 0)
+            with open(output) as file:
+                results = json.load(file)
+            results["results"]["update/100"]["seconds"] /= 100
+            with open(baseline, 'w') as file:
+                json.dump(results, file)
+            self.assertEqual(main(options + ['--baseline', baseline]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
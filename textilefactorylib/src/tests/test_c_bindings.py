@@ -0,0 +1,343 @@
+import ctypes
+import gc
+import unittest
+import numpy as np
+from textilefactorylib.src import c_bindings
+from textilefactorylib.src.c_bindings import Vec2
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+
+
+class TestStateArray(unittest.TestCase):
+    def setUp(self):
+        self.physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.01, [Vec2(5, 5), Vec2(65, 40)])
+
+    def tearDown(self):
+        c_bindings.free_physics2d(self.physics)
+
+    def test_state_array_shape_and_dtype(self):
+        state_array = c_bindings.get_state_array(self.physics)
+        self.assertEqual(state_array.shape, (80, 60))
+        self.assertEqual(state_array.dtype, np.int32)
+        self.assertEqual(state_array.sum(), 0)
+
+    def test_state_array_rasterizes_materials(self):
+        c_bindings.spawn_material(self.physics, Vec2(5, 5), "Cot")
+        c_bindings.spawn_material(self.physics, Vec2(10, 20), "Fab")
+        state_array = c_bindings.get_state_array(self.physics)
+        self.assertEqual(state_array[5][5], 1)
+        self.assertEqual(state_array[10][20], 2)
+        self.assertEqual(np.count_nonzero(state_array), 2)
+
+    def test_state_array_is_refreshed_in_place(self):
+        state_array = c_bindings.get_state_array(self.physics)
+        c_bindings.spawn_material(self.physics, Vec2(1, 2), "Fin")
+        c_bindings.get_state_array(self.physics)
+        self.assertEqual(state_array[1][2], 3)
+
+    def test_state_array_outlives_simulation(self):
+        simulation = FactorySimulation(load_params('params.json'))
+        simulation.run_headless(60)
+        grid = c_bindings.get_state_array(simulation.physics)
+        expected = grid.copy()
+        del simulation
+        gc.collect()
+        # Reuse freed memory; the view must still read the engine's grid
+        garbage = [np.full(4096, 1000, dtype=np.int32) for _ in range(64)]
+        np.testing.assert_array_equal(grid, expected)
+        self.assertGreater(expected.sum(), 0)
+        del garbage
+
+    def test_freed_engine_has_no_views(self):
+        physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.01, [Vec2(5, 5), Vec2(65, 40)])
+        c_bindings.free_physics2d(physics)
+        with self.assertRaisesRegex(ValueError, "freed"):
+            c_bindings.get_state_array(physics)
+        c_bindings.free_physics2d(physics)
+
+
+class TestMaterialStore(unittest.TestCase):
+    def setUp(self):
+        self.physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.5, [Vec2(0, 0), Vec2(10, 0), Vec2(10, 10)])
+
+    def tearDown(self):
+        c_bindings.free_physics2d(self.physics)
+
+    def test_capacity_grows_geometrically(self):
+        for _ in range(1000):
+            c_bindings.spawn_material(self.physics, Vec2(0, 0), "Cot")
+        store = self.physics.contents.materials
+        self.assertEqual(store.count, 1000)
+        self.assertEqual(store.capacity, 1024)
+
+    def test_material_arrays_are_views(self):
+        c_bindings.spawn_material(self.physics, Vec2(1, 2), "Fab")
+        arrays = c_bindings.get_material_arrays(self.physics)
+        self.assertEqual(arrays["position_x"].tolist(), [1])
+        self.assertEqual(arrays["position_y"].tolist(), [2])
+        self.assertEqual(arrays["type"].tolist(), [2])
+        arrays["position_x"][0] = 7
+        self.assertEqual(c_bindings.get_state_array(self.physics)[7][2], 2)
+
+    def test_finished_materials_are_removed(self):
+        c_bindings.spawn_material(self.physics, Vec2(0, 0), "Cot")
+        c_bindings.vectorized_move_materials(self.physics, 0.5)
+        arrays = c_bindings.get_material_arrays(self.physics)
+        self.assertEqual(arrays["position_x"].tolist(), [5])
+        c_bindings.spawn_material(self.physics, Vec2(0, 0), "Fab")
+        for _ in range(3):
+            c_bindings.vectorized_move_materials(self.physics, 0.5)
+        arrays = c_bindings.get_material_arrays(self.physics)
+        self.assertEqual(self.physics.contents.completed_count, 1)
+        self.assertEqual(arrays["type"].tolist(), [2])
+        self.assertEqual(arrays["path_index"].tolist(), [1])
+
+    def test_material_arrays_outlive_simulation(self):
+        simulation = FactorySimulation(load_params('params.json'))
+        simulation.run_headless(60)
+        arrays = c_bindings.get_material_arrays(simulation.physics)
+        expected = {name: array.copy() for name, array in arrays.items()}
+        del simulation
+        gc.collect()
+        garbage = [np.full(4096, 1000, dtype=np.int32) for _ in range(64)]
+        for name, array in arrays.items():
+            np.testing.assert_array_equal(array, expected[name], name)
+        self.assertGreater(len(expected["type"]), 0)
+        del garbage
+
+class TestPathGeometry(unittest.TestCase):
+    def setUp(self):
+        # Uneven segments: 10 units then 30 units, mean segment length 20
+        self.physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.25, [Vec2(0, 0), Vec2(10, 0), Vec2(10, 30)], [4, 7])
+
+    def tearDown(self):
+        c_bindings.free_physics2d(self.physics)
+
+    def test_path_geometry(self):
+        contents = self.physics.contents
+        self.assertEqual([contents.path_lengths[i] for i in range(3)], [0, 10, 40])
+        self.assertEqual(contents.path_length, 40)
+        self.assertEqual(contents.segment_length, 20)
+        self.assertEqual((contents.path_directions[1].x, contents.path_directions[1].y), (0, 1))
+
+    def test_constant_belt_speed_across_segments(self):
+        c_bindings.spawn_material(self.physics, Vec2(0, 0), "Cot")
+        for _ in range(3):
+            c_bindings.vectorized_move_materials(self.physics, 0.25)
+        arrays = c_bindings.get_material_arrays(self.physics)
+        self.assertEqual((arrays["position_x"][0], arrays["position_y"][0]), (10, 5))
+        self.assertEqual(arrays["path_index"].tolist(), [1])
+        self.assertEqual(arrays["area"].tolist(), [7])
+        for _ in range(5):
+            c_bindings.vectorized_move_materials(self.physics, 0.25)
+        self.assertEqual(self.physics.contents.completed_count, 1)
+
+    def test_segment_stations_length_checked(self):
+        with self.assertRaises(ValueError):
+            c_bindings.set_segment_stations(self.physics, [1])
+
+    def test_conveyor_paths_need_two_points(self):
+        for paths in ([], [Vec2(0, 0)]):
+            with self.assertRaisesRegex(ValueError, "at least 2 points"):
+                c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.25, paths)
+
+
+class TestBatchSpawn(unittest.TestCase):
+    def setUp(self):
+        self.physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.01, [Vec2(5, 5), Vec2(65, 40)])
+
+    def tearDown(self):
+        c_bindings.free_physics2d(self.physics)
+
+    def test_spawn_materials_batch(self):
+        positions = np.array([[1, 1], [2, 2], [3, 3]], dtype=np.float32)
+        type_codes = np.array([1, 2, 3], dtype=np.int32)
+        self.assertEqual(c_bindings.spawn_materials_batch(self.physics, positions, type_codes), 3)
+        arrays = c_bindings.get_material_arrays(self.physics)
+        self.assertEqual(arrays["position_x"].tolist(), [1, 2, 3])
+        self.assertEqual(arrays["type"].tolist(), [1, 2, 3])
+
+    def test_spawn_materials_batch_accepts_lists(self):
+        c_bindings.spawn_material(self.physics, Vec2(0, 0), "Cot")
+        c_bindings.spawn_materials_batch(self.physics, [(4, 5)], [c_bindings.MATERIAL_TYPES["Fin"]])
+        self.assertEqual(c_bindings.get_material_arrays(self.physics)["type"].tolist(), [1, 3])
+
+    def test_spawn_materials_batch_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            c_bindings.spawn_materials_batch(self.physics, [(1, 1), (2, 2)], [1])
+
+
+class TestSpatialGrid(unittest.TestCase):
+    def setUp(self):
+        self.physics = c_bindings.create_physics2d(80, 60, 2, 5, 1, 0.5, [Vec2(0, 0), Vec2(79, 0)])
+        # Includes positions off the grid, which share the edge cells
+        self.positions = np.random.default_rng(7).uniform(-3, 83, (1500, 2)).astype(np.float32)
+        c_bindings.spawn_materials_batch(self.physics, self.positions, np.ones(len(self.positions)))
+        distances = np.linalg.norm(self.positions[:, None] - self.positions[None], axis=2)
+        np.fill_diagonal(distances, np.inf)
+        self.distances = distances
+
+    def tearDown(self):
+        c_bindings.free_physics2d(self.physics)
+
+    def test_query_radius_matches_brute_force(self):
+        points = np.array([[0, 0], [40, 30], [79.5, 59.5], [-2, 10]], dtype=np.float32)
+        offsets, indices = c_bindings.query_radius(self.physics, points, 6.0)
+        self.assertEqual(len(offsets), len(points) + 1)
+        for q, point in enumerate(points):
+            expected = np.nonzero(np.linalg.norm(self.positions - point, axis=1) <= 6.0)[0]
+            self.assertEqual(sorted(indices[offsets[q]:offsets[q + 1]].tolist()), expected.tolist())
+
+    def test_nearest_neighbors(self):
+        neighbors, distances = c_bindings.nearest_neighbors(self.physics, 3.0)
+        closest = self.distances.min(axis=1)
+        np.testing.assert_array_equal(neighbors < 0, closest > 3.0)
+        found = neighbors >= 0
+        np.testing.assert_allclose(distances[found], closest[found], rtol=1e-5)
+
+    def test_count_neighbors_defaults_to_distance_threshold(self):
+        counts = c_bindings.count_neighbors(self.physics)
+        np.testing.assert_array_equal(counts, (self.distances <= 2).sum(axis=1))
+
+    def test_grid_follows_materials(self):
+        c_bindings.spawn_materials_batch(self.physics, [(40.5, 30.5)], [1])
+        offsets, indices = c_bindings.query_radius(self.physics, [(40.5, 30.5)], 0.01)
+        self.assertIn(len(self.positions), indices.tolist())
+
+    def test_unbounded_radius(self):
+        # Radii past the int range cover the whole grid instead of collapsing to one cell
+        for radius in (3e9, float('inf')):
+            offsets, indices = c_bindings.query_radius(self.physics, [(0, 0)], radius)
+            self.assertEqual(sorted(indices.tolist()), list(range(len(self.positions))))
+            np.testing.assert_array_equal(c_bindings.count_neighbors(self.physics, radius), len(self.positions) - 1)
+        neighbors, distances = c_bindings.nearest_neighbors(self.physics, float('inf'))
+        np.testing.assert_array_equal(neighbors, self.distances.argmin(axis=1))
+
+
+class TestBeltSpacing(unittest.TestCase):
+    def setUp(self):
+        self.physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.05, [Vec2(0, 0), Vec2(40, 0), Vec2(79, 0)], segment_dwell=[0, 200])
+        self.physics.contents.min_spacing = 3.0
+
+    def tearDown(self):
+        c_bindings.free_physics2d(self.physics)
+
+    def test_materials_queue_at_spacing(self):
+        for _ in range(300):
+            if self.physics.contents.tick % 20 == 0:
+                c_bindings.spawn_materials_batch(self.physics, [(0, 0), (0, 0)], [1, 2])
+            c_bindings.vectorized_move_materials(self.physics, 0.05)
+            c_bindings.update(self.physics, 1 / 60.0)
+        progress = np.sort(c_bindings.get_material_arrays(self.physics)["path_progress"])
+        queued = progress[progress > 0]
+        # One material dwells at the station and the rest queue behind it, a belt step apart at most
+        self.assertEqual(queued[-1], 40.0)
+        self.assertGreater(len(queued), 5)
+        advance = 0.05 * self.physics.contents.segment_length
+        self.assertTrue((np.diff(queued) >= 3.0 - advance - 1e-4).all())
+
+    def test_unbounded_spacing_holds_all_but_the_leader(self):
+        self.physics.contents.min_spacing = float('inf')
+        c_bindings.spawn_materials_batch(self.physics, [(0, 0)] * 4, [1, 2, 1, 2])
+        for _ in range(60):
+            c_bindings.vectorized_move_materials(self.physics, 0.05)
+            c_bindings.update(self.physics, 1 / 60.0)
+        progress = c_bindings.get_material_arrays(self.physics)["path_progress"]
+        self.assertEqual(np.count_nonzero(progress), 1)
+
+
+class TestExtensionModule(unittest.TestCase):
+    def setUp(self):
+        paths = [Vec2(0, 0), Vec2(40, 0), Vec2(40, 30)]
+        self.physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.5, paths)
+        self.reference = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.5, paths)
+
+    def tearDown(self):
+        c_bindings.free_physics2d(self.physics)
+        c_bindings.free_physics2d(self.reference)
+
+    def test_fast_paths_match_ctypes(self):
+        lib = c_bindings.physics2d_lib
+        for step in range(200):
+            if step % 10 == 0:
+                c_bindings.spawn_materials_batch(self.physics, [[0, 0]], [1])
+                lib.spawn_material(self.reference, Vec2(0, 0), 1)
+            c_bindings.vectorized_move_materials(self.physics, 1.0)
+            c_bindings.update(self.physics, 1 / 60)
+            lib.vectorized_move_materials(self.reference, 1.0)
+            lib.update(self.reference, 1 / 60)
+        for name, array in c_bindings.get_material_arrays(self.reference).items():
+            np.testing.assert_array_equal(c_bindings.get_material_arrays(self.physics)[name], array, name)
+        self.assertEqual(self.physics.contents.completed_count, self.reference.contents.completed_count)
+
+    def test_accepts_engine_address(self):
+        address = ctypes.cast(self.physics, ctypes.c_void_p).value
+        c_bindings.spawn_material(self.physics, Vec2(3, 4), "Fab")
+        grid = (ctypes.c_int32 * (80 * 60)).from_address(c_bindings._physics2d.state_array(address))
+        self.assertEqual(grid[3 * 60 + 4], 2)
+
+    def test_rejects_other_objects(self):
+        with self.assertRaises(TypeError):
+            c_bindings._physics2d.update(b"not an engine", 0.1)
+        with self.assertRaises(TypeError):
+            c_bindings._physics2d.update(self.physics)
+
+    def test_rejects_mistyped_buffers(self):
+        with self.assertRaises(TypeError):
+            c_bindings.count_area_materials(self.physics, 3, out=np.zeros(3))
+        with self.assertRaises(TypeError):
+            c_bindings.copy_material_state(self.physics, np.zeros((3, 2)), np.zeros(3, dtype=np.int32))
+        with self.assertRaises(TypeError):
+            c_bindings.copy_material_state(self.physics, np.zeros((3, 2), dtype=np.float32), np.zeros(3, dtype=np.int64))
+        with self.assertRaises(TypeError):
+            c_bindings.copy_material_state(self.physics, np.zeros(6, dtype=np.float32), np.zeros(3, dtype=np.int32))
+        with self.assertRaises(TypeError):
+            c_bindings._physics2d.spawn_batch(self.physics, np.zeros((2, 2)), np.zeros(2, dtype=np.int32))
+        self.assertEqual(self.physics.contents.materials.count, 0)
+
+    def test_run_steps_rejects_step_counts_beyond_int(self):
+        with self.assertRaises(OverflowError):
+            c_bindings.run_steps(self.physics, c_bindings.StepState(), 2 ** 32 + 1)
+        self.assertEqual(self.physics.contents.tick, 0)
+
+    def test_rejects_null_engine(self):
+        with self.assertRaises(ValueError):
+            c_bindings._physics2d.update(0, 0.1)
+        with self.assertRaises(ValueError):
+            c_bindings._physics2d.update(ctypes.POINTER(c_bindings.Physics2D)(), 0.1)
+
+
+class TestParallelStep(unittest.TestCase):
+    # Enough materials to cross the engine's parallel threshold
+    COUNT = 40000
+
+    def run_engine(self, threads, min_spacing):
+        paths = [Vec2(0, 0), Vec2(70, 0), Vec2(70, 50), Vec2(5, 55)]
+        physics = c_bindings.create_physics2d(80, 60, 7, 5, 1, 0.5, paths, [0, 1, 2], [0, 3, 0])
+        physics.contents.threads = threads
+        physics.contents.min_spacing = min_spacing
+        try:
+            for step in range(40):
+                # Staggered waves, so some finish while others are mid-path
+                c_bindings.spawn_materials_batch(physics, np.zeros((self.COUNT // 40, 2)), np.full(self.COUNT // 40, 1 + step % 2))
+                c_bindings.vectorized_move_materials(physics, 0.1)
+                c_bindings.update(physics, 1 / 60)
+            arrays = {name: array.copy() for name, array in c_bindings.get_material_arrays(physics).items()}
+            return arrays, physics.contents.completed_count, physics.contents.completed_ticks
+        finally:
+            c_bindings.free_physics2d(physics)
+
+    def test_results_do_not_depend_on_thread_count(self):
+        for min_spacing in (0.0, 0.5):
+            arrays, completed_count, completed_ticks = self.run_engine(1, min_spacing)
+            self.assertGreater(completed_count, 0)
+            self.assertGreater(len(arrays["type"]), 0)
+            for threads in (0, 3):
+                other, other_count, other_ticks = self.run_engine(threads, min_spacing)
+                self.assertEqual((other_count, other_ticks), (completed_count, completed_ticks))
+                for name, array in arrays.items():
+                    np.testing.assert_array_equal(other[name], array, name)
+
+
+if __name__ == "__main__":
+    unittest.main()
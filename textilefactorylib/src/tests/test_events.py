@@ -0,0 +1,151 @@
+import copy
+import unittest
+from textilefactorylib.src.events import EventSimulation, RingBuffer
+from textilefactorylib.src.main import FactorySimulation, check_tick_params, segment_dwell
+from textilefactorylib.src.params import load_params
+
+KPI_KEYS = ("ticks", "spawned_count", "object_count", "completed_count", "throughput_per_hour", "average_wip", "average_cycle_time")
+
+
+# (capacity, buffer_size) per station for the capacity tests
+STATION_LIMITS = {
+    "Cutting Area": (4, 12),
+    "Sewing Area": (2, 8),
+    "Stuffing Area": (10, 20),
+    "Finishing Area": (12, 20),
+    "Quality Control": (8, 16),
+    "Packaging Area": (9, 16),
+    "Shipping Area": (6, 12),
+}
+
+
+def limited(params):
+    params = copy.deepcopy(params)
+    for name, (capacity, buffer_size) in STATION_LIMITS.items():
+        params['equipment_details'][name].update({"capacity": capacity, "buffer_size": buffer_size})
+    return params
+
+
+def unlimited(params):
+    params = copy.deepcopy(params)
+    for details in params['equipment_details'].values():
+        details.pop('capacity', None)
+        details.pop('buffer_size', None)
+    return params
+
+
+class TestEventSimulation(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+
+    def assertSameResults(self, params, sim_seconds):
+        ticked = FactorySimulation(params).run_headless(sim_seconds)
+        evented = EventSimulation(params).run_headless(sim_seconds)
+        for key in KPI_KEYS:
+            self.assertEqual(ticked[key], evented[key], key)
+
+    def test_matches_tick_engine(self):
+        self.assertSameResults(self.params, 120)
+
+    def test_matches_tick_engine_across_rates(self):
+        for item_rate, steps_per_second in ((0.7, 0.013), (3.3, 0.05)):
+            params = copy.deepcopy(self.params)
+            params['item_rate'] = item_rate
+            params['steps_per_second'] = steps_per_second
+            self.assertSameResults(params, 90)
+
+    def test_matches_tick_engine_with_spacing(self):
+        # Belt spacing is modelled by the tick engine only, so the event engine
+        # refuses it rather than returning different KPIs; disabled, both agree
+        params = copy.deepcopy(self.params)
+        params['min_spacing'] = 3.0
+        FactorySimulation(params).run_headless(10)
+        with self.assertRaisesRegex(ValueError, "tick engine"):
+            EventSimulation(params)
+        params['min_spacing'] = 0.0
+        self.assertSameResults(params, 120)
+
+    def test_rejects_short_conveyor_paths(self):
+        for paths in ([], [[5, 5]]):
+            params = copy.deepcopy(self.params)
+            params['conveyor_paths'] = paths
+            for engine in (FactorySimulation, EventSimulation):
+                with self.assertRaisesRegex(ValueError, "at least 2 points"):
+                    engine(params)
+
+    def test_processing_delays_completion(self):
+        # Stations with equipment hold each material for 10 / speed seconds
+        self.assertEqual(segment_dwell(self.params, 1 / 60.0).tolist(), [0, 120, 60, 300, 400, 200, 240, 150, 0])
+        results = EventSimulation(self.params).run_headless(30)
+        self.assertEqual(results["completed_count"], 0)
+
+    def test_run_in_parts(self):
+        whole = EventSimulation(self.params).run_headless(120)
+        simulation = EventSimulation(self.params)
+        simulation.run_headless(45)
+        parts = simulation.run_headless(75)
+        for key in KPI_KEYS:
+            self.assertEqual(whole[key], parts[key], key)
+
+    def test_station_arrivals(self):
+        simulation = EventSimulation(self.params)
+        simulation.run_headless(120)
+        # Every completed material went through every processing station
+        self.assertTrue((simulation.station_arrivals[1:8] >= simulation.completed_count).all())
+        self.assertEqual(simulation.station_arrivals[0], 0)
+
+
+class TestStationCapacity(unittest.TestCase):
+    def setUp(self):
+        self.params = limited(load_params('params.json'))
+
+    def test_queues_stay_within_buffers(self):
+        simulation = EventSimulation(self.params)
+        results = simulation.run_headless(600)
+        for station in results["stations"][1:]:
+            self.assertLessEqual(station["max_queue"], station["buffer_size"])
+            self.assertLessEqual(station["utilization"], 1.0)
+            self.assertGreater(station["processed"], 0)
+        self.assertEqual(results["spawned_count"], results["object_count"] + results["completed_count"])
+
+    def test_blocking_propagates_upstream(self):
+        self.params['equipment_details']['Finishing Area'].update({"capacity": 1, "buffer_size": 1})
+        simulation = EventSimulation(self.params)
+        stations = {station["name"]: station for station in simulation.run_headless(300)["stations"]}
+        # Finishing takes 400 ticks per material on one server, so everything before it backs up
+        self.assertGreater(stations["Finishing Area"]["utilization"], 0.9)
+        for name in ("Entrance", "Cutting Area", "Sewing Area", "Stuffing Area"):
+            self.assertGreater(stations[name]["blocked_seconds"], 0, name)
+        # and everything after it starves
+        self.assertEqual(stations["Quality Control"]["blocked_seconds"], 0)
+        self.assertGreater(stations["Quality Control"]["starved_seconds"], 290)
+
+    def test_capacity_limits_throughput(self):
+        limited = EventSimulation(self.params).run_headless(600)
+        free = EventSimulation(unlimited(self.params)).run_headless(600)
+        self.assertLess(limited["completed_count"], free["completed_count"])
+
+    def test_tick_engine_rejects_capacity(self):
+        # The tick engine has unlimited stations, so it refuses params it would not honour
+        with self.assertRaisesRegex(ValueError, "event engine"):
+            FactorySimulation(self.params)
+        check_tick_params(unlimited(self.params))
+
+    def test_ring_buffer(self):
+        buffer = RingBuffer(3)
+        for value in (1, 2, 3):
+            buffer.push(value)
+        with self.assertRaises(OverflowError):
+            buffer.push(4)
+        self.assertEqual(buffer.pop(), 1)
+        buffer.push(4)
+        self.assertEqual([buffer.pop() for _ in range(3)], [2, 3, 4])
+
+        growing = RingBuffer()
+        for value in range(40):
+            growing.push(value)
+        self.assertEqual([growing.pop() for _ in range(40)], list(range(40)))
+
+
+if __name__ == "__main__":
+    unittest.main()
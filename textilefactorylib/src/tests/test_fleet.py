@@ -0,0 +1,48 @@
+import copy
+import unittest
+from textilefactorylib.src.fleet import FactoryFleet
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+
+
+class TestFactoryFleet(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+        self.layouts = []
+        for item_rate in (0.5, 1, 2):
+            params = copy.deepcopy(self.params)
+            params['item_rate'] = item_rate
+            self.layouts.append(params)
+
+    def test_lines_match_standalone_runs(self):
+        with FactoryFleet(self.layouts, names=["slow", "normal", "fast"], workers=3) as fleet:
+            results = fleet.run_headless(120)
+        self.assertEqual([line["name"] for line in results["lines"]], ["slow", "normal", "fast"])
+        for params, line in zip(self.layouts, results["lines"]):
+            expected = FactorySimulation(params).run_headless(120)
+            for key in ("ticks", "spawned_count", "object_count", "completed_count", "average_wip"):
+                self.assertEqual(line[key], expected[key], key)
+
+    def test_plant_aggregates_lines(self):
+        with FactoryFleet(self.layouts) as fleet:
+            results = fleet.run_headless(120)
+        plant = results["plant"]
+        self.assertEqual(plant["lines"], 3)
+        self.assertEqual(plant["completed_count"], sum(line["completed_count"] for line in results["lines"]))
+        self.assertAlmostEqual(plant["average_wip"], sum(line["average_wip"] for line in results["lines"]))
+        self.assertAlmostEqual(plant["average_cycle_time"], plant["average_wip"] / (plant["throughput_per_hour"] / 3600))
+
+    def test_lines_own_their_engines(self):
+        with FactoryFleet(self.layouts[:2]) as fleet:
+            fleet.lines[0].spawn_enabled = False
+            fleet.advance(600)
+            self.assertEqual(fleet.lines[0].spawned_count, 0)
+            self.assertGreater(fleet.lines[1].spawned_count, 0)
+
+    def test_names_checked(self):
+        with self.assertRaises(ValueError):
+            FactoryFleet(self.layouts, names=["one"])
+
+
+if __name__ == "__main__":
+    unittest.main()
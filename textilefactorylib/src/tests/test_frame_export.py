@@ -0,0 +1,51 @@
+import os
+import shlex
+import sys
+import tempfile
+import unittest
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+from textilefactorylib.src.render import FrameExporter, OffscreenRenderer, import_pygame, render_run
+
+
+class TestFrameExport(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+        self.simulation = FactorySimulation(self.params)
+        self.renderer = OffscreenRenderer(self.params, scale=4)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_png_sequence(self):
+        exporter = FrameExporter(self.renderer.size, directory=self.directory.name, workers=2)
+        results = render_run(self.simulation, 60, self.renderer, exporter, stride=600)
+        # The first frame, then one every 10 simulated seconds
+        self.assertEqual(results["frames"], 7)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), [f"frame_{index:06d}.png" for index in range(7)])
+        image = import_pygame().image.load(os.path.join(self.directory.name, "frame_000006.png"))
+        self.assertEqual(image.get_size(), self.renderer.size)
+        # Rendering does not change the run
+        self.assertEqual(results["completed_count"], FactorySimulation(self.params).run_headless(60)["completed_count"])
+
+    def test_encoder_pipe(self):
+        output = os.path.join(self.directory.name, "bytes")
+        sink = "import sys; open(sys.argv[1], 'w').write(sys.argv[2] + ' ' + str(len(sys.stdin.buffer.read())))"
+        encoder = f"{shlex.quote(sys.executable)} -c {shlex.quote(sink)} {shlex.quote(output)} {{width}}x{{height}}"
+        exporter = FrameExporter(self.renderer.size, encoder=encoder)
+        results = render_run(self.simulation, 10, self.renderer, exporter, stride=60)
+        width, height = self.renderer.size
+        with open(output) as file:
+            self.assertEqual(file.read(), f"{width}x{height} {results['frames'] * width * height * 3}")
+
+    def test_encoder_failure(self):
+        exporter = FrameExporter(self.renderer.size, encoder=f"{shlex.quote(sys.executable)} -c 'raise SystemExit(3)'")
+        with self.assertRaisesRegex(RuntimeError, "exited with code") as caught:
+            render_run(self.simulation, 60, self.renderer, exporter, stride=1)
+        # Reported once, by the write that found the encoder gone, not again on close
+        self.assertIsNone(caught.exception.__context__)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from textilefactorylib.src.main import FactorySimulation, segment_stations
+from textilefactorylib.src.params import load_params
+
+
+class TestHeadless(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+
+    def test_run_headless_uses_simulated_clock(self):
+        simulation = FactorySimulation(self.params)
+        results = simulation.run_headless(60)
+
+        self.assertEqual(results["ticks"], 3600)
+        self.assertAlmostEqual(results["sim_seconds"], 60)
+        # One Cot/Fab pair per simulated second, starting at t = 1 s
+        self.assertEqual(results["spawned_count"], 118)
+        self.assertGreater(results["completed_count"], 0)
+        self.assertEqual(results["spawned_count"], results["object_count"] + results["completed_count"])
+        self.assertEqual(simulation.physics.contents.materials.count, results["object_count"])
+
+    def test_run_headless_is_deterministic(self):
+        first = FactorySimulation(self.params).run_headless(30)
+        second = FactorySimulation(self.params).run_headless(30)
+        for key in ("ticks", "spawned_count", "object_count", "completed_count"):
+            self.assertEqual(first[key], second[key])
+
+    def test_segment_stations_follow_factory_layout(self):
+        # Every conveyor point in params.json sits on a station, in layout order
+        self.assertEqual(segment_stations(self.params).tolist(), list(range(9)))
+
+    def test_spawn_disabled(self):
+        simulation = FactorySimulation(self.params)
+        simulation.spawn_enabled = False
+        results = simulation.run_headless(10)
+        self.assertEqual(results["spawned_count"], 0)
+        self.assertEqual(results["throughput_per_hour"], 0.0)
+
+    def test_advance_matches_step(self):
+        stepped = FactorySimulation(self.params)
+        for _ in range(4000):
+            stepped.step()
+        advanced = FactorySimulation(self.params)
+        advanced.advance(1500)
+        advanced.advance(2500)
+        for key in ("ticks", "sim_seconds", "spawned_count", "object_count", "completed_count", "average_wip"):
+            self.assertEqual(advanced.results()[key], stepped.results()[key], key)
+        self.assertEqual(advanced.last_spawn_time, stepped.last_spawn_time)
+        self.assertEqual(advanced.physics.contents.tick, stepped.physics.contents.tick)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+from textilefactorylib.src.profiler import StageProfiler
+
+
+class TestStageProfiler(unittest.TestCase):
+    def test_rolling_percentiles(self):
+        profiler = StageProfiler(window=100)
+        for i in range(250):
+            profiler.record("stage", i / 1000)
+        stats = profiler.summary()["stage"]
+        self.assertEqual(stats["count"], 250)
+        # Only the last 100 samples, 150..249 ms, are kept
+        self.assertAlmostEqual(stats["p50_ms"], 199.5)
+        self.assertAlmostEqual(stats["p99_ms"], 248.01)
+
+    def test_laps(self):
+        profiler = StageProfiler()
+        for _ in range(3):
+            profiler.begin()
+            profiler.lap("a")
+            profiler.lap("b")
+            profiler.end()
+        summary = profiler.summary()
+        self.assertEqual(list(summary), ["a", "b", "frame"])
+        self.assertEqual(summary["frame"]["count"], 3)
+        self.assertIn("frame", profiler.format())
+
+    def test_export(self):
+        profiler = StageProfiler()
+        profiler.record("stage", 0.002)
+        with tempfile.TemporaryDirectory() as directory:
+            profiler.export(os.path.join(directory, "profile.json"))
+            with open(os.path.join(directory, "profile.json")) as file:
+                self.assertAlmostEqual(json.load(file)["stage"]["p95_ms"], 2.0)
+            profiler.export(os.path.join(directory, "profile.csv"))
+            with open(os.path.join(directory, "profile.csv"), newline='') as file:
+                self.assertEqual(next(csv.DictReader(file))["stage"], "stage")
+            with self.assertRaises(ValueError):
+                profiler.export(os.path.join(directory, "profile.txt"))
+
+    def test_factory_simulation(self):
+        params = load_params('params.json')
+        expected = FactorySimulation(params).run_headless(60)
+        simulation = FactorySimulation(params)
+        simulation.profiler = StageProfiler()
+        results = simulation.run_headless(60)
+        self.assertEqual(results["completed_count"], expected["completed_count"])
+        summary = simulation.profiler.summary()
+        self.assertEqual(summary["frame"]["count"], results["ticks"])
+        self.assertEqual(set(summary), {"move", "spawn", "update", "frame"})
+
+
+if __name__ == "__main__":
+    unittest.main()
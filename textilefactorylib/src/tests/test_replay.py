@@ -0,0 +1,135 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import numpy as np
+from textilefactorylib.src.benchmark import V1_SCRIPT
+from textilefactorylib.src.replay import HEADER, RunLog, RunRecorder, encode_varint, read_varint
+
+# Runs v1 in its window on the dummy video driver, feeding it scripted input
+# events by frame: the K key, then Auto, Stop Spawn and Restart clicks
+WINDOWED_RUN = """
+import runpy, sys, pygame
+script = {5: [(pygame.KEYDOWN, {"key": pygame.K_k})], 20: [(pygame.MOUSEBUTTONDOWN, {"pos": (460, 515), "button": 1})],
+          35: [(pygame.MOUSEBUTTONDOWN, {"pos": (710, 515), "button": 1}), (pygame.KEYDOWN, {"key": pygame.K_k})],
+          50: [(pygame.MOUSEBUTTONDOWN, {"pos": (460, 515), "button": 1})], 65: [(pygame.MOUSEBUTTONDOWN, {"pos": (310, 515), "button": 1})],
+          80: [(pygame.QUIT, {})]}
+frames = [0]
+def get():
+    frames[0] += 1
+    return [pygame.event.Event(kind, attrs) for kind, attrs in script.get(frames[0], [])]
+pygame.event.get = get
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def run_v1(*options, windowed=False):
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    command = [sys.executable, V1_SCRIPT, *options]
+    if windowed:
+        command = [sys.executable, "-c", WINDOWED_RUN, *command[1:]]
+    return subprocess.run(command, capture_output=True, text=True, env=environment, timeout=120)
+
+
+class TestRunLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.log")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_varint(self):
+        for value in (0, 1, 127, 128, 300, 2 ** 40):
+            encoded = encode_varint(value)
+            self.assertEqual(read_varint(encoded, 0), (value, len(encoded)))
+
+    def test_round_trip(self):
+        with RunRecorder(self.path, seed=7, dt=1 / 60) as recorder:
+            recorder.input(0, 1)
+            recorder.input(0, 3)
+            recorder.checkpoint(3600, {"ticks": 3600, "positions": np.arange(4.0)})
+            recorder.input(5000, 2)
+            recorder.checkpoint(7200, {"ticks": 7200})
+            recorder.end(9000, b"d" * 16)
+            with self.assertRaises(ValueError):
+                recorder.input(100, 1)
+        log = RunLog(self.path)
+        self.assertEqual((log.seed, log.dt), (7, 1 / 60))
+        self.assertEqual(log.inputs, [(0, 1), (0, 3), (5000, 2)])
+        self.assertEqual(log.inputs_by_tick(1), {5000: [2]})
+        self.assertTrue(log.complete)
+        self.assertEqual((log.end_tick, log.digest), (9000, b"d" * 16))
+        self.assertIsNone(log.checkpoint_before(3599))
+        tick, state = log.checkpoint_before(7199)
+        self.assertEqual(tick, 3600)
+        np.testing.assert_array_equal(state["positions"], np.arange(4.0))
+        self.assertEqual(log.checkpoint_before(10 ** 6)[1], {"ticks": 7200})
+
+    def test_truncated_log(self):
+        with RunRecorder(self.path, seed=0, dt=1 / 60) as recorder:
+            recorder.input(10, 1)
+            recorder.checkpoint(3600, {"ticks": 3600})
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        with open(self.path, 'wb') as file:
+            file.write(data[:-3])
+        log = RunLog(self.path)
+        self.assertFalse(log.complete)
+        self.assertEqual(log.inputs, [(10, 1)])
+        self.assertEqual(log.checkpoints, [])
+
+    def test_not_a_run_log(self):
+        with open(self.path, 'wb') as file:
+            file.write(b"\0" * HEADER.size)
+        with self.assertRaises(ValueError):
+            RunLog(self.path)
+
+
+class TestV1Replay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.log")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_headless_record_and_seek(self):
+        recorded = run_v1('--headless', '--sim-seconds', '120', '--record', self.path, '--checkpoint-every', '30')
+        self.assertEqual(recorded.returncode, 0, recorded.stderr)
+        self.assertEqual(len(RunLog(self.path).checkpoints), 4)
+        replayed = run_v1('--replay', self.path)
+        self.assertIn("Replay matches the recording", replayed.stdout)
+        # The same counts as the recording
+        self.assertEqual(recorded.stdout.splitlines()[1:], replayed.stdout.splitlines()[1:-1])
+        seeked = run_v1('--replay', self.path, '--seek', '75')
+        self.assertIn("Replaying from 60 s", seeked.stdout)
+        self.assertIn("Replay matches the recording", seeked.stdout)
+
+    def test_windowed_inputs_replay_headless(self):
+        recorded = run_v1('--record', self.path, '--checkpoint-every', '0.5', windowed=True)
+        self.assertEqual(recorded.returncode, 0, recorded.stderr)
+        log = RunLog(self.path)
+        self.assertEqual([kind for _, kind in log.inputs], [1, 3, 4, 1, 3, 2])
+        self.assertTrue(log.complete)
+        replayed = run_v1('--replay', self.path)
+        self.assertEqual(replayed.returncode, 0, replayed.stdout)
+        self.assertIn("Replay matches the recording", replayed.stdout)
+        seeked = run_v1('--replay', self.path, '--seek', str(log.checkpoints[0][0] * log.dt))
+        self.assertIn("Replay matches the recording", seeked.stdout)
+
+    def test_mismatch_fails(self):
+        run_v1('--headless', '--sim-seconds', '30', '--record', self.path)
+        log = RunLog(self.path)
+        # The same run with a Stop Spawn click it never had
+        with RunRecorder(self.path, log.seed, log.dt) as recorder:
+            recorder.input(600, 4)
+            recorder.end(log.end_tick, log.digest)
+        replayed = run_v1('--replay', self.path)
+        self.assertEqual(replayed.returncode, 1)
+        self.assertIn("does not match", replayed.stdout)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import base64
+import json
+import os
+import socket
+import struct
+import threading
+import unittest
+import numpy as np
+from textilefactorylib.src.c_bindings import get_material_arrays
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+from textilefactorylib.src.server import KEYFRAME, POSITION_SCALE, StateServer, Subscriber, decode_message
+
+
+def receive_exactly(connection, size):
+    data = b""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def receive_headers(connection):
+    data = b""
+    while not data.endswith(b"\r\n\r\n"):
+        data += receive_exactly(connection, 1)
+    return data.decode()
+
+
+def websocket_messages(port, messages):
+    # Collect (opcode, payload) of every server frame until the server closes
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as connection:
+        key = base64.b64encode(os.urandom(16)).decode()
+        connection.sendall((f"GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        messages.append(receive_headers(connection))
+        try:
+            while True:
+                first, length = receive_exactly(connection, 2)
+                if length == 126:
+                    length, = struct.unpack("!H", receive_exactly(connection, 2))
+                elif length == 127:
+                    length, = struct.unpack("!Q", receive_exactly(connection, 8))
+                messages.append((first & 0x0F, receive_exactly(connection, length)))
+                if first & 0x0F == 0x8:
+                    return
+        except ConnectionError:
+            pass
+
+
+def event_stream(port, messages):
+    # Collect (event, data) of every server-sent event until the server closes
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as connection:
+        connection.sendall(b"GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        messages.append(receive_headers(connection))
+        stream = connection.makefile("rb")
+        for block in stream.read().split(b"\n\n"):
+            if block:
+                event, data = block.split(b"\n")
+                messages.append((event[len(b"event: "):].decode(), data[len(b"data: "):]))
+
+
+class Floor:
+    # What a client rebuilds from the stream
+    def __init__(self):
+        self.frame = 0
+        self.positions = np.zeros((0, 2), dtype=np.uint16)
+        self.types = np.zeros(0, dtype=np.uint8)
+
+    def apply(self, message):
+        header, wip, records = decode_message(message)
+        if header["base"] == 0:
+            self.positions = self.positions[:0]
+            self.types = self.types[:0]
+        else:
+            assert header["base"] == self.frame
+        count = header["count"]
+        self.positions = np.resize(self.positions, (count, 2))
+        self.types = np.resize(self.types, count)
+        self.positions[records["index"], 0] = records["x"]
+        self.positions[records["index"], 1] = records["y"]
+        self.types[records["index"]] = records["type"]
+        self.frame = header["frame"]
+        self.header = header
+        self.wip = wip
+
+
+class TestStateServer(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+        self.simulation = FactorySimulation(self.params)
+        self.server = self.simulation.publisher = StateServer(self.params, port=0, max_fps=0).start()
+
+    def connect(self, client):
+        messages = []
+        thread = threading.Thread(target=client, args=(self.server.port, messages))
+        thread.start()
+        # Wait for the server to take the client on before the run starts
+        while len(self.server.subscribers) < 1:
+            threading.Event().wait(0.01)
+        return thread, messages
+
+    def assert_final_floor(self, floor):
+        arrays = get_material_arrays(self.simulation.physics)
+        width, height = self.params['global_resolution']
+        self.assertEqual(floor.header["completed_count"], self.simulation.completed_count)
+        self.assertEqual(floor.header["tick"], self.simulation.ticks)
+        np.testing.assert_array_equal(floor.types, arrays["type"])
+        np.testing.assert_array_equal(floor.positions[:, 0], np.rint(arrays["position_x"] * np.float32(POSITION_SCALE / width)))
+        np.testing.assert_array_equal(floor.positions[:, 1], np.rint(arrays["position_y"] * np.float32(POSITION_SCALE / height)))
+        self.assertEqual(len(floor.wip), len(self.params['factory_layout']))
+        self.assertEqual(int(floor.wip.sum()), len(floor.types))
+
+    def test_websocket_client_rebuilds_the_floor(self):
+        thread, messages = self.connect(websocket_messages)
+        self.simulation.run_headless(60)
+        self.server.close()
+        thread.join()
+        self.assertIn("101 Switching Protocols", messages[0])
+        opcode, hello = messages[1]
+        self.assertEqual(opcode, 0x1)
+        self.assertEqual(json.loads(hello)["stations"], list(self.params['factory_layout']))
+        floor = Floor()
+        for opcode, payload in messages[2:]:
+            if opcode == 0x2:
+                floor.apply(payload)
+        self.assertEqual(messages[-1][0], 0x8)
+        self.assert_final_floor(floor)
+
+    def test_event_stream_client_rebuilds_the_floor(self):
+        thread, messages = self.connect(event_stream)
+        self.simulation.run_headless(60)
+        self.server.close()
+        thread.join()
+        self.assertIn("text/event-stream", messages[0])
+        self.assertEqual(messages[1][0], "hello")
+        floor = Floor()
+        for event, data in messages[2:]:
+            floor.apply(base64.b64decode(data))
+        self.assert_final_floor(floor)
+
+    def test_unknown_path(self):
+        with socket.create_connection(("127.0.0.1", self.server.port), timeout=10) as connection:
+            connection.sendall(b"GET /missing HTTP/1.1\r\n\r\n")
+            self.assertIn("404", receive_headers(connection))
+        self.server.close()
+
+
+class TestSubscriber(unittest.TestCase):
+    def test_slow_client_skips_to_a_keyframe(self):
+        class Writer:
+            transport = type("Transport", (), {"set_write_buffer_limits": lambda self, high: None})()
+        subscriber = Subscriber(Writer(), None)
+        subscriber.offer(1, 0, b"delta 1")
+        self.assertEqual(subscriber.pending, b"delta 1")
+        # Frame 2 arrives before frame 1 was sent: both give way to one keyframe
+        subscriber.offer(2, 1, b"delta 2")
+        self.assertIs(subscriber.pending, KEYFRAME)
+        self.assertEqual(subscriber.dropped, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import unittest
+import numpy as np
+from textilefactorylib.src.c_bindings import get_material_arrays
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+from textilefactorylib.src.shared_state import SharedStateReader, SharedStateWriter
+
+
+def follow(name, frames, results):
+    # Read frames in another process until the writer closes the block
+    with SharedStateReader(name) as reader:
+        seen = []
+        while not reader.closed and len(seen) < frames:
+            frame = reader.read()
+            if frame is not None:
+                seen.append((frame.number, frame.counters["tick"], frame.counters["count"], len(frame.types)))
+        results.put(seen)
+
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+        self.simulation = FactorySimulation(self.params)
+        self.writer = self.simulation.publisher = SharedStateWriter(capacity=4096, width=80, height=60)
+        self.reader = SharedStateReader(self.writer.name)
+
+    def tearDown(self):
+        self.reader.close()
+        if self.writer.shm.buf is not None:
+            self.writer.close()
+
+    def test_frames_follow_the_simulation(self):
+        self.assertIsNone(self.reader.read())
+        self.assertEqual((self.reader.width, self.reader.height), (80, 60))
+        self.simulation.run_headless(60)
+        frame = self.reader.read()
+        self.assertEqual(frame.number, self.simulation.ticks - 1)
+        self.assertEqual(frame.counters["tick"], self.simulation.ticks)
+        self.assertEqual(frame.counters["completed_count"], self.simulation.completed_count)
+        arrays = get_material_arrays(self.simulation.physics)
+        np.testing.assert_array_equal(frame.positions[:, 0], arrays["position_x"])
+        np.testing.assert_array_equal(frame.positions[:, 1], arrays["position_y"])
+        np.testing.assert_array_equal(frame.types, arrays["type"])
+        self.writer.close()
+        self.assertTrue(self.reader.closed)
+
+    def test_frames_are_truncated_to_capacity(self):
+        small = SharedStateWriter(capacity=8, width=80, height=60)
+        self.simulation.publisher = small
+        self.simulation.run_headless(60)
+        with SharedStateReader(small.name) as reader:
+            frame = reader.read()
+            self.assertEqual(len(frame.types), 8)
+            self.assertGreater(frame.counters["object_count"], 8)
+        small.close()
+
+    def test_reader_retries_a_slot_being_written(self):
+        self.writer.publish(self.simulation)
+        self.writer.fields["sequence"][0] += 1
+        with self.assertRaises(TimeoutError):
+            self.reader.read(retries=3)
+
+    def test_reader_in_another_process(self):
+        results = multiprocessing.Queue()
+        follower = multiprocessing.Process(target=follow, args=(self.writer.name, 50, results))
+        follower.start()
+        while follower.is_alive() and results.empty():
+            self.simulation.step()
+        seen = results.get(timeout=10)
+        follower.join()
+        self.assertEqual(len(seen), 50)
+        for number, tick, count, materials in seen:
+            self.assertEqual(tick, number + 1)
+            self.assertEqual(count, materials)
+        self.assertEqual([number for number, *_ in seen], sorted(number for number, *_ in seen))
+
+    def test_viewer_draws_frames(self):
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        from textilefactorylib.src.viewer import run_viewer
+        self.simulation.run_headless(10)
+        self.assertEqual(run_viewer(self.writer.name, self.params, scale=4, max_frames=1), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
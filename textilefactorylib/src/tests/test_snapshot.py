@@ -0,0 +1,113 @@
+import copy
+import mmap
+import os
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from textilefactorylib.src.c_bindings import get_material_arrays
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+from textilefactorylib.src.snapshot import MAGIC, PREFIX, Snapshot, write_snapshot
+
+KPI_KEYS = ("ticks", "spawned_count", "object_count", "completed_count", "average_wip", "average_cycle_time")
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "state.snap")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_matches_uninterrupted_run(self):
+        uninterrupted = FactorySimulation(self.params)
+        uninterrupted.run_headless(60)
+        uninterrupted.save_snapshot(self.path)
+        expected = uninterrupted.run_headless(60)
+
+        resumed = FactorySimulation(self.params)
+        resumed.load_snapshot(self.path)
+        results = resumed.run_headless(60)
+        for key in KPI_KEYS:
+            self.assertEqual(results[key], expected[key], key)
+        for name, array in get_material_arrays(uninterrupted.physics).items():
+            np.testing.assert_array_equal(get_material_arrays(resumed.physics)[name], array, name)
+
+    def test_fork_with_different_params(self):
+        warm = FactorySimulation(self.params)
+        warm.run_headless(60)
+        warm.save_snapshot(self.path)
+
+        params = copy.deepcopy(self.params)
+        params['item_rate'] = 2
+        fork = FactorySimulation(params)
+        fork.load_snapshot(self.path)
+        self.assertEqual(fork.ticks, 3600)
+        self.assertEqual(fork.physics.contents.materials.count, warm.object_count)
+        self.assertGreater(fork.run_headless(60)["spawned_count"], warm.run_headless(60)["spawned_count"])
+
+    def test_empty_state(self):
+        FactorySimulation(self.params).save_snapshot(self.path)
+        simulation = FactorySimulation(self.params)
+        simulation.run_headless(30)
+        simulation.load_snapshot(self.path)
+        self.assertEqual(simulation.physics.contents.materials.count, 0)
+        self.assertEqual(simulation.ticks, 0)
+
+    def test_rejects_other_conveyors(self):
+        FactorySimulation(self.params).save_snapshot(self.path)
+        params = copy.deepcopy(self.params)
+        params['conveyor_paths'] = params['conveyor_paths'][:-1]
+        with self.assertRaises(ValueError):
+            FactorySimulation(params).load_snapshot(self.path)
+
+    def test_arrays_are_mapped_and_versioned(self):
+        arrays = {"a": np.arange(5, dtype=np.int64), "b": np.linspace(0, 1, 3, dtype=np.float32)}
+        write_snapshot(self.path, arrays, {"note": "x"})
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(snapshot.metadata, {"note": "x"})
+            np.testing.assert_array_equal(snapshot.arrays["a"], arrays["a"])
+            np.testing.assert_array_equal(snapshot.arrays["b"], arrays["b"])
+            self.assertFalse(snapshot.arrays["a"].flags.writeable)
+            self.assertEqual(snapshot.arrays["a"].ctypes.data % 64, snapshot.arrays["b"].ctypes.data % 64)
+
+        # A view kept past close() stays readable instead of failing the close
+        with Snapshot(self.path) as snapshot:
+            kept = snapshot.arrays["a"]
+        np.testing.assert_array_equal(kept, arrays["a"])
+
+        with open(self.path, 'r+b') as file:
+            file.write(struct.pack("<8sI", MAGIC, 99))
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+    def test_close_is_idempotent(self):
+        write_snapshot(self.path, {"a": np.arange(5)}, {})
+        with Snapshot(self.path) as snapshot:
+            snapshot.close()
+        snapshot.close()
+        self.assertEqual(snapshot.arrays, {})
+
+    def test_bad_header_unmaps_the_file(self):
+        write_snapshot(self.path, {"a": np.arange(5)}, {})
+        with open(self.path, 'r+b') as file:
+            file.seek(PREFIX.size)
+            file.write(b"x")
+        mapped = []
+        mmap_type = mmap.mmap
+
+        def track(*args, **kwargs):
+            mapped.append(mmap_type(*args, **kwargs))
+            return mapped[-1]
+        with patch("mmap.mmap", side_effect=track):
+            with self.assertRaises(ValueError):
+                Snapshot(self.path)
+        self.assertTrue(mapped[0].closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
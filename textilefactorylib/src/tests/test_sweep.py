@@ -0,0 +1,40 @@
+import csv
+import os
+import tempfile
+import unittest
+from textilefactorylib.src.params import load_params
+from textilefactorylib.src.sweep import apply_override, expand_grid, run_sweep, write_results
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params('params.json')
+
+    def test_expand_grid(self):
+        points = expand_grid({"item_rate": [1, 2], "steps_per_second": {"start": 0.01, "stop": 0.03, "num": 3}})
+        self.assertEqual(len(points), 6)
+        self.assertEqual(points[0], {"item_rate": 1, "steps_per_second": 0.01})
+        self.assertAlmostEqual(points[-1]["steps_per_second"], 0.03)
+
+    def test_apply_override_wildcard(self):
+        apply_override(self.params, "equipment_details.*.speed", 7)
+        self.assertTrue(all(details["speed"] == 7 for details in self.params["equipment_details"].values()))
+        apply_override(self.params, "equipment_details.Sewing Area.speed", 3)
+        self.assertEqual(self.params["equipment_details"]["Sewing Area"]["speed"], 3)
+
+    def test_run_sweep(self):
+        rows = run_sweep(self.params, {"item_rate": [1, 2]}, 60, workers=2)
+        self.assertEqual([row["item_rate"] for row in rows], [1, 2])
+        self.assertGreater(rows[1]["completed_count"], rows[0]["completed_count"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.csv")
+            write_results(rows, path)
+            with open(path, newline='') as file:
+                written = list(csv.DictReader(file))
+        self.assertEqual(len(written), 2)
+        self.assertIn("throughput_per_hour", written[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
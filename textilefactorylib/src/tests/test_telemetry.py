@@ -0,0 +1,80 @@
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from textilefactorylib.src.main import FactorySimulation
+from textilefactorylib.src.params import load_params
+from textilefactorylib.src.telemetry import TelemetryRecorder
+
+
+class TestTelemetryRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, filename, ticks, **options):
+        path = os.path.join(self.directory.name, filename)
+        with TelemetryRecorder(path, ["A", "B"], **options) as telemetry:
+            for tick in range(1, ticks + 1):
+                cycle_time = 2.5 if tick % 10 == 0 else float('nan')
+                telemetry.record(tick, tick / 60, tick, tick // 10, np.array([tick, 2 * tick]), cycle_time)
+        return path
+
+    def test_csv_wraps_the_ring_buffer(self):
+        # 100 records through a 16 slot buffer, written 4 at a time
+        path = self.record("telemetry.csv", 100, capacity=16, chunk_size=4)
+        with open(path, newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([int(row["tick"]) for row in rows], list(range(1, 101)))
+        self.assertEqual(rows[-1]["wip_B"], "200")
+        self.assertEqual(rows[9]["cycle_time"], "2.5")
+        self.assertEqual(rows[0]["cycle_time"], "")
+
+    def test_ndjson(self):
+        path = self.record("telemetry.ndjson", 50, capacity=8, chunk_size=8)
+        with open(path) as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(len(rows), 50)
+        self.assertIsNone(rows[0]["cycle_time"])
+        self.assertEqual(rows[19]["cycle_time"], 2.5)
+        self.assertAlmostEqual(rows[-1]["throughput_per_hour"], 5 / (50 / 60) * 3600)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow(self):
+        import pyarrow as pa
+        path = self.record("telemetry.arrow", 30, capacity=16, chunk_size=4)
+        with pa.OSFile(path, 'rb') as file:
+            table = pa.ipc.open_file(file).read_all()
+        self.assertEqual(table.column("tick").to_pylist(), list(range(1, 31)))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            TelemetryRecorder(os.path.join(self.directory.name, "telemetry.txt"), ["A"])
+
+    def test_factory_simulation(self):
+        params = load_params('params.json')
+        path = os.path.join(self.directory.name, "telemetry.csv")
+        simulation = FactorySimulation(params)
+        simulation.telemetry = TelemetryRecorder(path, list(params['factory_layout']))
+        results = simulation.run_headless(60)
+        simulation.telemetry.close()
+        with open(path, newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), results["ticks"])
+        last = rows[-1]
+        self.assertEqual(int(last["completed_count"]), results["completed_count"])
+        wip = sum(int(last[f"wip_{name}"]) for name in params['factory_layout'])
+        self.assertEqual(wip, results["object_count"])
+        cycle_times = [float(row["cycle_time"]) for row in rows if row["cycle_time"]]
+        self.assertTrue(cycle_times)
+        # Nothing can finish faster than the processing time of all seven stations
+        self.assertGreater(min(cycle_times), 24)
+
+
+if __name__ == "__main__":
+    unittest.main()
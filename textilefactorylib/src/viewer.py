@@ -0,0 +1,71 @@
+from .c_bindings import MATERIAL_TYPES
+from .shared_state import SharedStateReader
+
+# Colors per material type code, as in the v1 window
+MATERIAL_COLORS = {MATERIAL_TYPES["Cot"]: (255, 165, 0), MATERIAL_TYPES["Fab"]: (0, 0, 255), MATERIAL_TYPES["Fin"]: (0, 255, 0)}
+HUD_HEIGHT = 30
+
+def build_background(pygame, size, scale, params):
+    # Conveyor and station markers from params, if given, drawn once
+    background = pygame.Surface(size)
+    background.fill((255, 255, 255))
+    if params:
+        points = [(x * scale, y * scale) for x, y in params.get('conveyor_paths', [])]
+        if len(points) > 1:
+            pygame.draw.lines(background, (150, 150, 150), False, points, max(scale // 2, 1))
+        for x, y in params.get('factory_layout', {}).values():
+            pygame.draw.rect(background, (200, 200, 230), (x * scale - scale, y * scale - scale, 2 * scale, 2 * scale))
+    return background
+
+def build_sprites(pygame, radius):
+    sprites = {}
+    for code, color in MATERIAL_COLORS.items():
+        sprite = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        sprites[code] = sprite
+    return sprites
+
+def draw_frame(surface, background, sprites, font, scale, positions, types, counters):
+    # One frame: the floor, a sprite per material and the HUD line below the floor
+    radius = sprites[MATERIAL_TYPES["Cot"]].get_width() // 2
+    surface.fill((240, 240, 240))
+    surface.blit(background, (0, 0))
+    corners = (positions * scale).astype(int) - radius
+    surface.blits([(sprites[code], corner) for code, corner in zip(types.tolist(), corners.tolist()) if code in sprites], False)
+    hud = f"t = {counters['sim_time']:.1f} s   WIP {counters['object_count']}   completed {counters['completed_count']}"
+    surface.blit(font.render(hud, True, (0, 0, 0)), (8, background.get_height() + 6))
+
+def run_viewer(name, params=None, scale=10, fps=60, max_frames=None):
+    # Draw the latest frame a simulation publishes to shared memory block `name`,
+    # until the simulation closes it or the window is closed. The viewer only
+    # ever reads the block, so however slow it draws, the simulation does not
+    # wait for it; frames published in between are skipped. Returns the number
+    # of frames drawn.
+    import pygame
+    with SharedStateReader(name) as reader:
+        pygame.init()
+        size = (reader.width * scale, reader.height * scale)
+        screen = pygame.display.set_mode((size[0], size[1] + HUD_HEIGHT))
+        pygame.display.set_caption(f"Factory viewer: {name}")
+        background = build_background(pygame, size, scale, params)
+        sprites = build_sprites(pygame, max(scale // 2, 2))
+        font = pygame.font.Font(None, 24)
+        clock = pygame.time.Clock()
+        drawn = 0
+        last_frame = None
+        running = True
+        while running and not reader.closed:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+            frame = reader.read()
+            if frame is not None and frame.number != last_frame:
+                last_frame = frame.number
+                draw_frame(screen, background, sprites, font, scale, frame.positions, frame.types, frame.counters)
+                pygame.display.flip()
+                drawn += 1
+                if max_frames is not None and drawn >= max_frames:
+                    break
+            clock.tick(fps)
+        pygame.quit()
+    return drawn
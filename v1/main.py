@@ -17,17 +17,70 @@ Parameters to Edit:
 - steps_per_second: Speed of material movement along the conveyor belt.
 - hud_params: Dictionary containing parameters for the HUD, such as colors, positions, and button positions.
 - box_params: Dictionary containing parameters for the completed area box, such as position, size, and color.
+- collision_zones: List of (x, y, width, height) rects, such as buffers or merges, where materials physically interact.
+  Everywhere else materials are kinematic conveyor records with no rigid body.
 
 Usage:
 - Press 'K' to spawn materials at the entrance.
 - Click 'Restart' to reset the simulation.
 - Click 'Auto'/'Manual' to toggle automatic/manual movement.
+- Run with --headless --sim-seconds N to simulate N seconds without a display as fast as possible.
+- Run with --dirty-rects to push only the screen regions that changed instead of flipping the full frame.
+- Run with --telemetry FILE (.csv, .ndjson or .arrow) to stream per-tick WIP per station, throughput and cycle time.
+- Run with --profile to time each stage of the frame loop. The window shows rolling p50/p95/p99 per stage (press 'P'
+  to hide it), headless runs print them, and --profile-output FILE (.csv or .json) saves them on exit.
+- Run with --record FILE to log the run's inputs (the 'K' key and the three buttons), its seed and a checkpoint every
+  --checkpoint-every simulated seconds. --replay FILE re-runs a log headless at full speed and checks that it ends in
+  exactly the recorded state; add --seek SECONDS to start from the nearest checkpoint instead of the beginning.
+
+All timing (spawn interval, time thresholds, movement time) uses a simulated clock that advances 1/60 s per tick.
+The window takes 60 ticks per wall-clock second whatever its frame rate (capped with --fps): a slow frame is followed
+by several ticks, frames are skipped while the simulation catches up, and materials are drawn interpolated between
+their last two ticks.
 """
 
+import argparse
+import os
+import random
+import sys
+import time
+
+parser = argparse.ArgumentParser(description="Textile factory simulation")
+parser.add_argument('--headless', action='store_true', help='Run without rendering on a simulated clock as fast as possible')
+parser.add_argument('--sim-seconds', type=float, help='Simulated seconds to run in headless mode (default: one 8 hour shift, or the rest of a --replay log)')
+parser.add_argument('--fps', type=int, default=60, help='Frame rate cap for the window; the simulation keeps its 60 ticks per second at any frame rate')
+parser.add_argument('--dirty-rects', action='store_true', help='Update only changed screen regions, falling back to a full flip when most of the frame changed')
+parser.add_argument('--telemetry', help='Stream per-tick metrics to this file (.csv, .ndjson or .arrow)')
+parser.add_argument('--profile', action='store_true', help='Time each stage of the frame loop and show p50/p95/p99 per stage')
+parser.add_argument('--profile-output', help='Write the stage timings to this file (.csv or .json) on exit; implies --profile')
+parser.add_argument('--record', help='Append the run\'s inputs and periodic checkpoints to this run log')
+parser.add_argument('--checkpoint-every', type=float, default=60, help='Simulated seconds between checkpoints in a --record log (default: 60)')
+parser.add_argument('--seed', type=int, default=0, help='Seed for the random number generators, kept in --record logs')
+parser.add_argument('--replay', help='Re-run a --record log headless and check it reproduces the recorded run')
+parser.add_argument('--seek', type=float, help='With --replay, start at this simulated second from the checkpoint at or before it')
+args = parser.parse_args()
+args.profile = args.profile or bool(args.profile_output)
+if args.replay:
+    if args.record:
+        parser.error("--record and --replay cannot be combined")
+    args.headless = True
+elif args.seek is not None:
+    parser.error("--seek needs --replay")
+if args.checkpoint_every <= 0:
+    parser.error("--checkpoint-every must be positive")
+
+if args.headless:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+import numpy as np
 import pygame
 import pymunk
 import pymunk.pygame_util
-import time
+
+# The telemetry writer and the stage profiler live in the textilefactorylib package next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from textilefactorylib.src.profiler import NULL_PROFILER, StageProfiler
+from textilefactorylib.src.replay import RunLog, RunRecorder, state_digest
 
 # Initialize Pygame and Pymunk
 pygame.init()
@@ -86,11 +139,29 @@ params = {
         "box_width": 100,
         "box_height": 100,
         "box_color": (100, 100, 100)
-    }
+    },
+    "collision_zones": []
 }
 
+# Font and glyph caches, so labels are rendered once instead of every frame. Only text from a
+# fixed set (station names, button labels, type tags) goes through render_text; counters are
+# rendered directly, or the cache would keep a surface for every value they ever took.
+fonts = {}
+glyphs = {}
+
+def get_font(size=24):
+    if size not in fonts:
+        fonts[size] = pygame.font.Font(None, size)
+    return fonts[size]
+
+def render_text(text, color, size=24):
+    key = (text, tuple(color), size)
+    if key not in glyphs:
+        glyphs[key] = get_font(size).render(text, True, color)
+    return glyphs[key]
+
 # Function to draw stations with solid colors and labels
-def draw_stations():
+def draw_stations(surface):
     station_colors = [
         (255, 0, 0),   # Red
         (0, 255, 0),   # Green
@@ -109,16 +180,90 @@ def draw_stations():
         station_width = 140
         station_height = 100
         station_rect = pygame.Rect(pos[0] - station_width // 2, pos[1] - station_height // 2, station_width, station_height)
-        pygame.draw.rect(screen, station_colors[i % len(station_colors)], station_rect)
+        pygame.draw.rect(surface, station_colors[i % len(station_colors)], station_rect)
 
         # Draw the station name
-        font = pygame.font.Font(None, 24)
-        text = font.render(name, True, (0, 0, 0))
+        text = render_text(name, (0, 0, 0))
         text_rect = text.get_rect(center=pos)
-        screen.blit(text, text_rect)
-
-# Function to spawn materials
+        surface.blit(text, text_rect)
+
+# Material type codes, indexes into MATERIAL_TYPES
+MATERIAL_TYPES = ["Cot", "Fab", "Fin"]
+COT, FAB, FIN = range(len(MATERIAL_TYPES))
+
+# Array-backed material state. Live materials occupy [0, count); every field has its own array
+class MaterialArrays:
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.position = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.area = np.zeros(capacity, dtype=np.int32)
+        self.area_start_time = np.zeros(capacity)
+        self.path_index = np.zeros(capacity, dtype=np.int32)
+        self.type = np.zeros(capacity, dtype=np.int8)
+        self.progress = np.zeros(capacity)  # distance along the conveyor loop
+        self.previous_position = np.zeros((capacity, 2))  # position before the latest tick, for drawing in between
+        self.start_time = np.zeros(capacity)
+        self.bodies = np.empty(capacity, dtype=object)  # (body, shape) pymunk pair, only while inside a collision zone
+        self.in_zone = np.zeros(capacity, dtype=bool)
+
+    def _fields(self):
+        return ["position", "previous_position", "velocity", "area", "area_start_time", "path_index", "type", "progress", "start_time", "bodies", "in_zone"]
+
+    def append(self, pos, material_type, start_time):
+        if self.count == len(self.area):
+            # Double the capacity so appends stay amortized O(1)
+            for name in self._fields():
+                array = getattr(self, name)
+                grown = np.empty((2 * len(array),) + array.shape[1:], dtype=array.dtype)
+                grown[:self.count] = array[:self.count]
+                setattr(self, name, grown)
+        i = self.count
+        self.position[i] = pos
+        self.previous_position[i] = pos
+        self.velocity[i] = 0.0
+        self.area[i] = 0
+        self.area_start_time[i] = start_time
+        self.path_index[i] = 0
+        self.type[i] = material_type
+        self.progress[i] = 0.0
+        self.start_time[i] = start_time
+        self.bodies[i] = None
+        self.in_zone[i] = False
+        self.count += 1
+
+    def interpolated_positions(self, alpha, snap_distance):
+        # Positions `alpha` of the way from the previous tick to the latest one. Materials
+        # that jumped further than snap_distance, such as wrapping around the loop, are drawn where they are.
+        previous = self.previous_position[:self.count]
+        current = self.position[:self.count]
+        positions = previous + (current - previous) * alpha
+        jumped = np.abs(current - previous).max(axis=1) > snap_distance
+        positions[jumped] = current[jumped]
+        return positions
+
+    def remove_bodies(self, selected):
+        # Take the rigid bodies of the selected materials out of the pymunk space
+        for body, shape in self.bodies[:self.count][selected & self.in_zone[:self.count]]:
+            space.remove(body, shape)
+        self.bodies[:self.count][selected] = None
+        self.in_zone[:self.count][selected] = False
+
+    def compact(self, keep):
+        # Drop every live material whose entry in the boolean mask `keep` is False, in one batch
+        kept = np.count_nonzero(keep)
+        for name in self._fields():
+            array = getattr(self, name)
+            array[:kept] = array[:self.count][keep]
+        self.bodies[kept:self.count] = None
+        self.count = kept
+
+# Function to spawn materials. Materials are pure path-parametric records; rigid bodies are only created inside collision zones
 def spawn_material(pos, material_type):
+    materials.append(pos, material_type, sim_time)
+
+# Function to create the rigid body for a material entering a collision zone
+def create_body(pos):
     mass = 1
     radius = params["material_radius"]
     inertia = pymunk.moment_for_circle(mass, 0, radius, (0, 0))
@@ -128,7 +273,33 @@ def spawn_material(pos, material_type):
     shape.elasticity = 1.0  # Set elasticity to 1.0 for frictionless interaction
     shape.friction = 0.0  # Set friction to 0.0 for frictionless interaction
     space.add(body, shape)
-    return [body, shape, 0, time.time(), 0, material_type, 0.0, time.time()]  # Add start time
+    return body, shape
+
+# Collision zones as an (N, 4) array of x0, y0, x1, y1
+collision_zones = np.array([(x, y, x + w, y + h) for x, y, w, h in params["collision_zones"]], dtype=float).reshape(-1, 4)
+
+# Function to hand materials entering or leaving collision zones to and from pymunk
+def sync_collision_zones():
+    n = materials.count
+    if len(collision_zones) == 0 or n == 0:
+        return
+    position = materials.position[:n]
+    inside = ((position[:, None, 0] >= collision_zones[:, 0]) & (position[:, None, 0] <= collision_zones[:, 2]) &
+              (position[:, None, 1] >= collision_zones[:, 1]) & (position[:, None, 1] <= collision_zones[:, 3])).any(axis=1)
+    in_zone = materials.in_zone[:n]
+    materials.remove_bodies(~inside & in_zone)
+    for i in np.flatnonzero(inside & ~in_zone).tolist():
+        materials.bodies[i] = create_body(position[i].tolist())
+    in_zone[:] = inside
+    # The conveyor drives materials inside zones too; pymunk resolves their contacts during space.step
+    for i in np.flatnonzero(inside).tolist():
+        materials.bodies[i][0].position = position[i].tolist()
+
+# Function to copy positions resolved by pymunk back into the material arrays
+def read_back_collision_zones():
+    n = materials.count
+    for i in np.flatnonzero(materials.in_zone[:n]).tolist():
+        materials.position[i] = tuple(materials.bodies[i][0].position)
 
 # Function to calculate movement time based on equipment speed
 def calculate_movement_time(equipment_speed):
@@ -136,98 +307,187 @@ def calculate_movement_time(equipment_speed):
     time_per_step = 10 / equipment_speed  # Time to process one unit
     return time_per_step
 
-# Function to move materials along the conveyor belt
-def move_material(material, path, speed):
-    material[6] += speed  # Update path progress
-    if material[6] >= 1.0:
-        material[6] = 0.0
-        material[4] += 1
-        if material[4] >= len(path):
-            material[4] = 0
-            material[3] = time.time()
-            material[2] += 1  # Move to the next area
-    t = material[6]
-    start_pos = path[material[4]]
-    end_pos = path[(material[4] + 1) % len(path)]
-    material[0].position = (start_pos[0] + t * (end_pos[0] - start_pos[0]), start_pos[1] + t * (end_pos[1] - start_pos[1]))
-
-# Function to draw HUD at the bottom
+# Station-index table, built once: station positions and the processing time to enter each station.
+# Stations without equipment (Entrance, Utilities, Completed Area) take no processing time.
+station_names = list(params["factory_layout"].keys())
+station_positions = np.array([params["factory_layout"][name] for name in station_names], dtype=float)
+station_times = np.array([
+    calculate_movement_time(params["equipment_details"][name]["speed"]) if name in params["equipment_details"] else 0.0
+    for name in station_names
+])
+
+# Conveyor path geometry, built once. The path is a closed loop: segment i runs from point i to point (i + 1) % len.
+path_points = np.array(params["conveyor_paths"], dtype=float)
+segment_vectors = np.roll(path_points, -1, axis=0) - path_points
+segment_lengths = np.hypot(segment_vectors[:, 0], segment_vectors[:, 1])
+segment_directions = np.divide(segment_vectors, segment_lengths[:, None], out=np.zeros_like(segment_vectors), where=segment_lengths[:, None] > 0)
+path_lengths = np.concatenate(([0.0], np.cumsum(segment_lengths)))  # arc length at the start of each segment, then the loop length
+loop_length = path_lengths[-1]
+# Each segment is owned by the station nearest to its start point
+segment_stations = np.linalg.norm(path_points[:, None, :] - station_positions[None, :, :], axis=2).argmin(axis=1)
+# steps_per_second is in mean segment lengths per tick, so the time for a full loop is unchanged but every segment moves at one belt speed
+belt_advance = params["steps_per_second"] * loop_length / len(path_points)
+# Materials that moved further than this in one tick jumped rather than travelled, and are not interpolated
+snap_distance = 4 * belt_advance + params["material_radius"]
+
+# Fixed-timestep limits: at most MAX_TICKS_PER_FRAME ticks between two frames and at most MAX_SKIPPED_FRAMES
+# frames in a row skipped to catch up. Wall time beyond MAX_BACKLOG_SECONDS per frame is dropped and the
+# backlog carried to the next frame never exceeds MAX_TICKS_PER_FRAME ticks, so a simulation that cannot
+# keep up slows down instead of falling ever further behind.
+MAX_TICKS_PER_FRAME = 10
+MAX_SKIPPED_FRAMES = 5
+MAX_BACKLOG_SECONDS = 0.25
+
+# Function to move the selected materials along the conveyor belt by arc length
+def move_materials(moving, advance):
+    n = materials.count
+    progress = materials.progress[:n]  # distance along the loop
+    progress[moving] += advance
+    wrapped = moving & (progress >= loop_length)
+    progress[wrapped] -= loop_length
+    materials.area_start_time[:n][wrapped] = sim_time
+    materials.area[:n][wrapped] += 1  # Move to the next area
+    distance = progress[moving]
+    segment = np.searchsorted(path_lengths, distance, side='right') - 1
+    materials.path_index[:n][moving] = segment
+    materials.position[:n][moving] = path_points[segment] + segment_directions[segment] * (distance - path_lengths[segment])[:, None]
+    return segment
+
+# Function to draw HUD at the bottom. The HUD is re-rendered into a cached surface only when one of its values changes.
+hud_cache = {"key": None, "surface": None, "changed": False}
+
 def draw_hud(current_area, time_per_step, object_count, completed_count, auto_move, spawn_enabled):
     hud_params = params["hud_params"]
     hud_height = hud_params["hud_height"]
-    hud_bg_color = hud_params["hud_bg_color"]
-    hud_border_color = hud_params["hud_border_color"]
-    hud_text_color = hud_params["hud_text_color"]
-    button_color = hud_params["button_color"]
-    button_text_color = hud_params["button_text_color"]
     button_restart_pos = hud_params["button_restart_pos"]
     button_auto_move_pos = hud_params["button_auto_move_pos"]
     button_stop_spawn_pos = (700, height - 90)  # New button position
     button_width = hud_params["button_width"]
     button_height = hud_params["button_height"]
 
-    # Draw HUD background and border
-    pygame.draw.rect(screen, hud_bg_color, (0, hud_height, width, 100))
-    pygame.draw.rect(screen, hud_border_color, (0, hud_height, width, 100), 2)
-
-    font = pygame.font.Font(None, 24)
-    text_current_area = font.render(f"Current Area: {current_area}", True, hud_text_color)
-    text_time_per_step = font.render(f"Time per Step: {time_per_step:.2f} s", True, hud_text_color)
-    text_object_count = font.render(f"Object Count: {object_count}", True, hud_text_color)
-    text_completed_count = font.render(f"Completed Count: {completed_count}", True, hud_text_color)
-
-    screen.blit(text_current_area, (10, hud_height + 10))
-    screen.blit(text_time_per_step, (10, hud_height + 40))
-    screen.blit(text_object_count, (10, hud_height + 70))
-    screen.blit(text_completed_count, (200, hud_height + 70))
-
-    # Draw buttons
     restart_button = pygame.Rect(button_restart_pos[0], button_restart_pos[1], button_width, button_height)
     auto_move_button = pygame.Rect(button_auto_move_pos[0], button_auto_move_pos[1], button_width, button_height)
     stop_spawn_button = pygame.Rect(button_stop_spawn_pos[0], button_stop_spawn_pos[1], button_width, button_height)
 
-    pygame.draw.rect(screen, button_color, restart_button)
-    pygame.draw.rect(screen, button_color, auto_move_button)
-    pygame.draw.rect(screen, button_color, stop_spawn_button)
+    key = (current_area, f"{time_per_step:.2f}", object_count, completed_count, auto_move, spawn_enabled)
+    hud_cache["changed"] = key != hud_cache["key"]
+    if hud_cache["changed"]:
+        hud_cache["key"] = key
+        hud_cache["surface"] = render_hud(key, [restart_button, auto_move_button, stop_spawn_button])
 
-    restart_text = font.render("Restart", True, button_text_color)
-    auto_move_text = font.render("Auto" if auto_move else "Manual", True, button_text_color)
-    stop_spawn_text = font.render("Stop Spawn" if spawn_enabled else "Start Spawn", True, button_text_color)
+    screen.blit(hud_cache["surface"], (0, hud_height))
+    return restart_button, auto_move_button, stop_spawn_button
 
-    screen.blit(restart_text, (button_restart_pos[0] + 10, button_restart_pos[1] + 5))
-    screen.blit(auto_move_text, (button_auto_move_pos[0] + 10, button_auto_move_pos[1] + 5))
-    screen.blit(stop_spawn_text, (button_stop_spawn_pos[0] + 10, button_stop_spawn_pos[1] + 5))
+def render_hud(key, buttons):
+    current_area, time_per_step, object_count, completed_count, auto_move, spawn_enabled = key
+    hud_params = params["hud_params"]
+    hud_height = hud_params["hud_height"]
+    hud_text_color = hud_params["hud_text_color"]
+    button_text_color = hud_params["button_text_color"]
+    surface = pygame.Surface((width, 100))
 
-    return restart_button, auto_move_button, stop_spawn_button
+    # Draw HUD background and border
+    pygame.draw.rect(surface, hud_params["hud_bg_color"], (0, 0, width, 100))
+    pygame.draw.rect(surface, hud_params["hud_border_color"], (0, 0, width, 100), 2)
 
+    surface.blit(render_text(f"Current Area: {current_area}", hud_text_color), (10, 10))
+    surface.blit(render_text(f"Time per Step: {time_per_step} s", hud_text_color), (10, 40))
+    font = get_font()
+    surface.blit(font.render(f"Object Count: {object_count}", True, hud_text_color), (10, 70))
+    surface.blit(font.render(f"Completed Count: {completed_count}", True, hud_text_color), (200, 70))
 
-# Function to draw objects with an outline
-def draw_objects():
-    for material in materials:
-        pos = pymunk.pygame_util.to_pygame(material[0].position, screen)
-        radius = int(material[1].radius)
-        color = (255, 0, 0)  # Default color
-        if material[5] == "Cot":
-            color = (255, 165, 0)  # Orange for Cotton
-        elif material[5] == "Fab":
-            color = (0, 0, 255)  # Blue for Fabric
-        elif material[5] == "Fin":
-            color = (0, 255, 0)  # Green for Finished Material
-
-        pygame.draw.circle(screen, color, pos, radius)
-        pygame.draw.circle(screen, (0, 0, 0), pos, radius, 2)  # Outline
-
-        font = pygame.font.Font(None, 24)
-        text = font.render(material[5], True, (0, 0, 0))
-        text_rect = text.get_rect(center=pos)
-        screen.blit(text, text_rect)
+    # Draw buttons
+    labels = ["Restart", "Auto" if auto_move else "Manual", "Stop Spawn" if spawn_enabled else "Start Spawn"]
+    for button, label in zip(buttons, labels):
+        button = button.move(0, -hud_height)
+        pygame.draw.rect(surface, hud_params["button_color"], button)
+        surface.blit(render_text(label, button_text_color), (button.x + 10, button.y + 5))
+    return surface
+
+
+# Pre-rendered material sprites, one per type code: filled circle, outline and label
+def build_material_sprites():
+    material_colors = [
+        (255, 165, 0),  # Orange for Cotton
+        (0, 0, 255),    # Blue for Fabric
+        (0, 255, 0)     # Green for Finished Material
+    ]
+    radius = params["material_radius"]
+    sprites = []
+    for material_type, color in enumerate(material_colors):
+        text = render_text(MATERIAL_TYPES[material_type], (0, 0, 0))
+        size = (max(2 * radius, text.get_width()), max(2 * radius, text.get_height()))
+        sprite = pygame.Surface(size, pygame.SRCALPHA)
+        center = (size[0] // 2, size[1] // 2)
+        pygame.draw.circle(sprite, color, center, radius)
+        pygame.draw.circle(sprite, (0, 0, 0), center, radius, 2)  # Outline
+        sprite.blit(text, text.get_rect(center=center))
+        sprites.append(sprite)
+    return sprites
+
+# Function to draw objects at `positions` (one row per live material) by blitting their cached sprites in one batch.
+# Returns the type code and screen rect of every sprite.
+def draw_objects(positions):
+    n = materials.count
+    if n == 0:
+        return []
+    offsets = np.array([(sprite.get_width() // 2, sprite.get_height() // 2) for sprite in material_sprites])
+    types = materials.type[:n]
+    types = types.tolist()
+    corners = (positions.astype(int) - offsets[types]).tolist()
+    return list(zip(types, screen.blits([(material_sprites[t], corner) for t, corner in zip(types, corners)])))
+
+# Fraction of the screen above which a full flip is cheaper than a list of dirty rects
+DIRTY_FLIP_FRACTION = 0.5
+
+# Function to erase last frame's sprites by restoring the background underneath them
+def restore_background(rects):
+    screen.blits([(background, rect, rect) for rect in rects], False)
+
+# Function to push only the regions that changed since the last frame to the display
+def update_display(previous_sprites, current_sprites, force_flip):
+    # Sprites that did not move or change type are the same (type, rect) in both frames; only the rest changed on screen
+    changed = {(t, tuple(rect)) for t, rect in previous_sprites} ^ {(t, tuple(rect)) for t, rect in current_sprites}
+    dirty = [pygame.Rect(rect) for rect in {rect for _, rect in changed}]
+    if hud_cache["changed"]:
+        dirty.append(pygame.Rect(0, params["hud_params"]["hud_height"], width, 100))
+    if profile_overlay["rect"] is not None:
+        dirty.append(profile_overlay["rect"])
+    if force_flip or sum(rect.w * rect.h for rect in dirty) > DIRTY_FLIP_FRACTION * width * height:
+        pygame.display.flip()
+    elif dirty:
+        pygame.display.update(dirty)
+
+# Stage timing overlay in the top right corner, re-rendered every PROFILE_OVERLAY_TICKS ticks
+PROFILE_OVERLAY_TICKS = 30
+profile_overlay = {"surface": None, "tick": None, "visible": True, "rect": None}
+
+def render_profile_overlay(lines):
+    # Numbers change on every render, so the text bypasses the glyph cache
+    font = get_font(18)
+    line_height = font.get_linesize()
+    surface = pygame.Surface((max(font.size(line)[0] for line in lines) + 12, len(lines) * line_height + 8))
+    surface.fill((30, 30, 30))
+    for i, line in enumerate(lines):
+        surface.blit(font.render(line, True, (230, 230, 230)), (6, 4 + i * line_height))
+    return surface
+
+def draw_profile_overlay():
+    # Returns the screen rect the overlay covers, or None while it is hidden or empty
+    if not profile_overlay["visible"] or not profiler.samples:
+        return None
+    if profile_overlay["tick"] is None or ticks - profile_overlay["tick"] >= PROFILE_OVERLAY_TICKS:
+        profile_overlay["surface"] = render_profile_overlay(profiler.format().split("\n"))
+        profile_overlay["tick"] = ticks
+    surface = profile_overlay["surface"]
+    return screen.blit(surface, (width - surface.get_width() - 10, 10))
 
 # Function to draw conveyor belts
-def draw_conveyor_belts():
-    pygame.draw.lines(screen, (150, 150, 150), False, params["conveyor_paths"], 10)  # Thicker conveyor belts
+def draw_conveyor_belts(surface):
+    pygame.draw.lines(surface, (150, 150, 150), False, params["conveyor_paths"], 10)  # Thicker conveyor belts
 
 # Function to draw the completed area box
-def draw_completed_area_box():
+def draw_completed_area_box(surface):
     box_params = params["box_params"]
     box_position = params["factory_layout"]["Completed Area"]
     box_width = box_params["box_width"]
@@ -235,25 +495,106 @@ def draw_completed_area_box():
     box_color = box_params["box_color"]
 
     box_rect = pygame.Rect(box_position[0] - box_width // 2, box_position[1] - box_height // 2, box_width, box_height)
-    pygame.draw.rect(screen, box_color, box_rect)
+    pygame.draw.rect(surface, box_color, box_rect)
 
-    font = pygame.font.Font(None, 24)
-    text = font.render("Completed Area", True, (255, 255, 255))
+    text = render_text("Completed Area", (255, 255, 255))
     text_rect = text.get_rect(center=box_position)
-    screen.blit(text, text_rect)
-
-# Function to check if material is within distance and time
-def check_material_position(material, next_area_pos):
-    current_pos = material[0].position
-    distance = ((current_pos[0] - next_area_pos[0]) ** 2 + (current_pos[1] - next_area_pos[1]) ** 2) ** 0.5
-    elapsed_time = time.time() - material[7]
-    if distance > params["distance_threshold"] and elapsed_time > params["time_threshold"]:
-        material[0].velocity = (0, 0)  # Freeze the material's movement
-    else:
-        material[0].velocity = (0, 0)  # Reset velocity to ensure it moves correctly
+    surface.blit(text, text_rect)
+
+# The conveyor belts, stations and completed area never change, so they are pre-rendered once to a Surface
+def build_background():
+    background = pygame.Surface((width, height))
+    background.fill((255, 255, 255))
+    draw_conveyor_belts(background)
+    draw_stations(background)
+    draw_completed_area_box(background)
+    return background
+
+# Function to check which materials are within distance and time of their next area
+def check_material_positions(selected, next_area_pos):
+    n = materials.count
+    distance = np.hypot(*(materials.position[:n][selected] - next_area_pos).T)
+    elapsed_time = sim_time - materials.start_time[:n][selected]
+    frozen = (distance > params["distance_threshold"]) & (elapsed_time > params["time_threshold"])
+    # Frozen materials stop; the rest have their velocity reset so they move correctly. Both end at rest.
+    materials.velocity[:n][selected] = 0.0
+    return frozen
+
+# Run inputs, as stored in run logs. Each applies before the tick it is stamped with.
+SPAWN_KEY, RESTART, TOGGLE_AUTO_MOVE, TOGGLE_SPAWN = 1, 2, 3, 4
+
+def apply_input(control):
+    global materials, object_count, completed_count, current_area, time_per_step, auto_move, spawn_enabled, last_spawn_time
+    if control == SPAWN_KEY:
+        current_time = sim_time
+        if current_time - last_spawn_time >= 1 / params["item_rate"]:
+            spawn_material(params["factory_layout"]["Entrance"], COT)
+            spawn_material(params["factory_layout"]["Entrance"], FAB)
+            object_count += 2
+            last_spawn_time = current_time
+    elif control == RESTART:
+        # Restart the simulation
+        materials.remove_bodies(np.ones(materials.count, dtype=bool))
+        materials = MaterialArrays()
+        object_count = 0
+        completed_count = 0
+        current_area = "Entrance"
+        time_per_step = 0
+    elif control == TOGGLE_AUTO_MOVE:
+        # Toggle automatic/manual movement
+        auto_move = not auto_move
+    elif control == TOGGLE_SPAWN:
+        # Toggle spawning of new objects
+        spawn_enabled = not spawn_enabled
+    if recorder is not None:
+        recorder.input(ticks, control)
+
+# Simulation state beyond the material arrays, as kept in checkpoints and the final digest
+STATE_VALUES = ("ticks", "sim_time", "last_spawn_time", "object_count", "completed_count", "current_area", "time_per_step", "auto_move", "spawn_enabled")
+
+def capture_state():
+    # Everything the next tick depends on, as plain values and arrays. The space and the live
+    # material arrays are pickled together, so the bodies of materials in collision zones stay the
+    # bodies in the space.
+    n = materials.count
+    state = {name: globals()[name] for name in STATE_VALUES}
+    state["space"] = space
+    state["materials"] = {name: getattr(materials, name)[:n] for name in materials._fields()}
+    return state
+
+def restore_state(state):
+    global space, materials
+    space = state.pop("space")
+    arrays = state.pop("materials")
+    n = len(arrays["area"])
+    materials = MaterialArrays(max(n, 256))
+    for name, array in arrays.items():
+        getattr(materials, name)[:n] = array
+    materials.count = n
+    globals().update(state)
+
+def final_digest():
+    # The drawing-only previous_position and the pymunk bodies (mirrored in position) are left out
+    n = materials.count
+    arrays = [getattr(materials, name)[:n] for name in materials._fields() if name not in ("previous_position", "bodies")]
+    return state_digest(arrays, [globals()[name] for name in STATE_VALUES])
 
 running = True
-materials = []
+materials = MaterialArrays()
+telemetry = None
+if args.telemetry:
+    from textilefactorylib.src.telemetry import TelemetryRecorder
+    telemetry = TelemetryRecorder(args.telemetry, station_names)
+profiler = StageProfiler() if args.profile else NULL_PROFILER
+background = None
+material_sprites = None
+if not args.headless:
+    background = build_background()
+    material_sprites = build_material_sprites()
+    screen.blit(background, (0, 0))
+sprites = []  # (type, rect) of each sprite drawn in the last frame
+previous_sprites = []
+force_flip = True
 current_area = "Entrance"
 time_per_step = 0
 object_count = 0
@@ -263,80 +604,200 @@ spawn_enabled = True  # New variable to control spawning
 restart_button = None
 auto_move_button = None
 stop_spawn_button = None
-last_spawn_time = time.time()
+dt = 1 / 60.0
+ticks = 0
+sim_time = 0.0  # Simulated clock, ticks * dt
+last_spawn_time = sim_time
+random.seed(args.seed)
+np.random.seed(args.seed)
+recorder = None
+replay_inputs = {}
+if args.replay:
+    run_log = RunLog(args.replay)
+    random.seed(run_log.seed)
+    np.random.seed(run_log.seed)
+    end_tick = run_log.end_tick if run_log.complete else run_log.last_tick
+    if args.seek is not None:
+        # Jump to the checkpoint at or before the requested second and replay from there
+        checkpoint = run_log.checkpoint_before(int(round(args.seek / dt)))
+        if checkpoint is not None:
+            restore_state(checkpoint[1])
+        print(f"Replaying from {sim_time:.0f} s")
+    replay_inputs = run_log.inputs_by_tick(ticks)
+    headless_ticks = end_tick if args.sim_seconds is None else ticks + int(round(args.sim_seconds / dt))
+else:
+    headless_ticks = int(round((28800 if args.sim_seconds is None else args.sim_seconds) / dt))
+if args.record:
+    recorder = RunRecorder(args.record, args.seed, dt)
+checkpoint_ticks = max(int(round(args.checkpoint_every / dt)), 1)
+wall_start = time.perf_counter()
+
+# Fixed-timestep loop. The window advances the simulation in dt ticks against the
+# wall clock, taking as many ticks per frame as the time since the last frame
+# calls for, so the factory runs at the same simulated rate whatever the frame
+# rate. Headless runs take one tick per iteration and never read the wall clock.
+accumulator = 0.0
+frame_clock = time.perf_counter()
+skipped_frames = 0
 
 while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_k:
-                current_time = time.time()
-                if current_time - last_spawn_time >= 1 / params["item_rate"]:
-                    materials.append(spawn_material(params["factory_layout"]["Entrance"], "Cot"))
-                    materials.append(spawn_material(params["factory_layout"]["Entrance"], "Fab"))
-                    object_count += 2
-                    last_spawn_time = current_time
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if restart_button and restart_button.collidepoint(event.pos):
-                # Restart the simulation
-                materials = []
-                object_count = 0
-                completed_count = 0
-                current_area = "Entrance"
-                time_per_step = 0
-            elif auto_move_button and auto_move_button.collidepoint(event.pos):
-                # Toggle automatic/manual movement
-                auto_move = not auto_move
-            elif stop_spawn_button and stop_spawn_button.collidepoint(event.pos):
-                # Toggle spawning of new objects
-                spawn_enabled = not spawn_enabled
-
-    screen.fill((255, 255, 255))
-    draw_conveyor_belts()
-    draw_stations()
-    draw_objects()
-    draw_completed_area_box()
-    restart_button, auto_move_button, stop_spawn_button = draw_hud(current_area, time_per_step, object_count, completed_count, auto_move, spawn_enabled)
-
-    if auto_move:
-        # Automatically move materials based on elapsed time
-        for material in materials[:]:  # Use a copy of the list to avoid modifying it while iterating
-            elapsed_time = time.time() - material[3]
-            if elapsed_time >= time_per_step:
-                current_area_index = material[2]
-                next_area_index = (current_area_index + 1) % len(params["factory_layout"])
-                next_area = list(params["factory_layout"].keys())[next_area_index]
-                equipment_speed = params["equipment_details"][next_area]["speed"]
-                time_per_step = calculate_movement_time(equipment_speed)
-                path = params["conveyor_paths"]
-                move_material(material, path, params["steps_per_second"])
-
-                # Check if the material has completed the final step
-                if next_area_index == len(params["factory_layout"]) - 1:
-                    # Turn the completed material into a "Fin" object and keep it in the completed area
-                    completed_area_pos = params["factory_layout"]["Completed Area"]
-                    materials.append(spawn_material(completed_area_pos, "Fin"))
-                    space.remove(material[0], material[1])
-                    materials.remove(material)
-                    object_count -= 1
-                    completed_count += 1
+    profiler.begin()
+    if args.headless:
+        steps = 1
+        for control in replay_inputs.pop(ticks, ()):
+            apply_input(control)
+    else:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.VIDEOEXPOSE:
+                force_flip = True
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_p and args.profile:
+                    # Show or hide the stage timing overlay
+                    profile_overlay["visible"] = not profile_overlay["visible"]
+                    force_flip = True
+                elif event.key == pygame.K_k:
+                    apply_input(SPAWN_KEY)
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if restart_button and restart_button.collidepoint(event.pos):
+                    apply_input(RESTART)
+                elif auto_move_button and auto_move_button.collidepoint(event.pos):
+                    apply_input(TOGGLE_AUTO_MOVE)
+                elif stop_spawn_button and stop_spawn_button.collidepoint(event.pos):
+                    apply_input(TOGGLE_SPAWN)
+        profiler.lap("events")
+        now = time.perf_counter()
+        accumulator += min(now - frame_clock, MAX_BACKLOG_SECONDS)
+        frame_clock = now
+        steps = min(int(accumulator / dt), MAX_TICKS_PER_FRAME)
+        accumulator -= steps * dt
+        # Drop whatever the tick cap left over beyond one frame's worth of ticks
+        accumulator = min(accumulator, MAX_TICKS_PER_FRAME * dt)
+
+    for _ in range(steps):
+        if not args.headless:
+            # Keep the positions before this tick to draw in between the last two states
+            materials.previous_position[:materials.count] = materials.position[:materials.count]
+        cycle_time = float('nan')
+        if auto_move and materials.count:
+            # Automatically move every material whose processing time at its next area has elapsed, as one batch
+            n = materials.count
+            next_area_index = (materials.area[:n] + 1) % len(station_names)
+            elapsed_time = sim_time - materials.area_start_time[:n]
+            # Finished materials stay parked in the completed area
+            moving = (elapsed_time >= station_times[next_area_index]) & (materials.type[:n] != FIN)
+            if moving.any():
+                time_per_step = station_times[next_area_index[moving][-1]]
+                segment = move_materials(moving, belt_advance)
+                current_area = station_names[segment_stations[segment[-1]]]
+
+                # Turn materials that completed the final step into "Fin" objects kept in the completed area
+                completed = moving & (next_area_index == len(station_names) - 1)
+                completed_now = np.count_nonzero(completed)
+                if completed_now:
+                    cycle_time = float(np.mean(sim_time - materials.start_time[:n][completed]))
+                    materials.remove_bodies(completed)
+                    moving = moving[~completed]
+                    next_area_index = next_area_index[~completed]
+                    materials.compact(~completed)
+                    object_count -= completed_now
+                    completed_count += completed_now
 
                 # Check material position and freeze if necessary
-                next_area_pos = params["factory_layout"][next_area]
-                check_material_position(material, next_area_pos)
-
-    # Automatically spawn materials at a fixed interval
-    if spawn_enabled:
-        current_time = time.time()
-        if current_time - last_spawn_time >= 1 / params["item_rate"]:
-            materials.append(spawn_material(params["factory_layout"]["Entrance"], "Cot"))
-            materials.append(spawn_material(params["factory_layout"]["Entrance"], "Fab"))
-            object_count += 2
-            last_spawn_time = current_time
-
-    space.step(1 / 60.0)  # Update the physics engine
-    pygame.display.flip()
-    clock.tick(60)
+                check_material_positions(moving, station_positions[next_area_index[moving]])
+
+                for _ in range(completed_now):
+                    spawn_material(params["factory_layout"]["Completed Area"], FIN)
+        profiler.lap("auto_move")
+
+        # Automatically spawn materials at a fixed interval
+        if spawn_enabled:
+            current_time = sim_time
+            if current_time - last_spawn_time >= 1 / params["item_rate"]:
+                spawn_material(params["factory_layout"]["Entrance"], COT)
+                spawn_material(params["factory_layout"]["Entrance"], FAB)
+                object_count += 2
+                last_spawn_time = current_time
+        profiler.lap("spawn")
+
+        # Only materials inside collision zones have rigid bodies, so this no longer scales with total WIP
+        sync_collision_zones()
+        space.step(dt)  # Update the physics engine
+        read_back_collision_zones()
+        profiler.lap("space_step")
+        ticks += 1
+        sim_time = ticks * dt
+        if recorder is not None and ticks % checkpoint_ticks == 0:
+            recorder.checkpoint(ticks, capture_state())
+        if telemetry is not None:
+            # WIP per station, leaving out the finished items parked in the completed area
+            n = materials.count
+            in_progress = materials.type[:n] != FIN
+            wip = np.bincount(materials.area[:n][in_progress], minlength=len(station_names))
+            telemetry.record(ticks, sim_time, object_count, completed_count, wip, cycle_time)
+            profiler.lap("telemetry")
+
+    if args.headless:
+        if ticks >= headless_ticks:
+            running = False
+    elif accumulator >= dt and skipped_frames < MAX_SKIPPED_FRAMES:
+        # Still a tick or more behind the wall clock: skip drawing to catch up sooner
+        skipped_frames += 1
+        profiler.lap("skipped_frame")
+    else:
+        skipped_frames = 0
+        if args.dirty_rects:
+            restore_background([rect for _, rect in sprites])
+            if profile_overlay["rect"] is not None:
+                restore_background([profile_overlay["rect"]])
+        else:
+            screen.blit(background, (0, 0))
+        previous_sprites = sprites
+        sprites = draw_objects(materials.interpolated_positions(min(accumulator / dt, 1.0), snap_distance))
+        profiler.lap("draw_objects")
+        restart_button, auto_move_button, stop_spawn_button = draw_hud(current_area, time_per_step, object_count, completed_count, auto_move, spawn_enabled)
+        profiler.lap("draw_hud")
+        if args.profile:
+            profile_overlay["rect"] = draw_profile_overlay()
+        if args.dirty_rects:
+            update_display(previous_sprites, sprites, force_flip)
+            force_flip = False
+        else:
+            pygame.display.flip()
+        profiler.lap("display")
+        # Cap the frame rate; the tick rate follows the wall clock whatever the cap
+        clock.tick(args.fps)
+        profiler.lap("clock_wait")
+    profiler.end()
+
+if args.headless:
+    print(f"Simulated {sim_time:.0f} s in {time.perf_counter() - wall_start:.2f} s wall time")
+    print(f"Object Count: {object_count}")
+    print(f"Completed Count: {completed_count}")
+    print(f"Throughput: {completed_count / sim_time * 3600 if sim_time > 0 else 0.0:.1f} items/hour")
+    if args.profile:
+        print(profiler.format())
+
+if recorder is not None:
+    recorder.end(ticks, final_digest())
+    recorder.close()
+replay_mismatch = False
+if args.replay:
+    if not run_log.complete:
+        print("The run log ends before the run did; nothing to check the replay against")
+    elif ticks != run_log.end_tick:
+        print(f"Replay stopped at tick {ticks} of {run_log.end_tick}; not checked against the recording")
+    elif final_digest() == run_log.digest:
+        print("Replay matches the recording")
+    else:
+        print("Replay does not match the recording")
+        replay_mismatch = True
 
+if telemetry is not None:
+    telemetry.close()
+if args.profile_output:
+    profiler.export(args.profile_output)
 pygame.quit()
+if replay_mismatch:
+    sys.exit(1)